@@ -13,3 +13,14 @@ class Quadrant(Enum):
     Q2 = "q2"  # (x-1, y-1)  # Northwest
     Q3 = "q3"  # (x-1, y+1)  # Southwest
     Q4 = "q4"  # (x+1, y+1)  # Southeast
+
+class NodeType3D(Enum):
+    # Extruded (3D) nodes, classified by how many of their 8 octants hold material
+    ROOT = "root"
+    INTERIOR = "interior"                # 8 octants
+    INTERIOR_CORNER = "interior_corner"  # 7, concave corner
+    INTERIOR_EDGE = "interior_edge"      # 6, concave edge
+    STEP = "step"                        # 5 or 3, where a step meets a face
+    FACE = "face"                        # 4, on a flat face
+    EDGE = "edge"                        # 2, on a convex edge
+    CORNER = "corner"                    # 1, convex corner
@@ -112,14 +112,14 @@ def insulated_tip(L, w, k=10, h=600, T_base=45, T_inf=25, thickness=1):
     m = np.sqrt((h * perimeter) / (k * area))
     q = M * np.tanh(m*length)
     return q
-length = 8
-width = 1
-dx = 1
-print("For length =", length, "mm, width =", width, "mm, and Δx = Δy =", dx, "mm")
-temperature_distributin = np.round(solve_fin(length,width,dx), decimals=1)
-print("Matrix of temperature distribution (C)\n",temperature_distributin)
-print("q per unit thickness:")
-print("\tfrom FDM =", round(fin_heat_convective(temperature_distributin, dx), 3), "W/m")
-print("\tconvective tip =", round(convective_tip(length, width), 3), "W/m")
-print("\tinsulated tip =", round(insulated_tip(length, width), 3), "W/m")
-
+if __name__ == "__main__":
+    length = 8
+    width = 1
+    dx = 1
+    print("For length =", length, "mm, width =", width, "mm, and Δx = Δy =", dx, "mm")
+    temperature_distributin = np.round(solve_fin(length,width,dx), decimals=1)
+    print("Matrix of temperature distribution (C)\n",temperature_distributin)
+    print("q per unit thickness:")
+    print("\tfrom FDM =", round(fin_heat_convective(temperature_distributin, dx), 3), "W/m")
+    print("\tconvective tip =", round(convective_tip(length, width), 3), "W/m")
+    print("\tinsulated tip =", round(insulated_tip(length, width), 3), "W/m")
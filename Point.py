@@ -3,10 +3,15 @@ from Enum import PointType, Quadrant
 import sympy as sp
 
 class Point:
-    def __init__(self, x: float, y: float, temperature: float = 20.0, material: Optional[str] = None):
+    def __init__(self, x: float, y: float, temperature: float = 20.0, material: Optional[str] = None,
+                 row: Optional[int] = None, col: Optional[int] = None):
+        # Physical coordinates, for output only
         self.x = x
         self.y = y
         self.coordinates = (x, y)
+        # Integer grid indices, used for every lookup ([row, col] of the masks)
+        self.row = row
+        self.col = col
         self.is_drawn = False
         
         # Linked list connections (4-directional)
@@ -1,10 +1,23 @@
 # ShapeUI.py
 import tkinter as tk
-from tkinter import ttk, simpledialog
+from tkinter import ttk, simpledialog, filedialog
 from splitter import ShapeDataStructure
 from Surrounding_Materials import Surrounding_Materials
-from Sink_Materials import Sink_Materials
-from physics import update_temperatures
+from Sink_Materials import Sink_Materials, Sink_Conductivity_Curves, Sink_Emissivity, Sink_Density, Sink_Specific_Heat
+import os
+import numpy as np
+import tempfile
+from physics import update_temperatures, run_transient
+from result_store import ResultStore
+from math_module import SparseSystem
+from postprocess import heat_rate_summary
+from sensitivity import topology_sensitivity
+from extrude import solve_extruded, assign_layer_to_points
+from result_cache import ResultCache
+from snapshots import History, capture, restore, solved, difference
+from session import Session, save_session
+from surrogate import BiotSurrogate
+from profiling import profiled
 
 class ShapeUI:
     def __init__(self):
@@ -34,6 +47,17 @@ class ShapeUI:
 
         # ---------------- INITIALIZE SHAPE ----------------
         self.shape = ShapeDataStructure(self.width, self.height, self.resolution)
+        self.cache = ResultCache()
+        self.system = None  # SparseSystem of the current geometry, rebuilt after strokes
+        self.surrogate = None  # BiotSurrogate of self.system for the k / h slider preview
+        # Released slider values stand in for the material k / h until a material is picked or edited
+        self.k_override = None
+        self.h_override = None
+        self.previewing = False
+        # Copy-on-write snapshots after every edit, for undo / redo and comparing designs
+        self.history = History()
+        self.history.push(capture(self.shape, label="empty"))
+        self.pinned = None
 
         # ---------------- MAIN WINDOW ----------------
         self.root.deiconify()
@@ -61,12 +85,10 @@ class ShapeUI:
         # ---------------- DRAW STATE ----------------
         self.drawing = False
         self.drawn_coordinates = []
-        self.must_start = True  # enforce start at (0,0)
 
         self._bind_events()
         self._draw_grid()
-        self._highlight_start_cell()
-        self.status_label.config(text="Start drawing at (0,0)", fg="blue")
+        self.status_label.config(text="Draw a shape, x=0 cells are heat sources", fg="blue")
 
     # ---------------- CONTROL PANEL ----------------
     def _build_controls(self):
@@ -91,12 +113,24 @@ class ShapeUI:
         self.sink_material_dropdown = ttk.Combobox(self.control_frame, textvariable=self.sink_material_var,
                                                    values=list(Sink_Materials.keys()) + ["Custom"])
         self.sink_material_dropdown.pack(fill="x", pady=5)
+        self.k_of_T_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.control_frame, text="Temperature-dependent k", variable=self.k_of_T_var).pack(anchor="w")
+
+        # Radiation, emissivity follows the sink material unless edited
+        self.radiation_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.control_frame, text="Radiation", variable=self.radiation_var).pack(anchor="w")
+        tk.Label(self.control_frame, text="Emissivity (ε)", font=("Arial", 10)).pack(anchor="w")
+        self.emissivity_var = tk.StringVar(value=str(Sink_Emissivity.get(self.sink_material_var.get(), 0.9)))
+        self.emissivity_entry = tk.Entry(self.control_frame, textvariable=self.emissivity_var)
+        self.emissivity_entry.pack(fill="x", pady=(0,5))
+        self.sink_material_dropdown.bind("<<ComboboxSelected>>", self._on_sink_material_selected)
 
         tk.Label(self.control_frame, text="Surrounding Material", font=("Arial", 12, "bold")).pack(anchor="w", pady=(10,0))
         self.surround_material_var = tk.StringVar(value="free air")
         self.surround_material_dropdown = ttk.Combobox(self.control_frame, textvariable=self.surround_material_var,
                                                         values=list(Surrounding_Materials.keys()) + ["Custom"])
         self.surround_material_dropdown.pack(fill="x", pady=5)
+        self.surround_material_dropdown.bind("<<ComboboxSelected>>", self._on_surround_material_selected)
 
         # Temperatures
         tk.Label(self.control_frame, text="Heat Source Temp (°C)", font=("Arial", 12, "bold")).pack(anchor="w", pady=(15,0))
@@ -111,28 +145,88 @@ class ShapeUI:
 
         # Buttons
         tk.Button(self.control_frame, text="Clear", command=self.clear).pack(fill="x", pady=(15,5))
-        tk.Button(self.control_frame, text="Run Physics", command=self.run_physics).pack(fill="x", pady=(5,15))
+        tk.Button(self.control_frame, text="Run Physics", command=self.run_physics).pack(fill="x", pady=(5,5))
+
+        # What-if sliders (log10 of k and h): a surrogate previews while dragging, release solves for real
+        self.k_scale = tk.Scale(self.control_frame, from_=0, to=3, resolution=0.01, orient="horizontal",
+                                showvalue=False, label="Preview k", command=self._preview)
+        self.k_scale.set(np.log10(Sink_Materials["copper"]))
+        self.k_scale.pack(fill="x")
+        self.h_scale = tk.Scale(self.control_frame, from_=0, to=3, resolution=0.01, orient="horizontal",
+                                showvalue=False, label="Preview h", command=self._preview)
+        self.h_scale.set(np.log10(Surrounding_Materials["free air"]))
+        self.h_scale.pack(fill="x", pady=(0,5))
+        for scale in (self.k_scale, self.h_scale):
+            scale.bind("<ButtonRelease-1>", self._confirm_preview)
+        # Slider positions of the values in use, a release elsewhere confirms the move
+        self.slider_confirmed = (self.k_scale.get(), self.h_scale.get())
+        self.sink_custom_entry.bind("<KeyRelease>", lambda event: self._clear_override("k"))
+        self.surround_custom_entry.bind("<KeyRelease>", lambda event: self._clear_override("h"))
+
+        # Undo / redo of edits, and the difference to a pinned design
+        history_frame = tk.Frame(self.control_frame)
+        history_frame.pack(fill="x", pady=(0,5))
+        tk.Button(history_frame, text="Undo", command=self.undo).pack(side="left", fill="x", expand=True)
+        tk.Button(history_frame, text="Redo", command=self.redo).pack(side="left", fill="x", expand=True)
+        compare_frame = tk.Frame(self.control_frame)
+        compare_frame.pack(fill="x", pady=(0,5))
+        tk.Button(compare_frame, text="Pin Design", command=self.pin_design).pack(side="left", fill="x", expand=True)
+        tk.Button(compare_frame, text="Compare", command=self.compare_to_pinned).pack(side="left", fill="x", expand=True)
+        session_frame = tk.Frame(self.control_frame)
+        session_frame.pack(fill="x", pady=(0,5))
+        tk.Button(session_frame, text="Save Session", command=self.save_session).pack(side="left", fill="x", expand=True)
+        tk.Button(session_frame, text="Open Session", command=self.open_session).pack(side="left", fill="x", expand=True)
+
+        # Sensitivity overlay: what trimming a surface cell or growing an empty neighbour cell does to the objective
+        self.objective_var = tk.StringVar(value="heat rate")
+        ttk.Combobox(self.control_frame, textvariable=self.objective_var, state="readonly",
+                     values=["heat rate", "max temperature"]).pack(fill="x", pady=(5,0))
+        tk.Button(self.control_frame, text="Show Sensitivity", command=self.show_sensitivity).pack(fill="x", pady=(5,5))
+
+        # Draw mode: new shape strokes, paint inserts of the selected sink material and
+        # heat generation onto the shape, or paint fixed temperature heat source cells
+        tk.Label(self.control_frame, text="Draw Mode", font=("Arial", 12, "bold")).pack(anchor="w", pady=(10,0))
+        self.draw_mode_var = tk.StringVar(value="shape")
+        for text, mode in (("Shape", "shape"), ("Paint material / heat", "paint"), ("Paint heat source", "source")):
+            tk.Radiobutton(self.control_frame, text=text, variable=self.draw_mode_var, value=mode).pack(anchor="w")
+        self.fill_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(self.control_frame, text="Fill under stroke", variable=self.fill_var).pack(anchor="w")
+        tk.Label(self.control_frame, text="Heat generation (W/m³)", font=("Arial", 10)).pack(anchor="w")
+        self.heat_generation_var = tk.StringVar(value="0")
+        tk.Entry(self.control_frame, textvariable=self.heat_generation_var).pack(fill="x", pady=(0,5))
+
+        # 3D mode: the profile extruded over this many node layers, 1 keeps the 2D section
+        tk.Label(self.control_frame, text="3D layers (1 = 2D)", font=("Arial", 10)).pack(anchor="w")
+        self.layers_var = tk.StringVar(value="1")
+        tk.Entry(self.control_frame, textvariable=self.layers_var).pack(fill="x", pady=(0,5))
+
+        # Transient warm-up after a heat source step
+        tk.Label(self.control_frame, text="Transient time (s)", font=("Arial", 10)).pack(anchor="w")
+        self.transient_time_var = tk.StringVar(value="3600")
+        tk.Entry(self.control_frame, textvariable=self.transient_time_var).pack(fill="x")
+        tk.Button(self.control_frame, text="Run Transient", command=self.run_transient).pack(fill="x", pady=(5,15))
 
         # Heatmap legend + status
         self.legend_canvas = tk.Canvas(self.control_frame, width=50, height=200)
         self.legend_canvas.pack()
         self.status_label = tk.Label(self.control_frame, text="", fg="gray")
         self.status_label.pack(pady=10)
+        self.results_label = tk.Label(self.control_frame, text="", justify="left", font=("Arial", 10))
+        self.results_label.pack(anchor="w")
 
     # ---------------- EVENTS ----------------
     def _bind_events(self):
         self.canvas.bind("<ButtonPress-1>", self.start_draw)
         self.canvas.bind("<B1-Motion>", self.draw_motion)
         self.canvas.bind("<ButtonRelease-1>", self.end_draw)
+        self.root.bind("<Control-z>", lambda event: self.undo())
+        self.root.bind("<Control-y>", lambda event: self.redo())
 
     # ---------------- DRAWING ----------------
     def start_draw(self, event):
-        x, y = event.x // self.cell_size, self.height - 1 - event.y // self.cell_size
-        if self.must_start and (x, y) != (0, 0):
-            self.status_label.config(text="Must start at (0,0)", fg="red")
-            self._flash_cell(0, 0, "red")
+        if self.draw_mode_var.get() != "shape" and not self.shape.drawn_points:
+            self.status_label.config(text="Draw a shape before painting", fg="red")
             return
-        self.must_start = False
         self.drawing = True
         self.drawn_coordinates = []
         self.add_point_from_event(event)
@@ -142,17 +236,28 @@ class ShapeUI:
             self.add_point_from_event(event)
 
     def end_draw(self, event):
+        if not self.drawing:
+            return
         self.drawing = False
-        self.integrate_shape()
+        mode = self.draw_mode_var.get()
+        if mode == "paint":
+            self.paint_shape()
+        elif mode == "source":
+            self.paint_heat_source()
+        else:
+            self.integrate_shape()
         self._draw_heat_source_line()
 
     def add_point_from_event(self, event):
+        # Canvas cells are grid indices, the shape takes physical coordinates
         x, y = event.x // self.cell_size, self.height - 1 - event.y // self.cell_size
-        if (x, y) not in self.drawn_coordinates:
-            self.drawn_coordinates.append((x, y))
+        coordinate = (x * self.resolution, y * self.resolution)
+        if coordinate not in self.drawn_coordinates:
+            self.drawn_coordinates.append(coordinate)
             self._draw_cell(x, y, "black")
 
     # ---------------- INTEGRATION ----------------
+    @profiled("ui.integrate_shape")
     def integrate_shape(self):
         if not self.drawn_coordinates:
             self.status_label.config(text="No points drawn", fg="red")
@@ -164,34 +269,63 @@ class ShapeUI:
             self.status_label.config(text="Invalid heat source temperature", fg="red")
             return
 
-        # Get sink k
-        sink_k = self._get_material_value(
-            self.sink_material_var, self.sink_custom_entry, Sink_Materials, self.sink_error_label
-        )
-        if sink_k is None:
-            return
+        # The base k and h are read when physics runs, so changing the material
+        # reuses the geometry. Only painted inserts carry their own k.
+        # Every stroke becomes its own region, filled down to y=0 or just the stroke cells.
+        if self.fill_var.get():
+            self.shape.integrate_under_line(
+                self.drawn_coordinates,
+                k_value=None,
+                h_value=None,
+                temperature=heat_temp
+            )
+        else:
+            self.shape.add_drawn_shape(self.drawn_coordinates, temperature=heat_temp)
 
-        # Get surround h
-        surround_h = self._get_material_value(
-            self.surround_material_var, self.surround_custom_entry, Surrounding_Materials, self.surround_error_label
-        )
-        if surround_h is None:
+        self.system = None
+        self._record("stroke")
+        self._render_uniform()
+        self._report_regions()
+        self._draw_heat_source_line()
+
+    def paint_shape(self):
+        """Paint the selected sink material and the heat generation onto drawn cells"""
+        if not self.drawn_coordinates:
+            return
+        k = self._get_material_value(self.sink_material_var, self.sink_custom_entry, Sink_Materials, self.sink_error_label)
+        if k is None:
+            return
+        try:
+            heat_source = float(self.heat_generation_var.get())
+        except ValueError:
+            self.status_label.config(text="Invalid heat generation", fg="red")
             return
 
-        # Pass numeric values to ShapeDataStructure
-        self.shape.integrate_under_line(
-            self.drawn_coordinates,
-            k_value=sink_k,
-            h_value=surround_h,
-            temperature=heat_temp
-        )
+        painted = self.shape.paint_properties(self.drawn_coordinates, k_value=k, heat_source=heat_source,
+                                              material=self.sink_material_var.get())
+        self.surrogate = None
+        self._record("paint")
+        self._render_uniform()
+        self.status_label.config(text=f"Painted {len(painted)} points", fg="black")
 
+    def paint_heat_source(self):
+        """Paint fixed temperature (heat source temperature) cells onto the shape"""
+        if not self.drawn_coordinates:
+            return
+        self.shape.add_heat_sources(self.drawn_coordinates)
+        self.system = None
+        self._record("heat source")
         self._render_uniform()
-        self.status_label.config(
-            text=f"{len(self.shape.drawn_points)} points integrated successfully",
-            fg="black"
-        )
-        self._draw_heat_source_line()
+        self._report_regions()
+
+    def _report_regions(self):
+        _, count, sourced = self.shape.label_components()
+        unheated = count - len(sourced)
+        text = f"{len(self.shape.drawn_points)} points in {count} bodies"
+        if unheated:
+            self.status_label.config(text=f"{text}, {unheated} without a heat source", fg="orange")
+        else:
+            self.status_label.config(text=text, fg="black")
 
     def _get_material_value(self, var, entry, material_dict, error_label):
         if var.get() == "Custom":
@@ -211,14 +345,61 @@ class ShapeUI:
             error_label.config(text="")
             return material_dict.get(var.get())
 
+    def _on_sink_material_selected(self, event=None):
+        emissivity = Sink_Emissivity.get(self.sink_material_var.get())
+        if emissivity is not None:
+            self.emissivity_var.set(str(emissivity))
+        self._clear_override("k")
+
+    def _on_surround_material_selected(self, event=None):
+        self._clear_override("h")
+
+    def _clear_override(self, name):
+        """The material k or h is in use again, after it was picked or edited"""
+        setattr(self, f"{name}_override", None)
+        self._sync_sliders()
+
+    def _material_number(self, var, entry, material_dict):
+        """Material value without flagging errors, None for an unparsable custom entry"""
+        if var.get() != "Custom":
+            return material_dict.get(var.get())
+        try:
+            return float(entry.get())
+        except ValueError:
+            return None
+
+    def _sync_sliders(self):
+        """Move the sliders to the k and h in use. Their callbacks see the confirmed position and skip the preview"""
+        k = self.k_override or self._material_number(self.sink_material_var, self.sink_custom_entry, Sink_Materials)
+        h = self.h_override or self._material_number(self.surround_material_var, self.surround_custom_entry,
+                                                     Surrounding_Materials)
+        for scale, value in ((self.k_scale, k), (self.h_scale, h)):
+            if value is not None and value > 0:
+                scale.set(np.log10(value))
+        self.slider_confirmed = (self.k_scale.get(), self.h_scale.get())
+
+    def _get_emissivity(self):
+        if not self.radiation_var.get():
+            return 0.0
+        try:
+            emissivity = float(self.emissivity_var.get())
+            if not 0 <= emissivity <= 1:
+                raise ValueError
+            self.emissivity_entry.config(bg="white")
+            return emissivity
+        except ValueError:
+            self.emissivity_entry.config(bg="#ff9999")
+            self.status_label.config(text="Emissivity must be between 0 and 1", fg="red")
+            return None
+
     # ---------------- HEAT SOURCE ----------------
     def _draw_heat_source_line(self):
         if not self.shape.drawn_points:
             return
         # Draw heat source exactly where the user drew points at x=0
         for point in self.shape.drawn_points:
-            if point.x == 0:  # Only for points at x=0
-                self._draw_heat_cell(0, point.y, "red")
+            if point.col == 0 and point.attributes.get('root'):  # Only for source points at x=0
+                self._draw_heat_cell(0, point.row, "red")
 
     def _draw_heat_cell(self, x, y, color):
         canvas_y = self.height - 1 - y
@@ -227,6 +408,7 @@ class ShapeUI:
         self.heat_canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline="gray")
 
     # ---------------- PHYSICS ----------------
+    @profiled("ui.run_physics")
     def run_physics(self):
         if not self.shape.drawn_points:
             return
@@ -245,20 +427,252 @@ class ShapeUI:
         if h is None:
             return
 
+        emissivity = self._get_emissivity()
+        if emissivity is None:
+            return
+
+        # Released slider values replace the material k / h, a k(T) curve is scaled to the slider k
+        k_factor = 1.0
+        if self.k_override is not None:
+            k_factor, k = self.k_override / k, self.k_override
+        if self.h_override is not None:
+            h = self.h_override
+        self.previewing = False
+
+        try:
+            layers = int(self.layers_var.get())
+            if layers < 1:
+                raise ValueError
+        except ValueError:
+            self.status_label.config(text="3D layers must be a positive integer", fg="red")
+            return
+        if layers > 1:
+            return self.run_extruded(layers, T_base, T_free_stream, h, k, emissivity)
+
+        # Swap in the k(T) curve when the material has one
+        if self.k_of_T_var.get() and self.sink_material_var.get() in Sink_Conductivity_Curves:
+            k = Sink_Conductivity_Curves[self.sink_material_var.get()]
+            if k_factor != 1.0:
+                k = dict(k, k=[value * k_factor for value in k["k"]])
+
         delta_x = self.resolution
+        if self.system is None:
+            self.system = SparseSystem(self.shape.drawn_points)
 
-        update_temperatures(
+        stats = update_temperatures(
             self.shape.drawn_points,
             T_base,
             T_free_stream,
             h,
             delta_x,
-            k
+            k,
+            emissivity=emissivity,
+            system=self.system,
+            cache=self.cache
         )
 
         self._render_heatmap()
         self._draw_heatmap_legend()
-        self.status_label.config(text="Physics simulation complete", fg="green")
+        self._show_heat_rates(T_base, T_free_stream, h, delta_x, k, emissivity)
+        self.last_run = (T_base, T_free_stream, h, delta_x, k, emissivity)
+        # Same geometry tiles, now with the solved field
+        current = self.history.current
+        self.history.replace(capture(self.shape, current, current.label, self._run_params(), stats))
+        source = "cached" if stats["cached"] else f"{stats['iterations']} iterations"
+        self.status_label.config(text=f"Physics simulation complete ({source}{self._slider_note()})", fg="green")
+        return True
+
+    def _slider_note(self):
+        """', k and h from the sliders' when released slider values replaced the material k / h"""
+        sliders = [name for name, value in (("k", self.k_override), ("h", self.h_override)) if value is not None]
+        return f", {' and '.join(sliders)} from the sliders" if sliders else ""
+
+    def _slider_values(self):
+        return 10 ** self.k_scale.get(), 10 ** self.h_scale.get()
+
+    def _preview(self, value=None):
+        """Approximate field for the slider k and h from the surrogate of the current geometry,
+        built on first use from a few solves across the sliders' Biot range. Convection only:
+        radiation and k(T) are left to the real solve on release."""
+        if not self.shape.drawn_points:
+            return
+        if (self.k_scale.get(), self.h_scale.get()) == self.slider_confirmed:
+            # Back at (or synced to) the values in use
+            self._end_preview()
+            return
+        try:
+            T_base = float(self.heat_temp_var.get())
+            T_free_stream = float(self.ambient_temp_var.get())
+        except ValueError:
+            return
+        k, h = self._slider_values()
+        self.k_scale.config(label=f"Preview k = {k:.3g} W/m·K")
+        self.h_scale.config(label=f"Preview h = {h:.3g} W/m²·K")
+
+        delta_x = self.resolution
+        if self.system is None:
+            self.system = SparseSystem(self.shape.drawn_points)
+        if self.surrogate is None or self.surrogate.system is not self.system:
+            if not BiotSurrogate.supports(self.system):
+                self.status_label.config(text="Painted inserts, preview needs Run Physics", fg="orange")
+                return
+            k_min, k_max = 10 ** self.k_scale.cget("from"), 10 ** self.k_scale.cget("to")
+            h_min, h_max = 10 ** self.h_scale.cget("from"), 10 ** self.h_scale.cget("to")
+            self.surrogate = BiotSurrogate(self.system, np.geomspace(h_min * delta_x / k_max, h_max * delta_x / k_min, 12))
+
+        temperatures = self.surrogate.field(T_base, T_free_stream, h, delta_x, k)
+        for point, temperature in zip(self.system.points, temperatures):
+            point.attributes['temperature'] = float(temperature)
+        self._render_heatmap()
+        self._draw_heatmap_legend()
+        heat_rate = self.surrogate.heat_rate(T_base, T_free_stream, h, delta_x, k)
+        self.results_label.config(text=f"Preview heat rate: ≈{heat_rate:.4g} W/m")
+        self.status_label.config(text="Preview, release the slider to solve", fg="gray")
+        self.previewing = True
+
+    def _end_preview(self):
+        """Put the last solved field back in place of a preview"""
+        if not self.previewing:
+            return
+        self.previewing = False
+        current = self.history.current
+        if current.params is None or self.system is None:
+            self._render_uniform()
+            return
+        field = current.field()
+        for point in self.system.points:
+            point.attributes['temperature'] = float(field[point.row, point.col])
+        self._render_heatmap()
+        self._draw_heatmap_legend()
+        if current.params.get("k") is not None:
+            self._show_heat_rates(**current.params)
+        self.status_label.config(text="Preview discarded", fg="gray")
+
+    def _confirm_preview(self, event=None):
+        """Solve for the slider values once a slider was released somewhere new. Only the moved slider
+        stands in for its material value, the selected materials, their k(T) curve and emissivity stay"""
+        positions = (self.k_scale.get(), self.h_scale.get())
+        if positions == self.slider_confirmed:
+            self._end_preview()
+            return
+        k, h = self._slider_values()
+        if positions[0] != self.slider_confirmed[0]:
+            self.k_override = k
+        if positions[1] != self.slider_confirmed[1]:
+            self.h_override = h
+        self.slider_confirmed = positions
+        self.run_physics()
+
+    def run_extruded(self, layers, T_base, T_free_stream, h, k, emissivity):
+        """3D solve of the extruded profile (constant k, convection only), drawn at mid depth.
+        Inputs the 3D solve does not model are refused rather than dropped."""
+        if emissivity > 0:
+            self.status_label.config(text="3D mode is convection only, untick Radiation", fg="red")
+            return
+        if self.k_of_T_var.get() and self.sink_material_var.get() in Sink_Conductivity_Curves:
+            self.status_label.config(text="3D mode needs a constant k, untick Temperature-dependent k", fg="red")
+            return
+        try:
+            field, stats = solve_extruded(self.shape, layers, T_base, T_free_stream, h, self.resolution, k)
+        except ValueError as e:
+            self.status_label.config(text=str(e), fg="red")
+            return
+        assign_layer_to_points(self.shape, field)
+        self.last_run = (T_base, T_free_stream, h, self.resolution, k, emissivity)
+        # The mid depth layer, marked with its layer count so it is never taken for a 2D field
+        current = self.history.current
+        self.history.replace(capture(self.shape, current, current.label, dict(self._run_params(), layers=layers),
+                                     stats))
+        self._render_heatmap()
+        self._draw_heatmap_legend()
+        self.results_label.config(text=(
+            f"Heat rate: {stats['heat_rate']:.4g} W over {stats['depth']:.3g} m depth\n"
+            f"Base heat: {stats['base_heat']:.4g} W"
+        ))
+        self.status_label.config(text=f"3D solve complete ({stats['nodes']} nodes, {stats['iterations']} iterations)",
+                                 fg="green")
+        return True
+
+    def show_sensitivity(self):
+        """Overlay the change of the objective if a surface cell is trimmed (on drawn cells)
+        or an empty neighbour cell is grown (on empty cells), red where it rises and blue where it falls"""
+        if self.layers_var.get().strip() != "1":
+            self.status_label.config(text="Sensitivity works on the 2D section, set 3D layers to 1", fg="red")
+            return
+        # Solving again is free for an unchanged design, it comes from the cache
+        if not self.run_physics():
+            return
+        objective = "heat_rate" if self.objective_var.get() == "heat rate" else "max_temperature"
+        T_base, T_free_stream, h, delta_x, k, emissivity = self.last_run
+        removal, addition, value = topology_sensitivity(self.system, T_base, T_free_stream, h, delta_x, k,
+                                                        objective=objective, emissivity=emissivity)
+
+        changes = [(p.row, p.col, d) for p, d in zip(self.system.points, removal) if not np.isnan(d)]
+        changes += [(row, col, d) for (row, col), d in addition.items()]
+        scale = max(max((abs(d) for _, _, d in changes), default=0.0), 1e-300)
+        for row, col, d in changes:
+            self._draw_cell(col, row, self._sensitivity_to_color(d / scale))
+        name = self.objective_var.get()
+        self.status_label.config(text=f"{name} {value:.4g}: change if a drawn cell is trimmed or an empty cell "
+                                      f"is grown, red raises it, blue lowers it (max {scale:.3g})", fg="black")
+
+    def _show_heat_rates(self, T_base, T_free_stream, h, delta_x, k, emissivity):
+        summary = heat_rate_summary(self.system, T_base, T_free_stream, h, delta_x, k, emissivity=emissivity)
+        self.results_label.config(text=(
+            f"Heat rate: {summary['heat_rate']:.4g} W/m\n"
+            f"Base heat flux: {summary['base_flux']:.4g} W/m²\n"
+            f"Fin efficiency: {summary['efficiency']:.3f}\n"
+            f"Fin effectiveness: {summary['effectiveness']:.3f}"
+        ))
+
+    def run_transient(self):
+        if not self.shape.drawn_points:
+            return
+        try:
+            T_base = float(self.heat_temp_var.get())
+            T_free_stream = float(self.ambient_temp_var.get())
+            t_end = float(self.transient_time_var.get())
+            if t_end <= 0:
+                raise ValueError
+        except ValueError:
+            self.status_label.config(text="Invalid temperature or time", fg="red")
+            return
+
+        material = self.sink_material_var.get()
+        if material not in Sink_Density:
+            self.status_label.config(text="Transient needs a listed sink material", fg="red")
+            return
+        k = Sink_Materials[material]
+        h = self._get_material_value(self.surround_material_var, self.surround_custom_entry, Surrounding_Materials, self.surround_error_label)
+        if h is None:
+            return
+        # Released slider values replace the material k / h, as in run_physics
+        if self.k_override is not None:
+            k = self.k_override
+        if self.h_override is not None:
+            h = self.h_override
+
+        # Snapshots go to disk, only the frames being drawn are read back
+        frames = 50
+        snapshot_path = os.path.join(tempfile.gettempdir(), "heat_sink_transient")
+        if self.system is None:
+            self.system = SparseSystem(self.shape.drawn_points)
+        points = self.system.points
+        stats = run_transient(points, T_base, T_free_stream, h, self.resolution, k,
+                              Sink_Density[material], Sink_Specific_Heat[material],
+                              t_end=t_end, dt=t_end / 200, scheme="crank_nicolson", adaptive=True,
+                              snapshot_path=snapshot_path, snapshot_interval=t_end / frames, system=self.system)
+        store = ResultStore.open(snapshot_path)
+        self._play_snapshots(points, store, [case["t"] for case in store.cases()], 0)
+        self.status_label.config(text=f"Transient complete ({stats['steps']} steps{self._slider_note()})", fg="green")
+
+    def _play_snapshots(self, points, store, times, frame):
+        store.assign_to_points(points, frame)
+        self._render_heatmap()
+        self._draw_heatmap_legend()
+        self.status_label.config(text=f"t = {times[frame]:.0f} s", fg="black")
+        if frame + 1 < len(times):
+            self.root.after(100, lambda: self._play_snapshots(points, store, times, frame + 1))
 
     # ---------------- RENDERING ----------------
     def _draw_cell(self, x, y, color):
@@ -272,29 +686,35 @@ class ShapeUI:
             for y in range(self.height):
                 self._draw_cell(x, y, "white")
 
-    def _highlight_start_cell(self):
-        self._draw_cell(0, 0, "#90ee90")
-
-    def _flash_cell(self, x, y, color):
-        self._draw_cell(x, y, color)
-        self.root.after(300, lambda: self._draw_cell(x, y, "#90ee90"))
-
     def _render_uniform(self):
         for point in self.shape.drawn_points:
-            self._draw_cell(int(point.x), int(point.y), "skyblue")
-
+            color = "skyblue"
+            if point.attributes.get('root') and point.col != 0:
+                color = "red"  # painted heat source
+            elif point.attributes.get('heat_source'):
+                color = "orange"
+            elif point.attributes.get('k') is not None:
+                color = "#b87333"  # painted insert
+            self._draw_cell(point.col, point.row, color)
+
+    @profiled("ui.render_heatmap")
     def _render_heatmap(self):
         temps = [p.attributes['temperature'] for p in self.shape.drawn_points]
         t_min, t_max = min(temps), max(temps)
         for point in self.shape.drawn_points:
             color = self._temperature_to_color(point.attributes['temperature'], t_min, t_max)
-            self._draw_cell(int(point.x), int(point.y), color)
+            self._draw_cell(point.col, point.row, color)
 
     def _temperature_to_color(self, temp, t_min, t_max):
         ratio = (temp - t_min) / (t_max - t_min) if t_max != t_min else 0
         r, g, b = int(255*ratio), 50, int(255*(1-ratio))
         return f"#{r:02x}{g:02x}{b:02x}"
 
+    def _sensitivity_to_color(self, ratio):
+        """White at zero, red for positive and blue for negative ratios in [-1, 1]"""
+        fade = int(255 * (1 - min(abs(ratio), 1.0)))
+        return f"#ff{fade:02x}{fade:02x}" if ratio > 0 else f"#{fade:02x}{fade:02x}ff"
+
     def _draw_heatmap_legend(self):
         self.legend_canvas.delete("all")
         height = 200
@@ -306,17 +726,139 @@ class ShapeUI:
         self.legend_canvas.create_text(25, 10, text=f"{max(temps):.1f}", fill="black")
         self.legend_canvas.create_text(25, 190, text=f"{min(temps):.1f}", fill="black")
 
+    # ---------------- HISTORY ----------------
+    def _record(self, label):
+        self.history.push(capture(self.shape, self.history.current, label))
+
+    def _run_params(self):
+        return dict(zip(("T_base", "T_free_stream", "h", "delta_x", "k", "emissivity"), self.last_run))
+
+    def undo(self):
+        undone = self.history.current.label
+        snapshot = self.history.undo()
+        if snapshot is None:
+            self.status_label.config(text="Nothing to undo", fg="gray")
+            return
+        self._show_snapshot(snapshot, f"Undid {undone}")
+
+    def redo(self):
+        snapshot = self.history.redo()
+        if snapshot is None:
+            self.status_label.config(text="Nothing to redo", fg="gray")
+            return
+        self._show_snapshot(snapshot, f"Redid {snapshot.label}")
+
+    def _show_snapshot(self, snapshot, message):
+        """Put a snapshot back on the shape and redraw it, as a heatmap when it holds a solved field"""
+        restore(self.shape, snapshot)
+        self.system = None
+        self.results_label.config(text="")
+        self.canvas.delete("all")
+        self.heat_canvas.delete("all")
+        self.legend_canvas.delete("all")
+        self._draw_grid()
+        if snapshot.params is not None and self.shape.drawn_points:
+            self._render_heatmap()
+            self._draw_heatmap_legend()
+        else:
+            self._render_uniform()
+        self._draw_heat_source_line()
+        self.status_label.config(text=message, fg="black")
+
+    # ---------------- SESSIONS ----------------
+    SESSION_VARIABLES = ("sink_material_var", "surround_material_var", "k_of_T_var", "radiation_var", "emissivity_var",
+                         "heat_temp_var", "ambient_temp_var", "draw_mode_var", "fill_var", "heat_generation_var",
+                         "layers_var", "transient_time_var", "objective_var")
+    SESSION_ENTRIES = ("sink_custom_entry", "surround_custom_entry")
+
+    def _selections(self):
+        selections = {name: getattr(self, name).get() for name in self.SESSION_VARIABLES}
+        selections.update({name: getattr(self, name).get() for name in self.SESSION_ENTRIES})
+        return selections
+
+    def _apply_selections(self, selections):
+        for name in self.SESSION_VARIABLES:
+            if name in selections:
+                getattr(self, name).set(selections[name])
+        for name in self.SESSION_ENTRIES:
+            if name in selections:
+                getattr(self, name).delete(0, tk.END)
+                getattr(self, name).insert(0, selections[name])
+        self.k_override = self.h_override = None
+        self._sync_sliders()
+
+    def save_session(self):
+        """Save the current design, its solved field and the control panel to a session file"""
+        path = filedialog.asksaveasfilename(defaultextension=".hss", filetypes=[("Heat sink session", "*.hss")])
+        if not path:
+            return
+        current = self.history.current
+        save_session(path, self.shape, self._selections(), current.params,
+                     layers={name: current.layer(name) for name in current.layers})
+        self.status_label.config(text=f"Saved {os.path.basename(path)}", fg="green")
+
+    def open_session(self):
+        """Open a session file as a fresh undo history, resizing the grid to the session's"""
+        path = filedialog.askopenfilename(filetypes=[("Heat sink session", "*.hss"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            session = Session.open(path)
+        except (OSError, ValueError) as e:
+            self.status_label.config(text=str(e), fg="red")
+            return
+        if session.shape != self.shape.mask.shape or session.header["resolution"] != self.resolution:
+            self.shape = session.new_shape()
+            self.height, self.width = session.shape
+            self.resolution = session.header["resolution"]
+            self.canvas.config(width=self.width * self.cell_size, height=self.height * self.cell_size)
+            self.heat_canvas.config(height=self.height * self.cell_size)
+        self._apply_selections(session.selections)
+        self.history = History()
+        self.pinned = None
+        self._show_snapshot(self.history.push(session.snapshot()), f"Opened {os.path.basename(path)}")
+
+    def pin_design(self):
+        self.pinned = self.history.current
+        self.status_label.config(text="Design pinned, edit and click Compare", fg="black")
+
+    def compare_to_pinned(self):
+        """Difference heatmap of the current design minus the pinned one, solved with the current inputs.
+        Either design is only solved when its snapshot has no field for these inputs."""
+        if self.pinned is None:
+            self.status_label.config(text="Pin a design first", fg="red")
+            return
+        if self.layers_var.get().strip() != "1":
+            self.status_label.config(text="Compare works on the 2D section, set 3D layers to 1", fg="red")
+            return
+        if not self.shape.drawn_points or not self.run_physics():
+            return
+        current = self.history.current
+        self.pinned = solved(self.pinned, self.shape, current.params, self.cache)
+        change, only_current, only_pinned = difference(current, self.pinned)
+
+        scale = max(float(np.nanmax(np.abs(change), initial=0.0)), 1e-300)
+        for (row, col), delta in np.ndenumerate(change):
+            if not np.isnan(delta):
+                self._draw_cell(col, row, self._sensitivity_to_color(delta / scale))
+        for row, col in zip(*np.nonzero(only_current | only_pinned)):
+            self._draw_cell(col, row, "#999999" if only_current[row, col] else "#444444")
+        self.legend_canvas.delete("all")
+        self.status_label.config(text=f"Current - pinned: red warmer, blue cooler (max {scale:.3g} °C), "
+                                      f"gray only in one design", fg="black")
+
     # ---------------- CLEAR ----------------
     def clear(self):
         self.shape.clear_shape()
+        self.system = None
+        self._record("clear")
+        self.results_label.config(text="")
         self.drawn_coordinates = []
         self.canvas.delete("all")
         self.heat_canvas.delete("all")
         self.legend_canvas.delete("all")
-        self.must_start = True
         self._draw_grid()
-        self._highlight_start_cell()
-        self.status_label.config(text="Start drawing at (0,0)", fg="blue")
+        self.status_label.config(text="Draw a shape, x=0 cells are heat sources", fg="blue")
 
             # ---------------- RUN ----------------
     def run(self):
@@ -10,4 +10,57 @@ Sink_Materials = {
     "carbon steel" : 63.9,
     "stainless steel" : 14.9,
     "silver" : 429
-}
\ No newline at end of file
+}
+
+# material : k(T) curve, temperatures in °C
+# A curve is either a table {"T": [...], "k": [...]} that is linearly interpolated
+# or polynomial coefficients {"poly": [...]} (highest power first), see math_module.conductivity_function
+Sink_Conductivity_Curves = {
+    "aluminum" : {"T": [-73, 27, 127, 327, 527], "k": [237, 237, 240, 231, 218]},
+    "copper" : {"T": [-73, 27, 127, 327, 527], "k": [413, 401, 393, 379, 366]},
+    "iron" : {"T": [-73, 27, 127, 327, 527], "k": [94.0, 80.2, 69.5, 54.7, 43.3]},
+    "carbon steel" : {"T": [27, 127, 327, 527], "k": [63.9, 58.7, 48.8, 39.2]},
+    "stainless steel" : {"T": [27, 127, 327, 527], "k": [14.9, 16.6, 19.8, 22.6]}
+}
+
+# material : total hemispherical emissivity of the (as machined / oxidized) surface [-]
+Sink_Emissivity = {
+    "aluminum" : 0.09,
+    "chromium" : 0.08,
+    "copper" : 0.07,
+    "bronze" : 0.1,
+    "brass" : 0.06,
+    "gold" : 0.02,
+    "iron" : 0.44,
+    "carbon steel" : 0.8,
+    "stainless steel" : 0.17,
+    "silver" : 0.02
+}
+
+# material : density (rho) [kg/m^3]
+Sink_Density = {
+    "aluminum" : 2702,
+    "chromium" : 7160,
+    "copper" : 8933,
+    "bronze" : 8800,
+    "brass" : 8530,
+    "gold" : 19300,
+    "iron" : 7870,
+    "carbon steel" : 7832,
+    "stainless steel" : 7900,
+    "silver" : 10500
+}
+
+# material : specific heat (c_p) [J/(kg-K)]
+Sink_Specific_Heat = {
+    "aluminum" : 903,
+    "chromium" : 449,
+    "copper" : 385,
+    "bronze" : 420,
+    "brass" : 380,
+    "gold" : 129,
+    "iron" : 447,
+    "carbon steel" : 434,
+    "stainless steel" : 477,
+    "silver" : 235
+}
@@ -0,0 +1,78 @@
+# benchmark_precision.py
+# Time, memory and accuracy of the double / single / mixed precision modes on one profile.
+# python benchmark_precision.py --width 120 --height 80 --steps 50
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from math_module import SparseSystem, Factorization
+from physics import TransientSolver, run_transient
+from sweep import shape_from_heights
+
+MODES = ("double", "single", "mixed")
+
+def _timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+def benchmark(heights, T_base=100.0, T_free_stream=25.0, h=50.0, delta_x=0.001, k=237.0,
+              density=2700.0, specific_heat=900.0, steps=50, repeat=3):
+    """Rows of (mode, steady factor s, steady solve s, factor MB, steady error,
+    transient s, transient error, snapshot store MB)"""
+    shape = shape_from_heights(heights)
+    system = SparseSystem(shape.drawn_points)
+    A, b = system.assemble(T_base, T_free_stream, system.node_values('h', h), delta_x, system.node_values('k', k))
+    dt = 0.01
+
+    rows = []
+    reference = None
+    for mode in MODES:
+        # 1. Steady: factorization and solve
+        factor, factor_time = _timed(lambda: Factorization(A, mode), repeat)
+        steady, solve_time = _timed(lambda: factor.solve(b), repeat)
+
+        # 2. Transient: fixed steps on a cached factorization, snapshots to a store
+        stepper = TransientSolver(system, T_base, T_free_stream, h, delta_x, k, density, specific_heat, precision=mode)
+        T = np.full(system.n, T_free_stream, dtype=stepper.dtype)
+        T[system.root] = T_base
+        start = time.perf_counter()
+        for _ in range(steps):
+            T = stepper.step(T, dt, "crank_nicolson")
+        transient_time = time.perf_counter() - start
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshots")
+            run_transient(None, T_base, T_free_stream, h, delta_x, k, density, specific_heat, t_end=dt * steps,
+                          dt=dt, scheme="crank_nicolson", snapshot_path=path, system=system, precision=mode)
+            store_bytes = os.path.getsize(os.path.join(path, "results.bin"))
+
+        if reference is None:
+            reference = (steady.astype(np.float64), T.astype(np.float64))
+        rows.append((mode, factor_time, solve_time, factor.nbytes / 2**20,
+                     float(np.max(np.abs(steady - reference[0]))), transient_time,
+                     float(np.max(np.abs(T - reference[1]))), store_bytes / 2**20))
+    return system.n, rows
+
+def print_table(n, rows):
+    print(f"{n} nodes")
+    print(f"{'mode':<8}{'factor s':>10}{'solve s':>10}{'LU MB':>9}{'steady err':>12}"
+          f"{'transient s':>13}{'trans err':>11}{'store MB':>10}")
+    for mode, factor_time, solve_time, factor_mb, error, transient_time, transient_error, store_mb in rows:
+        print(f"{mode:<8}{factor_time:>10.4f}{solve_time:>10.4f}{factor_mb:>9.2f}{error:>12.2e}"
+              f"{transient_time:>13.4f}{transient_error:>11.2e}{store_mb:>10.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the double, single and mixed precision solve modes")
+    parser.add_argument("--width", type=int, default=120, help="columns of the profile")
+    parser.add_argument("--height", type=int, default=80, help="height of the tallest column")
+    parser.add_argument("--steps", type=int, default=50, help="transient steps")
+    args = parser.parse_args(argv)
+
+    # A stepped profile: the base at full height tapering to a third of it
+    heights = np.linspace(args.height, max(args.height // 3, 2), args.width).astype(int).tolist()
+    print_table(*benchmark(heights, steps=args.steps))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# benchmark_schwarz.py
+# Scaling of the Schwarz solver with the grid size and the worker count, against the direct solve.
+# python benchmark_schwarz.py --fins 10 40 160 --workers 1 2 4
+# Per row: the first call (start the workers, factor, solve), a call with new values on the same
+# pattern (refactor, solve), a repeated call (solve only, the factors are reused) and the direct solve.
+import argparse
+import time
+import numpy as np
+import scipy.sparse.linalg as spla
+from math_module import SparseSystem
+from schwarz import SchwarzSolver
+from sweep import shape_from_heights
+
+def comb(fins, height=40, base=4):
+    """A comb sink: a base block and fins two cells thick with two cell gaps"""
+    return [height] + [height, height, base, base] * fins
+
+def _timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+def benchmark(fin_counts, worker_counts, T_base=100.0, T_free_stream=25.0, h=50.0, delta_x=0.001, k=237.0):
+    """Rows of (nodes, workers, subdomains, first s, refactor s, reuse s, direct s, iterations, max error)"""
+    rows = []
+    for fins in fin_counts:
+        shape = shape_from_heights(comb(fins))
+        system = SparseSystem(shape.drawn_points)
+        A, b = system.assemble(T_base, T_free_stream, h, delta_x, k)
+        A2, b2 = system.assemble(T_base, T_free_stream, 2 * h, delta_x, k)
+        direct, direct_time = _timed(lambda: spla.spsolve(A.tocsc(), b))
+        for workers in worker_counts:
+            with SchwarzSolver(system, workers=workers) as solver:
+                _, first = _timed(lambda: solver(A, b))
+                _, refactor = _timed(lambda: solver(A2, b2))
+                x, reuse = _timed(lambda: solver(A2, b2))
+                iterations = solver.stats["krylov_iterations"]
+            error = float(np.max(np.abs(x - spla.spsolve(A2.tocsc(), b2))))
+            rows.append((system.n, workers, len(solver.subdomains), first, refactor, reuse, direct_time,
+                         iterations, error))
+    return rows
+
+def print_table(rows):
+    print(f"{'nodes':>9}{'workers':>9}{'parts':>7}{'first s':>10}{'refactor s':>12}{'reuse s':>10}"
+          f"{'direct s':>10}{'GMRES its':>11}{'max err':>10}")
+    for nodes, workers, parts, first, refactor, reuse, direct, iterations, error in rows:
+        print(f"{nodes:>9}{workers:>9}{parts:>7}{first:>10.3f}{refactor:>12.3f}{reuse:>10.3f}"
+              f"{direct:>10.3f}{iterations:>11}{error:>10.1e}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the Schwarz solver against the direct solve")
+    parser.add_argument("--fins", type=int, nargs="+", default=[10, 40, 160], help="fin counts of the comb sinks")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker process counts")
+    args = parser.parse_args(argv)
+    print_table(benchmark(args.fins, args.workers))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# extrude.py
+# 3D mode: the drawn profile extruded over N node layers in z, so the end faces convect and the
+# fin has a finite depth instead of the unit thickness of the 2D section.
+# Everything is built from the ShapeDataStructure masks with arrays (no Point objects),
+# so memory stays linear in the node count (a 200 x 200 x 50 mesh is 2M nodes).
+#
+# Finite volumes on the nodes: a 3D cell (between 2 x 2 x 2 nodes) is material when its 2D
+# square has all four corners drawn. Every node owns an octant of each of its 8 cells, so
+#   conductance to a neighbour = k * (material cells around the edge) * quarter face / spacing
+#   exposed area               = quarter faces between a material and an empty octant
+#   volume                     = material octants * cell volume / 8
+# which reduces to the 2D planar / corner stencils on every layer.
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spla
+from Enum import NodeType3D
+
+OCTANT_TYPES = {8: NodeType3D.INTERIOR, 7: NodeType3D.INTERIOR_CORNER, 6: NodeType3D.INTERIOR_EDGE,
+                5: NodeType3D.STEP, 4: NodeType3D.FACE, 3: NodeType3D.STEP, 2: NodeType3D.EDGE, 1: NodeType3D.CORNER}
+
+class ExtrudedSystem:
+    """Node set, classification and face conductances of a mask extruded over `layers` node layers.
+    Arrays are indexed [layer, row=y, col=x] like the 2D masks."""
+    def __init__(self, mask, roots, layers, delta_x, delta_z=None):
+        if layers < 2:
+            raise ValueError("An extruded fin needs at least 2 node layers")
+        self.layers = layers
+        self.delta_x = delta_x
+        self.delta_z = delta_x if delta_z is None else delta_z
+        rows, cols = mask.shape
+
+        # 1. Material cells, padded by one empty cell on every side:
+        # cell (k, j, i) spans nodes k..k+1, j..j+1, i..i+1 and sits at cells[k+1, j+1, i+1]
+        squares = mask[:-1, :-1] & mask[1:, :-1] & mask[:-1, 1:] & mask[1:, 1:]
+        self.cells = np.zeros((layers + 1, rows + 1, cols + 1), dtype=bool)
+        self.cells[1:layers, 1:rows, 1:cols] = squares
+
+        # 2. Octants: the 8 cells around node (k, j, i) are cells[k:k+2, j:j+2, i:i+2]
+        self.octants = np.zeros((layers, rows, cols), dtype=np.uint8)
+        for a, b, c in np.ndindex(2, 2, 2):
+            self.octants += self._shifted(a, b, c)
+        self.node = self.octants > 0
+        self.root = self.node & roots[None, :, :]
+        self.n = int(np.count_nonzero(self.node))
+        self.index = np.full(self.node.shape, -1, dtype=np.int32 if self.n < 2**31 else np.int64)
+        self.index[self.node] = np.arange(self.n, dtype=self.index.dtype)
+
+    def _shifted(self, a, b, c):
+        """Cell of octant (a, b, c) for every node, a view of the padded cell array"""
+        layers, rows, cols = self.octants.shape
+        return self.cells[a:a + layers, b:b + rows, c:c + cols]
+
+    def node_types(self):
+        """NodeType3D of every node, in node index order"""
+        types = np.empty(self.n, dtype=object)
+        octants = self.octants[self.node]
+        for count, node_type in OCTANT_TYPES.items():
+            types[octants == count] = node_type
+        types[self.root[self.node]] = NodeType3D.ROOT
+        return types
+
+    def faces(self):
+        """(a, b, area / length) for every conducting face between neighbouring nodes.
+        The face area is a quarter face per material cell around the edge a-b."""
+        dx, dz = self.delta_x, self.delta_z
+        layers, rows, cols = self.octants.shape
+        c = self.cells
+        # Around an x edge (k, j, i)-(k, j, i+1) lie cells i, j-1..j and k-1..k, likewise for y and z
+        count_x = (c[0:layers, 0:rows, 1:cols].astype(np.uint8) + c[0:layers, 1:rows + 1, 1:cols]
+                   + c[1:layers + 1, 0:rows, 1:cols] + c[1:layers + 1, 1:rows + 1, 1:cols])
+        count_y = (c[0:layers, 1:rows, 0:cols].astype(np.uint8) + c[0:layers, 1:rows, 1:cols + 1]
+                   + c[1:layers + 1, 1:rows, 0:cols] + c[1:layers + 1, 1:rows, 1:cols + 1])
+        count_z = (c[1:layers, 0:rows, 0:cols].astype(np.uint8) + c[1:layers, 0:rows, 1:cols + 1]
+                   + c[1:layers, 1:rows + 1, 0:cols] + c[1:layers, 1:rows + 1, 1:cols + 1])
+        faces = []
+        # Quarter face over spacing: x and y faces are dx*dz/4 over dx, z faces dx*dx/4 over dz
+        for axis, count, ratio in ((2, count_x, dz / 4), (1, count_y, dz / 4), (0, count_z, dx * dx / 4 / dz)):
+            low = [slice(None)] * 3
+            high = [slice(None)] * 3
+            low[axis] = slice(0, -1)
+            high[axis] = slice(1, None)
+            conducting = count > 0
+            faces.append((self.index[tuple(low)][conducting], self.index[tuple(high)][conducting],
+                          count[conducting] * ratio))
+        return [np.concatenate(parts) for parts in zip(*faces)]
+
+    def exposed_area(self):
+        """Convecting area of every node: octant faces between a material and an empty cell"""
+        dx, dz = self.delta_x, self.delta_z
+        area = np.zeros(self.octants.shape)
+        for a, b in np.ndindex(2, 2):
+            area += (self._shifted(a, b, 0) ^ self._shifted(a, b, 1)) * (dx * dz / 4)  # normal to x
+            area += (self._shifted(a, 0, b) ^ self._shifted(a, 1, b)) * (dx * dz / 4)  # normal to y
+            area += (self._shifted(0, a, b) ^ self._shifted(1, a, b)) * (dx * dx / 4)  # normal to z
+        return area[self.node]
+
+    def volume(self):
+        return self.octants[self.node] * (self.delta_x**2 * self.delta_z / 8)
+
+    def temperature_field(self, temperatures):
+        """Node temperatures back on the [layer, y, x] grid, NaN outside the material"""
+        field = np.full(self.node.shape, np.nan)
+        field[self.node] = temperatures
+        return field
+
+def solve_extruded(shape, layers, T_base, T_free_stream, h, delta_x, k, depth=None, heat_source=0.0,
+                   solver="cg", rtol=1e-10):
+    """Steady temperatures of the drawn shape extruded to `depth` (default: layers-1 cells of delta_x)
+    over `layers` node layers. Heat source cells are held at T_base through the whole depth.
+    The source nodes are eliminated, which leaves a symmetric positive definite system:
+    solver='cg' (Jacobi preconditioned conjugate gradients, memory linear in nodes) or 'direct'.
+    Returns (temperature field [layer, y, x] with NaN outside, stats).
+    k and h are single constants: painted per point k, h or heat generation raise a ValueError."""
+    if isinstance(k, dict):
+        raise ValueError("3D mode needs a constant k, not a k(T) curve")
+    if any(point.attributes.get('k') is not None or point.attributes.get('h') is not None
+           or point.attributes.get('heat_source') for point in shape.drawn_points):
+        raise ValueError("3D mode does not support painted k, h or heat generation")
+    delta_z = delta_x if depth is None else depth / (layers - 1)
+    system = ExtrudedSystem(shape.mask, shape.root_mask(), layers, delta_x, delta_z)
+
+    # 1. Faces and node areas
+    a, b, ratio = system.faces()
+    conductance = k * ratio
+    hA = h * system.exposed_area()
+    root = system.root[system.node]
+    free = ~root
+    unknown = np.cumsum(free) - 1
+
+    # 2. Reduced system K T_free = rhs, source temperatures moved to the right side
+    diagonal = hA + np.bincount(a, conductance, system.n) + np.bincount(b, conductance, system.n)
+    rhs = hA * T_free_stream + heat_source * system.volume()
+    both = free[a] & free[b]
+    rhs += np.bincount(a, conductance * root[b] * T_base, system.n) + np.bincount(b, conductance * root[a] * T_base, system.n)
+    ia, ib = unknown[a[both]], unknown[b[both]]
+    n_free = int(np.count_nonzero(free))
+    K = sps.csr_matrix((np.concatenate([-conductance[both], -conductance[both], diagonal[free]]),
+                        (np.concatenate([ia, ib, np.arange(n_free)]), np.concatenate([ib, ia, np.arange(n_free)]))),
+                       shape=(n_free, n_free))
+    rhs = rhs[free]
+
+    # 3. Solve
+    stats = {"nodes": system.n, "unknowns": n_free, "iterations": 1}
+    if solver == "cg":
+        iterations = []
+        inverse_diagonal = 1.0 / diagonal[free]
+        jacobi = spla.LinearOperator(K.shape, lambda r: r * inverse_diagonal)
+        solution, info = spla.cg(K, rhs, x0=np.full(n_free, 0.5 * (T_base + T_free_stream)), M=jacobi,
+                                 rtol=rtol, atol=0.0, maxiter=20 * n_free, callback=iterations.append)
+        stats["iterations"] = len(iterations)
+        if info != 0:
+            print(f"WARNING: CG did not converge in {len(iterations)} iterations")
+    elif solver == "direct":
+        solution = spla.spsolve(K.tocsc(), rhs)
+    else:
+        raise ValueError(f"Unknown solver: {solver}")
+
+    temperatures = np.full(system.n, float(T_base))
+    temperatures[free] = solution
+
+    # 4. Heat rejected by the surfaces and conducted out of the source
+    stats["heat_rate"] = float(np.sum((hA * (temperatures - T_free_stream))[free]))
+    out_of_root = root[a] != root[b]
+    sign = np.where(root[a], 1.0, -1.0)
+    stats["base_heat"] = float(np.sum((conductance * sign * (temperatures[a] - temperatures[b]))[out_of_root]))
+    stats["depth"] = (layers - 1) * delta_z
+    return system.temperature_field(temperatures), stats
+
+def assign_layer_to_points(shape, field, layer=None):
+    """Put one layer (the middle one by default) of a 3D field on the drawn points, e.g. to draw it"""
+    section = field[field.shape[0] // 2 if layer is None else layer]
+    for point in shape.drawn_points:
+        row, col = shape._cell(point)
+        if not np.isnan(section[row, col]):
+            point.attributes['temperature'] = float(section[row, col])
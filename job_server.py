@@ -0,0 +1,450 @@
+# job_server.py
+# Local HTTP/JSON service that solves fin designs submitted from scripts and UIs on one machine.
+#   python job_server.py serve --port 8765 --workers 4
+#   python job_server.py demo        (serves on loopback and submits a few jobs with the client)
+#
+#   POST /jobs              {"jobs": [job, ...]} or a single job, answers {"ids": [...]}
+#   GET  /jobs/<id>         status, and the result once the job is done
+#   GET  /jobs/<id>/events  progress as a chunked stream of JSON lines, ends with the job
+#   GET  /status            queue length and job counts
+# A job is {"heights": [...]} (cells filled per column) or {"cells": [[x, y], ...]} (drawn cells),
+# plus the numbers k, h, T_base and T_free_stream and optionally emissivity, heat_source and delta_x.
+# Identical jobs get the same id, so a job that is queued, running or done is solved once.
+# A job's grid (columns x rows, every grid cell is a point) is limited to max_nodes, a batch is only
+# queued if every job in it is valid. Finished jobs are kept for finished_ttl seconds and at most
+# max_finished of them, each worker keeps the geometries of its last MAX_WORKER_GEOMETRIES jobs.
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from splitter import ShapeDataStructure
+from math_module import SparseSystem
+from physics import update_temperatures
+from postprocess import heat_rate_summary
+from result_cache import canonical_order
+from sweep import shape_from_heights
+
+REQUIRED = ("k", "h", "T_base", "T_free_stream")
+NUMBERS = REQUIRED + ("emissivity", "heat_source", "delta_x")
+POSITIVE = ("k", "delta_x")
+FINISHED = ("done", "failed")
+MAX_NODES = 250_000
+MAX_WORKER_GEOMETRIES = 16
+
+def job_id(spec):
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+def _non_empty_list(values, name):
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"'{name}' must be a non-empty list")
+    return values
+
+def grid_size(spec):
+    """Points of the grid a job builds, ShapeDataStructure makes one per grid cell"""
+    if "heights" in spec:
+        heights = _non_empty_list(spec["heights"], "heights")
+        if not all(isinstance(h, int) and h >= 0 for h in heights):
+            raise ValueError("'heights' must be non-negative integers")
+        return len(heights) * (max(heights) + 1)
+    cells = _non_empty_list(spec["cells"], "cells")
+    if not all(isinstance(cell, list) and len(cell) == 2 and all(isinstance(v, int) and v >= 0 for v in cell)
+               for cell in cells):
+        raise ValueError("'cells' must be [x, y] pairs of non-negative integers")
+    return (max(x for x, _ in cells) + 1) * (max(y for _, y in cells) + 1)
+
+def validate_job(spec, max_nodes=MAX_NODES):
+    if not isinstance(spec, dict):
+        raise ValueError("A job must be a JSON object")
+    if ("heights" in spec) == ("cells" in spec):
+        raise ValueError("A job needs exactly one of 'heights' or 'cells'")
+    missing = [name for name in REQUIRED if name not in spec]
+    if missing:
+        raise ValueError(f"Missing job fields: {', '.join(missing)}")
+    for name in NUMBERS:
+        value = spec.get(name, 1)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"'{name}' must be a finite number")
+        if name in POSITIVE and value <= 0:
+            raise ValueError(f"'{name}' must be positive")
+    size = grid_size(spec)
+    if size > max_nodes:
+        raise ValueError(f"The job's grid has {size} nodes, the limit is {max_nodes}")
+    return spec
+
+# ---------------- WORKER SIDE ----------------
+# Each worker process builds a geometry once and reuses it for the jobs on it, least recently used evicted
+_worker_shapes = OrderedDict()
+
+def _job_geometry(spec):
+    if "heights" in spec:
+        key = ("heights", tuple(spec["heights"]))
+    else:
+        key = ("cells", tuple(sorted(tuple(cell) for cell in spec["cells"])))
+    if key not in _worker_shapes:
+        # The grid is laid out in cells, delta_x only scales the physics
+        if key[0] == "heights":
+            shape = shape_from_heights(spec["heights"])
+        else:
+            cells = key[1]
+            shape = ShapeDataStructure(max(x for x, _ in cells) + 1, max(y for _, y in cells) + 1, verbose=False)
+            shape.add_drawn_shape(list(cells))
+        _worker_shapes[key] = (shape, SparseSystem(shape.drawn_points))
+        while len(_worker_shapes) > MAX_WORKER_GEOMETRIES:
+            _worker_shapes.popitem(last=False)
+    _worker_shapes.move_to_end(key)
+    return _worker_shapes[key]
+
+def solve_job(spec):
+    """Headless ShapeDataStructure + physics solve of one job, returns a JSON ready result"""
+    shape, system = _job_geometry(spec)
+    delta_x = spec.get("delta_x", 1)
+    emissivity = spec.get("emissivity", 0.0)
+    stats = update_temperatures(None, spec["T_base"], spec["T_free_stream"], spec["h"], delta_x, spec["k"],
+                                emissivity=emissivity, heat_source=spec.get("heat_source", 0.0), system=system)
+    summary = heat_rate_summary(system, spec["T_base"], spec["T_free_stream"], spec["h"], delta_x, spec["k"],
+                                emissivity=emissivity)
+    points = system.points
+    nodes = [[points[i].x, points[i].y, points[i].attributes['temperature']] for i in canonical_order(points)]
+    return {"nodes": nodes, "summary": summary, "iterations": stats["iterations"]}
+
+def run_batch(batch, progress):
+    """Solve a batch of (id, job) in one worker call, reporting each job on the progress queue"""
+    results = []
+    for identifier, spec in batch:
+        progress.put((identifier, "running"))
+        try:
+            results.append((identifier, solve_job(spec), None))
+        except Exception as error:
+            results.append((identifier, None, f"{type(error).__name__}: {error}"))
+    return results
+
+# ---------------- SERVER ----------------
+class Job:
+    def __init__(self, identifier, spec):
+        self.id = identifier
+        self.spec = spec
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.events = []
+        self.changed = asyncio.Event()
+
+class JobServer:
+    """asyncio HTTP front end, a job queue and a process pool.
+    Dispatcher tasks (one per worker) take up to batch_size queued jobs, waiting at most
+    batch_delay seconds for more, and solve them in a single pool call.
+    Finished jobs are dropped after finished_ttl seconds, or oldest first beyond max_finished."""
+    def __init__(self, workers=None, batch_size=8, batch_delay=0.05, max_nodes=MAX_NODES, max_finished=1000,
+                 finished_ttl=3600.0):
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_nodes = max_nodes
+        self.max_finished = max_finished
+        self.finished_ttl = finished_ttl
+        self.jobs = {}
+        # Finished job ids in the order they finished, with the time
+        self.finished = OrderedDict()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        """Start serving, returns the bound port (pass port=0 for any free port)"""
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.manager = multiprocessing.Manager()
+        self.progress = self.manager.Queue()
+        self.listener = threading.Thread(target=self._listen_progress, daemon=True)
+        self.listener.start()
+        self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self._handle, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"Job server on http://{host}:{self.port} with {self.workers} workers")
+        return self.port
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        self.progress.put(None)
+        self.listener.join()
+        self.pool.shutdown(cancel_futures=True)
+        self.manager.shutdown()
+
+    # ---------------- JOBS ----------------
+    def submit(self, spec):
+        """Queue a job unless the same job is already queued, running or done"""
+        return self.submit_all([spec])[0]
+
+    def submit_all(self, specs):
+        """Validate every job first, then queue them, so a bad job rejects the whole batch"""
+        if not isinstance(specs, list):
+            raise ValueError("'jobs' must be a list of job objects")
+        for spec in specs:
+            validate_job(spec, self.max_nodes)
+        self._evict()
+        identifiers = []
+        for spec in specs:
+            identifier = job_id(spec)
+            job = self.jobs.get(identifier)
+            if job is None or job.status == "failed":
+                self.finished.pop(identifier, None)
+                job = self.jobs[identifier] = Job(identifier, spec)
+                self._record(identifier, "queued")
+                self.queue.put_nowait(job)
+            identifiers.append(identifier)
+        return identifiers
+
+    def _evict(self):
+        """Drop finished jobs past their time to live, then the oldest beyond max_finished"""
+        expired = time.time() - self.finished_ttl
+        while self.finished and (len(self.finished) > self.max_finished or next(iter(self.finished.values())) < expired):
+            identifier, _ = self.finished.popitem(last=False)
+            del self.jobs[identifier]
+
+    def _record(self, identifier, status, **details):
+        job = self.jobs.get(identifier)
+        if job is None or job.status in FINISHED and status == "running":
+            # Progress travels on its own queue and can arrive after the batch result (or the eviction)
+            return
+        job.status = status
+        if status in FINISHED:
+            self.finished[identifier] = time.time()
+        job.events.append(dict(details, id=identifier, status=status, time=time.time()))
+        # Wake every stream waiting on this job
+        job.changed.set()
+        job.changed = asyncio.Event()
+
+    def _listen_progress(self):
+        """Forward progress from the worker processes to the event loop"""
+        while True:
+            item = self.progress.get()
+            if item is None:
+                return
+            self.loop.call_soon_threadsafe(self._record, *item)
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = self.loop.time() + self.batch_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _dispatch(self):
+        while True:
+            batch = await self._next_batch()
+            work = [(job.id, job.spec) for job in batch]
+            try:
+                results = await self.loop.run_in_executor(self.pool, run_batch, work, self.progress)
+            except Exception as error:
+                results = [(job.id, None, f"{type(error).__name__}: {error}") for job in batch]
+            for identifier, result, error in results:
+                job = self.jobs[identifier]
+                job.result, job.error = result, error
+                if error is None:
+                    self._record(identifier, "done", heat_rate=result["summary"]["heat_rate"])
+                else:
+                    self._record(identifier, "failed", error=error)
+            self._evict()
+
+    # ---------------- HTTP ----------------
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            await self._route(method, path, body, writer)
+        except (ValueError, json.JSONDecodeError) as error:
+            await self._respond(writer, 400, {"error": str(error)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _route(self, method, path, body, writer):
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        if method == "POST" and parts == ["jobs"]:
+            payload = json.loads(body or b"{}")
+            specs = payload["jobs"] if isinstance(payload, dict) and "jobs" in payload else [payload]
+            await self._respond(writer, 202, {"ids": self.submit_all(specs)})
+        elif method == "GET" and parts == ["status"]:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            await self._respond(writer, 200, {"queued": self.queue.qsize(), "jobs": counts})
+        elif method == "GET" and len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                await self._respond(writer, 404, {"error": f"Unknown job {parts[1]}"})
+            elif len(parts) == 3 and parts[2] == "events":
+                await self._stream_events(job, writer)
+            else:
+                await self._respond(writer, 200, {"id": job.id, "status": job.status, "result": job.result,
+                                                  "error": job.error})
+        else:
+            await self._respond(writer, 404, {"error": f"No route for {method} {path}"})
+
+    async def _respond(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _stream_events(self, job, writer):
+        """Every event of the job so far, then new ones as they happen, one JSON line per chunk"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        sent = 0
+        while True:
+            changed = job.changed
+            for event in job.events[sent:]:
+                line = json.dumps(event).encode() + b"\n"
+                writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            sent = len(job.events)
+            await writer.drain()
+            if job.status in FINISHED:
+                break
+            await changed.wait()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found"}
+
+# ---------------- CLIENT ----------------
+class JobClient:
+    """Minimal asyncio client for the job server, one connection per request"""
+    def __init__(self, host="127.0.0.1", port=8765):
+        self.host = host
+        self.port = port
+
+    async def _open(self, method, path, payload=None):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        body = b"" if payload is None else json.dumps(payload).encode()
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers, reader, writer
+
+    async def _request(self, method, path, payload=None):
+        status, headers, reader, writer = await self._open(method, path, payload)
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+        writer.close()
+        answer = json.loads(body)
+        if status >= 400:
+            raise RuntimeError(f"{status}: {answer.get('error')}")
+        return answer
+
+    async def submit(self, *jobs):
+        return (await self._request("POST", "/jobs", {"jobs": list(jobs)}))["ids"]
+
+    async def get(self, identifier):
+        return await self._request("GET", f"/jobs/{identifier}")
+
+    async def status(self):
+        return await self._request("GET", "/status")
+
+    async def events(self, identifier):
+        """Async iterator over the progress events of a job until it finishes"""
+        status, _, reader, writer = await self._open("GET", f"/jobs/{identifier}/events")
+        if status >= 400:
+            writer.close()
+            raise RuntimeError(f"{status}: unknown job {identifier}")
+        try:
+            while True:
+                size = int((await reader.readline()).strip(), 16)
+                if size == 0:
+                    break
+                chunk = await reader.readexactly(size)
+                await reader.readline()
+                yield json.loads(chunk)
+        finally:
+            writer.close()
+
+    async def wait(self, identifier):
+        """Follow a job's events until it finishes and return its final state"""
+        async for _ in self.events(identifier):
+            pass
+        return await self.get(identifier)
+
+# ---------------- ENTRY POINTS ----------------
+async def serve(host, port, workers, batch_size, max_nodes=MAX_NODES):
+    server = JobServer(workers=workers, batch_size=batch_size, max_nodes=max_nodes)
+    await server.start(host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+async def demo(workers=2):
+    """Serve on loopback, submit a batch with a duplicate and follow it with the client"""
+    server = JobServer(workers=workers)
+    port = await server.start("127.0.0.1", 0)
+    client = JobClient(port=port)
+    try:
+        base = {"heights": [8, 8, 6, 6, 4, 4, 2], "h": 50, "T_base": 100, "T_free_stream": 25, "delta_x": 0.001}
+        jobs = [dict(base, k=k) for k in (237, 401, 16)] + [dict(base, k=237)]
+        ids = await client.submit(*jobs)
+        print(f"Submitted {len(jobs)} jobs as {len(set(ids))} unique ids")
+        async for event in client.events(ids[0]):
+            print(f"  {event['id']}: {event['status']}")
+        for identifier, job in zip(ids, jobs):
+            state = await client.wait(identifier)
+            print(f"k={job['k']}: {state['status']}, heat rate {state['result']['summary']['heat_rate']:.4g} W/m")
+        print(await client.status())
+    finally:
+        await server.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local fin simulation job server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    serve_parser.add_argument("--batch-size", type=int, default=8)
+    serve_parser.add_argument("--max-nodes", type=int, default=MAX_NODES, help="largest grid a job may build")
+    demo_parser = commands.add_parser("demo")
+    demo_parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port, args.workers, args.batch_size, args.max_nodes))
+    else:
+        asyncio.run(demo(args.workers))
+
+if __name__ == "__main__":
+    main()
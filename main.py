@@ -1,6 +1,14 @@
+import argparse
 import ShapeUI
+import profiling
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Heat sink drawing and simulation tool")
+    parser.add_argument("--profile", nargs="?", const="profiles", metavar="DIR",
+                        help="profile strokes and solves into DIR, see profiling.py")
+    args = parser.parse_args()
+    if args.profile:
+        profiling.enable(args.profile)
     ui = ShapeUI.ShapeUI()
-    ui.run()
\ No newline at end of file
+    ui.run()
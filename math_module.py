@@ -1,84 +1,58 @@
 import sympy as sp
 import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spla
 from Enum import PointType
+from profiling import profiled
 
+# Stencils in the local frame of a node rotated to rotation = 0:
+# planar nodes are exposed on +x, interior corners miss the +x+y quadrant and
+# exterior corners only have material in the +x+y quadrant.
+# type : (neighbor offsets and weights, diagonal, convection weight, capacity)
+LOCAL_STENCILS = {
+    PointType.INTERIOR: ([((0, 1), 1), ((0, -1), 1), ((1, 0), 1), ((-1, 0), 1)], -4.0, 0.0, 1.0),
+    PointType.INTERIOR_CORNER: ([((-1, 0), 2), ((0, -1), 2), ((1, 0), 1), ((0, 1), 1)], -6.0, 2.0, 1.5),
+    PointType.PLANAR: ([((-1, 0), 2), ((0, 1), 1), ((0, -1), 1)], -4.0, 2.0, 1.0),
+    PointType.EXTERIOR_CORNER: ([((1, 0), 1), ((0, 1), 1)], -2.0, 2.0, 0.5),
+}
+
+def _rotate_offset(offset, rot):
+    """Rotate a grid offset by rot (a multiple of pi/2)"""
+    dx, dy = offset
+    cos_rot = int(round(np.cos(rot)))
+    sin_rot = int(round(np.sin(rot)))
+    return dx * cos_rot - dy * sin_rot, dx * sin_rot + dy * cos_rot
+
+def index_grid(point_list):
+    """[row, col] array of every point's position in point_list, -1 where there is no point"""
+    rows = np.array([p.row for p in point_list], dtype=np.int64)
+    cols = np.array([p.col for p in point_list], dtype=np.int64)
+    grid = np.full((rows.max(initial=-1) + 1, cols.max(initial=-1) + 1), -1, dtype=np.int64)
+    grid[rows, cols] = np.arange(len(rows))
+    return grid
+
+@profiled("math.set_equations")
 def set_equations(point_list, T_base, T_free_stream, h, delta_x, k):
-    valid_points = {(p.x, p.y) for p in point_list}
+    point_list = list(point_list)
+    grid = index_grid(point_list)
+    symbols = [sp.Symbol(f'T{p.col}x{p.row}') for p in point_list]
 
-    for point in point_list:
+    for point, T in zip(point_list, symbols):
         n, m = point.x, point.y
-        T = sp.Symbol(f'T{n}x{m}')
-        rot = point.attributes.get('rotation', 0)
-        
-        # Get the point type enum directly
         point_type = point.attributes.get('type')
-        
-        # Calculate rotated coordinates
-        cos_rot = int(np.cos(rot))
-        sin_rot = int(np.sin(rot))
-        
-        # Check if this is a root node (x=0 overrides other types)
-        if n == 0:
-            # Root node
-            eq = T - T_base
-            print(f"Point({n},{m}) ROOT (x=0): T = {T_base}")
-            
-        # Otherwise use the point type
-        elif point_type == PointType.INTERIOR:
-            # Interior node
-            T_up    = sp.Symbol(f'T{n}x{m+1}') if (n, m+1) in valid_points else 0
-            T_down  = sp.Symbol(f'T{n}x{m-1}') if (n, m-1) in valid_points else 0
-            T_right = sp.Symbol(f'T{n+1}x{m}') if (n+1, m) in valid_points else 0
-            T_left  = sp.Symbol(f'T{n-1}x{m}') if (n-1, m) in valid_points else 0
-            eq = T_up + T_down + T_right + T_left - 4*T
-            print(f"Point({n},{m}) INTERIOR: conduction only")
-            
-        elif point_type == PointType.INTERIOR_CORNER:
-            # Interior corner
-            T_nc_m = sp.Symbol(f'T{n - cos_rot}x{m}') if (n - cos_rot, m) in valid_points else 0
-            T_n_ms = sp.Symbol(f'T{n}x{m + sin_rot}') if (n, m + sin_rot) in valid_points else 0
-            T_nc2_m = sp.Symbol(f'T{n + cos_rot}x{m}') if (n + cos_rot, m) in valid_points else 0
-            T_n_ms2 = sp.Symbol(f'T{n}x{m - sin_rot}') if (n, m - sin_rot) in valid_points else 0
-            
-            eq = (2*(T_nc_m + T_n_ms) + T_nc2_m + T_n_ms2 
-                  - 2*(3 + h*delta_x/k)*T 
-                  + 2*(h*delta_x/k)*T_free_stream)
-            print(f"Point({n},{m}) INTERIOR_CORNER")
-            
-        elif point_type == PointType.PLANAR:
-            # Planar surface
-            T_nc_m = sp.Symbol(f'T{n - cos_rot}x{m}') if (n - cos_rot, m) in valid_points else 0
-            T_n_ms = sp.Symbol(f'T{n}x{m + sin_rot}') if (n, m + sin_rot) in valid_points else 0
-            T_n_ms2 = sp.Symbol(f'T{n}x{m - sin_rot}') if (n, m - sin_rot) in valid_points else 0
-            
-            eq = (2*(T_nc_m + T_n_ms + T_n_ms2) 
-                  - 2*(2 + h*delta_x/k)*T 
-                  + 2*(h*delta_x/k)*T_free_stream)
-            print(f"Point({n},{m}) PLANAR")
-            
-        elif point_type == PointType.EXTERIOR_CORNER:
-            # Exterior corner
-            T_n_ms = sp.Symbol(f'T{n}x{m - sin_rot}') if (n, m - sin_rot) in valid_points else 0
-            T_nc_m = sp.Symbol(f'T{n - cos_rot}x{m}') if (n - cos_rot, m) in valid_points else 0
-            
-            eq = (T_n_ms + T_nc_m 
-                  - 2*(2 + h*delta_x/k)*T 
-                  + 2*(h*delta_x/k)*T_free_stream)
-            print(f"Point({n},{m}) EXTERIOR_CORNER")
-            
-        elif point_type == PointType.ROOT and n != 0:
-            # Root but not at x=0 (unlikely, but handle it)
+        neighbors, diag, conv, capacity, root = _stencil_terms(point, grid)
+
+        if root:
             eq = T - T_base
-            print(f"Point({n},{m}) ROOT (non-zero x)")
-            
+            print(f"Point({n},{m}) ROOT: T = {T_base}")
         else:
-            # Fallback - this should not happen if types are set correctly
-            print(f"WARNING: Point({n},{m}) has type {point_type}, using interior fallback")
-            T_up    = sp.Symbol(f'T{n}x{m+1}') if (n, m+1) in valid_points else 0
-            T_down  = sp.Symbol(f'T{n}x{m-1}') if (n, m-1) in valid_points else 0
-            T_right = sp.Symbol(f'T{n+1}x{m}') if (n+1, m) in valid_points else 0
-            T_left  = sp.Symbol(f'T{n-1}x{m}') if (n-1, m) in valid_points else 0
-            eq = T_up + T_down + T_right + T_left - 4*T
+            if point_type not in LOCAL_STENCILS:
+                # Fallback - this should not happen if types are set correctly
+                print(f"WARNING: Point({n},{m}) has type {point_type}, using interior fallback")
+            eq = sum(w * symbols[j] for j, w in neighbors) + diag * T
+            if conv:
+                eq += -conv * (h * delta_x / k) * T + conv * (h * delta_x / k) * T_free_stream
+            print(f"Point({n},{m}) {point_type.name if point_type else None}")
 
         point.attributes['equation'] = eq
         point.attributes['label'] = T
@@ -97,6 +71,7 @@ def make_variable_list(point_list):
         variable_list.append(variable)
     return variable_list
 
+@profiled("math.solve_system")
 def solve_system(equation_list, variable_list):
     try:
         # Convert to matrix form
@@ -120,4 +95,216 @@ def assign_temp_to_point(point_list, temperature_list):
     
     for p, t in zip(point_list, temperature_list):
         # add max temp divided by distance
-        p.attributes['temperature'] = float(t)
\ No newline at end of file
+        p.attributes['temperature'] = float(t)
+
+
+def _stencil_terms(point, grid):
+    """Stencil of one point, shared by set_equations and SparseSystem, with grid from index_grid.
+    Returns (neighbors, diag, conv, capacity, root) where neighbors are (position, w) and the row reads
+    sum(w * T_neighbor) + diag*T - conv*Bi*T + conv*Bi*T_free_stream = 0
+    and capacity is the heat capacity of the node's cell relative to a full cell,
+    scaled like the row (planar rows are doubled half cells, corners are 3/4 and 1/4 cells)"""
+    row, col = point.row, point.col
+    rot = point.attributes.get('rotation', 0)
+    point_type = point.attributes.get('type')
+
+    # Heat source cells are classified as ROOT by the splitter
+    if point_type == PointType.ROOT:
+        return [], 1.0, 0.0, 0.0, True
+
+    terms, diag, conv, capacity = LOCAL_STENCILS.get(point_type, LOCAL_STENCILS[PointType.INTERIOR])
+    neighbors = []
+    for offset, w in terms:
+        dx, dy = _rotate_offset(offset, rot)
+        r, c = row + dy, col + dx
+        j = grid[r, c] if 0 <= r < grid.shape[0] and 0 <= c < grid.shape[1] else -1
+        if j >= 0:
+            neighbors.append((int(j), w))
+        else:
+            # Missing neighbor: treat that face as insulated
+            diag += w
+    return neighbors, diag, conv, capacity, False
+
+class SparseSystem:
+    """Sparse matrix form of the set_equations stencils.
+    The sparsity pattern is built once per point list. Rows are kept in flux form,
+    sum(w * r_ij * (T_j - T_i)) - conv*Bi_i*(T_i - T_free_stream) + capacity*q*delta_x^2/k_i = 0
+    with r_ij = k_face/k_i and k_face the harmonic mean of the two node conductivities,
+    so per node k, h and heat generation only rewrite values on the cached pattern."""
+    @profiled("math.sparse_pattern")
+    def __init__(self, point_list):
+        self.points = list(point_list)
+        self.n = len(self.points)
+        # Position of every node by integer grid cell, as a dict and as a [row, col] array
+        self.index = {(p.row, p.col): i for i, p in enumerate(self.points)}
+        self.grid = index_grid(self.points)
+
+        rows, cols, weights = [], [], []
+        self.conv = np.zeros(self.n)
+        self.capacity = np.zeros(self.n)
+        self.root = np.zeros(self.n, dtype=bool)
+
+        for i, point in enumerate(self.points):
+            neighbors, diag, conv, capacity, root = _stencil_terms(point, self.grid)
+            for j, w in neighbors:
+                rows.append(i)
+                cols.append(j)
+                weights.append(w)
+            self.conv[i] = conv
+            self.capacity[i] = capacity
+            self.root[i] = root
+
+        # Off diagonal entries (one per face) in COO form
+        self.rows = np.array(rows, dtype=np.int64)
+        self.cols = np.array(cols, dtype=np.int64)
+        self.weights = np.array(weights, dtype=np.float64)
+
+        # CSR pattern with every diagonal stored, and where each COO entry lands in it
+        diagonal = np.arange(self.n)
+        all_rows = np.concatenate([self.rows, diagonal])
+        all_cols = np.concatenate([self.cols, diagonal])
+        order = np.lexsort((all_cols, all_rows))
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(all_rows, minlength=self.n))])
+        self.pattern = sps.csr_matrix((np.zeros(len(order)), all_cols[order], indptr), shape=(self.n, self.n))
+        self.offdiag_pos = position[:len(self.rows)]
+        self.diag_pos = position[len(self.rows):]
+
+    def node_property(self, name):
+        """Per node value of a numeric point attribute, NaN where the point does not set it"""
+        values = [p.attributes.get(name) for p in self.points]
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+    def node_values(self, name, default):
+        """Point attribute where set, default (number or per node array) elsewhere"""
+        values = self.node_property(name)
+        return np.where(np.isnan(values), np.broadcast_to(np.asarray(default, dtype=np.float64), (self.n,)), values)
+
+    def _nodes(self, value):
+        return np.broadcast_to(np.asarray(value, dtype=np.float64), (self.n,))
+
+    def biot(self, h, delta_x, k):
+        """Per node h*delta_x/k, h and k may be numbers or arrays over the nodes"""
+        return self._nodes(h) * delta_x / self._nodes(k)
+
+    def face_ratio(self, k):
+        """r_ij = k_face/k_i for every off diagonal entry, k_face = 2 k_i k_j / (k_i + k_j)"""
+        k = self._nodes(k)
+        return 2 * k[self.cols] / (k[self.rows] + k[self.cols])
+
+    def assemble(self, T_base, T_free_stream, h, delta_x, k, heat_source=0.0):
+        """Return (A, b) with A @ T = b, A shares the cached sparsity pattern.
+        h, k and heat_source (volumetric, W/m^3) may be numbers or per node arrays"""
+        k = self._nodes(k)
+        bi = self.biot(h, delta_x, k)
+        coupling = self.weights * self.face_ratio(k)
+
+        A = self.pattern.copy()
+        A.data[self.offdiag_pos] = coupling
+        A.data[self.diag_pos] = np.where(self.root, 1.0, -np.bincount(self.rows, coupling, self.n) - self.conv * bi)
+
+        generation = self.capacity * self._nodes(heat_source) * delta_x**2 / k
+        b = np.where(self.root, T_base, -self.conv * bi * T_free_stream - generation)
+        return A, b
+
+    def conduction_jacobian(self, T, k, dk):
+        """Extra Jacobian entries (in A.data layout) of the conduction terms when
+        k = k(T) varies per node, dk is dk/dT at every node"""
+        k = self._nodes(k)
+        dk = self._nodes(dk)
+        k_i, k_j = k[self.rows], k[self.cols]
+        gradient = self.weights * (T[self.cols] - T[self.rows])
+        dr_dki = -2 * k_j / (k_i + k_j)**2
+        dr_dkj = 2 * k_i / (k_i + k_j)**2
+
+        extra = np.zeros(len(self.pattern.data))
+        extra[self.offdiag_pos] = gradient * dr_dkj * dk[self.cols]
+        extra[self.diag_pos] = np.bincount(self.rows, gradient * dr_dki * dk[self.rows], self.n)
+        return extra
+
+    def k_adjoint_product(self, adjoint, T, T_free_stream, h, delta_x, k, heat_source=0.0):
+        """adjoint^T dR/dk_p for every node p, R = A @ T - b the assembled residual.
+        Face terms w*r_ij*(T_j - T_i) depend on k_i and k_j, the convection term
+        conv*Bi_i*(T_i - T_free_stream) and the generation capacity*q*delta_x^2/k_i on k_i"""
+        k = self._nodes(k)
+        k_i, k_j = k[self.rows], k[self.cols]
+        gradient = self.weights * (T[self.cols] - T[self.rows]) * adjoint[self.rows]
+        dr_dki = -2 * k_j / (k_i + k_j)**2
+        dr_dkj = 2 * k_i / (k_i + k_j)**2
+
+        product = np.bincount(self.rows, gradient * dr_dki, self.n) + np.bincount(self.cols, gradient * dr_dkj, self.n)
+        own = (self.conv * self._nodes(h) * delta_x * (T - T_free_stream)
+               - self.capacity * self._nodes(heat_source) * delta_x**2) / k**2
+        return product + np.where(self.root, 0.0, adjoint * own)
+
+# Working precision of the factorizations and what the solution is returned in
+PRECISIONS = {"double": np.float64, "single": np.float32, "mixed": np.float64}
+
+class Factorization:
+    """LU factorization of A in the working precision.
+    double  float64 LU
+    single  float32 LU and float32 solutions, half the memory and bandwidth
+    mixed   float32 LU, solutions refined on the float64 residual back to float64 accuracy.
+            residual is the relative residual the last mixed solve reached, a warning is printed
+            when max_refinements run out above tol."""
+    def __init__(self, A, precision="double", tol=1e-13, max_refinements=10):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+        self.precision = precision
+        self.dtype = PRECISIONS[precision]
+        self.A = A
+        self.tol = tol
+        self.max_refinements = max_refinements
+        factor_dtype = np.float64 if precision == "double" else np.float32
+        self.lu = spla.splu(A.astype(factor_dtype).tocsc())
+        self.refinements = 0
+        self.residual = None
+
+    @property
+    def nbytes(self):
+        """Memory held by the L and U factors"""
+        return (self.lu.L.nnz + self.lu.U.nnz) * self.lu.L.dtype.itemsize
+
+    def solve(self, b):
+        x = self.lu.solve(np.asarray(b, dtype=self.lu.L.dtype))
+        if self.precision != "mixed":
+            return x
+        # Iterative refinement: residual in float64, correction from the float32 factors
+        x = x.astype(np.float64)
+        b = np.asarray(b, dtype=np.float64)
+        scale = np.max(np.abs(b)) + 1e-300
+        refinements = 0
+        while True:
+            residual = b - self.A @ x
+            self.residual = float(np.max(np.abs(residual)) / scale)
+            if self.residual <= self.tol or refinements == self.max_refinements:
+                break
+            x += self.lu.solve(residual.astype(np.float32))
+            refinements += 1
+        self.refinements += refinements
+        if self.residual > self.tol:
+            print(f"WARNING: mixed precision stopped after {refinements} refinements "
+                  f"(relative residual {self.residual:.3e}, target {self.tol:.0e})")
+        return x
+
+@profiled("math.solve_sparse")
+def solve_sparse(A, b, precision="double"):
+    if precision == "double":
+        return spla.spsolve(A.tocsc(), b)
+    return Factorization(A, precision).solve(b)
+
+def conductivity_function(k):
+    """Turn a conductivity into a vectorized k(T) callable.
+    k can be a number, a callable, a table {"T": [...], "k": [...]} or a polynomial {"poly": [...]}"""
+    if callable(k):
+        return k
+    if isinstance(k, dict):
+        if "poly" in k:
+            coefficients = np.asarray(k["poly"], dtype=np.float64)
+            return lambda T: np.polyval(coefficients, T)
+        T_table = np.asarray(k["T"], dtype=np.float64)
+        k_table = np.asarray(k["k"], dtype=np.float64)
+        return lambda T: np.interp(T, T_table, k_table)
+    value = float(k)
+    return lambda T: np.full(np.shape(T), value)
@@ -0,0 +1,190 @@
+# optimizer.py
+# Searches fin profiles (cells filled per column, as integrate_under_line consumes a stroke)
+# for the best heat rate per material area, and returns the Pareto front of heat rate vs area.
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.sparse.linalg as spla
+from splitter import ShapeDataStructure
+from math_module import SparseSystem, assign_temp_to_point
+from physics import update_temperatures
+from postprocess import heat_rate_summary
+from sweep import shape_from_heights
+
+def is_valid_profile(heights):
+    """The fin must start at x=0 and stay attached: non-zero columns form a prefix.
+    Nodes are cell corners, so a filled column must be at least 2 nodes high and no taller
+    than its tallest neighbour, otherwise it ends in a line of nodes without material."""
+    filled = [h > 0 for h in heights]
+    count = sum(filled)
+    if count < 2 or not all(filled[:count]):
+        return False
+    heights = list(heights[:count])
+    for x in range(1, count):
+        neighbours = heights[x - 1:x] + heights[x + 1:x + 2]
+        if heights[x] < 2 or heights[x] > max(neighbours):
+            return False
+    return True
+
+def profile_area(heights, delta_x=1):
+    """Material area: the cells spanned between neighbouring columns"""
+    return sum(max(min(a, b) - 1, 0) for a, b in zip(heights, heights[1:])) * delta_x**2
+
+def perturb(heights, area_budget, max_height, rng, max_step=2):
+    """Random change of one column or a pair of neighbouring columns that keeps the
+    profile valid and within the area budget"""
+    for _ in range(100):
+        child = list(heights)
+        move = rng.choice(("grow", "shrink", "transfer"))
+        column = rng.randrange(len(child))
+        # Pairs let a plateau grow, a single column can not rise above both neighbours
+        columns = [column, column + 1] if rng.random() < 0.5 and column + 1 < len(child) else [column]
+        step = rng.randint(1, max_step)
+        if move == "grow":
+            for c in columns:
+                child[c] = min(child[c] + step, max_height)
+        elif move == "shrink":
+            for c in columns:
+                child[c] = 0 if child[c] - step < 2 else child[c] - step
+        else:
+            # Move height from one column to another
+            other = rng.randrange(len(child))
+            step = min(step, child[column], max_height - child[other])
+            child[column] -= step
+            child[other] += step
+        if child != list(heights) and is_valid_profile(child) and profile_area(child) <= area_budget:
+            return child
+    return list(heights)
+
+class ProfileEvaluator:
+    """Solves profiles on one reusable grid. Remembers the last solved (parent) profile,
+    its factorization and field, so a child is solved as a warm started GMRES
+    preconditioned by the parent LU, and not factored from scratch."""
+    def __init__(self, width, max_height, T_base, T_free_stream, h, k, delta_x=1):
+        self.params = dict(T_base=T_base, T_free_stream=T_free_stream, h=h, k=k, delta_x=delta_x)
+        # The grid is laid out in cells, delta_x only scales the physics
+        self.shape = ShapeDataStructure(width, max_height + 1, verbose=False)
+        self.results = {}
+        self.parent = None  # (heights, index, lu, temperatures)
+
+    def _build(self, heights):
+        shape_from_heights(heights, shape=self.shape)
+        return SparseSystem(self.shape.drawn_points)
+
+    def _parent_preconditioner(self, system):
+        """Parent LU on the nodes the two profiles share, Jacobi on the new ones"""
+        _, parent_index, lu, _ = self.parent
+        shared = np.array([parent_index.get(key, -1) for key in system.index], dtype=np.int64)
+        inside = shared >= 0
+
+        def apply(r, diagonal):
+            parent_r = np.zeros(len(parent_index))
+            parent_r[shared[inside]] = r[inside]
+            z = r / diagonal
+            z[inside] = lu.solve(parent_r)[shared[inside]]
+            return z
+        return shared, apply
+
+    def evaluate(self, heights):
+        key = tuple(heights)
+        if key in self.results:
+            return self.results[key]
+
+        p = self.params
+        system = self._build(heights)
+        reused = False
+        if self.parent is None:
+            update_temperatures(None, p["T_base"], p["T_free_stream"], p["h"], p["delta_x"], p["k"], system=system)
+        else:
+            A, b = system.assemble(p["T_base"], p["T_free_stream"], system.node_values('h', p["h"]), p["delta_x"],
+                                   system.node_values('k', p["k"]))
+            shared, apply = self._parent_preconditioner(system)
+            diagonal = A.diagonal()
+            if len(shared) == len(self.parent[1]) and np.array_equal(shared, np.arange(len(shared))):
+                # Same topology as the parent, its factorization solves this directly
+                T = self.parent[2].solve(b)
+                reused = True
+            else:
+                # Warm start from the parent field, T_free_stream on new nodes
+                x0 = np.full(system.n, float(p["T_free_stream"]))
+                x0[shared >= 0] = self.parent[3][shared[shared >= 0]]
+                M = spla.LinearOperator(A.shape, lambda r: apply(r, diagonal))
+                T, info = spla.gmres(A, b, x0=x0, M=M, rtol=1e-10, atol=0.0, maxiter=200)
+                if info != 0:
+                    T = spla.spsolve(A.tocsc(), b)
+            assign_temp_to_point(system.points, T)
+
+        summary = heat_rate_summary(system, p["T_base"], p["T_free_stream"], p["h"], p["delta_x"], p["k"])
+        result = {"heights": list(heights), "area": profile_area(heights, p["delta_x"]),
+                  "heat_rate": summary["heat_rate"], "efficiency": summary["efficiency"],
+                  "reused_factorization": reused}
+        result["heat_rate_per_area"] = result["heat_rate"] / result["area"]
+        self.results[key] = result
+        return result
+
+    def set_parent(self, heights):
+        """Solve and factor the parent profile that the next children start from"""
+        if self.parent is not None and self.parent[0] == list(heights):
+            return
+        p = self.params
+        system = self._build(heights)
+        A, b = system.assemble(p["T_base"], p["T_free_stream"], system.node_values('h', p["h"]), p["delta_x"],
+                               system.node_values('k', p["k"]))
+        lu = spla.splu(A.tocsc())
+        self.parent = (list(heights), dict(system.index), lu, lu.solve(b))
+
+# One evaluator per worker process
+_evaluator = None
+
+def _init_worker(args):
+    global _evaluator
+    _evaluator = ProfileEvaluator(*args)
+
+def _evaluate_family(family):
+    """Evaluate the children of one parent on the same worker, so they share its factorization"""
+    parent, children = family
+    _evaluator.set_parent(parent)
+    return [_evaluator.evaluate(child) for child in children]
+
+def pareto_front(results):
+    """Results not beaten by another with at most the area and at least the heat rate"""
+    front = []
+    for result in sorted(results, key=lambda r: (r["area"], -r["heat_rate"])):
+        if not front or result["heat_rate"] > front[-1]["heat_rate"]:
+            front.append(result)
+    return front
+
+def optimize_profile(initial_heights, area_budget, T_base, T_free_stream, h, k, max_height=None, delta_x=1,
+                     generations=20, parents_per_generation=8, children_per_parent=6, workers=None, seed=0):
+    """Evolve fin profiles under a material area budget, in the units of profile_area(heights, delta_x).
+    Every generation perturbs members of the current Pareto front, the children of a parent
+    are evaluated together on one worker in parallel with the other families.
+    Returns the Pareto front of heat rate vs area, smallest area first."""
+    rng = random.Random(seed)
+    width = len(initial_heights)
+    max_height = max_height or max(initial_heights)
+    if not is_valid_profile(initial_heights):
+        raise ValueError("Initial profile must start at x=0, without gaps or single node columns")
+    if profile_area(initial_heights, delta_x) > area_budget:
+        raise ValueError("Initial profile exceeds the area budget")
+
+    worker_args = (width, max_height, T_base, T_free_stream, h, k, delta_x)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(worker_args,)) as pool:
+        evaluated = {tuple(initial_heights): list(pool.map(_evaluate_family, [(initial_heights, [initial_heights])]))[0][0]}
+        front = pareto_front(evaluated.values())
+
+        for generation in range(generations):
+            parents = [rng.choice(front)["heights"] for _ in range(parents_per_generation)]
+            families = [(parent, [perturb(parent, area_budget / delta_x**2, max_height, rng) for _ in range(children_per_parent)])
+                        for parent in parents]
+            for results in pool.map(_evaluate_family, families):
+                for result in results:
+                    evaluated.setdefault(tuple(result["heights"]), result)
+            front = pareto_front(evaluated.values())
+            best = max(front, key=lambda r: r["heat_rate_per_area"])
+            print(f"Generation {generation + 1}: {len(evaluated)} profiles, front of {len(front)}, "
+                  f"best {best['heat_rate_per_area']:.4g} W/m per area")
+
+    return front
@@ -1,18 +1,244 @@
 # physics.py
-from math_module import set_equations, make_equation_list, make_variable_list, solve_system, assign_temp_to_point
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spla
+from math_module import SparseSystem, Factorization, PRECISIONS, solve_sparse, conductivity_function, assign_temp_to_point
+from result_cache import canonical_order
+from result_store import ResultStore
+from profiling import profiled
 
-def update_temperatures(point_list, T_base, T_free_stream, h, delta_x, k):
-    # 1. Set symbolic equations for each point
-    set_equations(point_list, T_base, T_free_stream, h, delta_x, k)
+STEFAN_BOLTZMANN = 5.670374419e-8  # W/(m^2 K^4)
+KELVIN = 273.15
 
-    # 2. Build lists
-    eqs = make_equation_list(point_list)
-    vars_ = make_variable_list(point_list)
+@profiled("physics.update_temperatures")
+def update_temperatures(point_list, T_base, T_free_stream, h, delta_x, k, emissivity=0.0, heat_source=0.0,
+                        method="newton", system=None, cache=None, linear_solver=None, precision="double"):
+    """Solve the steady temperature field and store it on the points.
+    k is a number for a constant conductivity, or a k(T) curve / callable for the nonlinear solve.
+    Points that carry their own 'k' or 'h' attribute override k and h, and their
+    'heat_source' (W/m^3) is added to the uniform heat_source.
+    A nonzero emissivity adds surface radiation to the free stream, which is also nonlinear.
+    Pass the SparseSystem of a previous run to skip rebuilding the pattern, and a
+    ResultCache to return known designs without assembling anything.
+    linear_solver(A, b) replaces the direct solve of the linear case, e.g. a schwarz.SchwarzSolver,
+    and works in double precision only.
+    precision is 'double', 'single' (float32 factors and results) or 'mixed' (float32 factors
+    refined to float64 accuracy), see math_module.Factorization."""
+    if linear_solver is not None and precision != "double":
+        raise ValueError(f"linear_solver solves in double precision, got precision={precision!r}")
+    # 0. Known design, straight from the cache
+    points = system.points if system is not None else list(point_list)
+    if cache is not None:
+        key, order = cache.key(points, T_base=T_base, T_free_stream=T_free_stream, h=h, delta_x=delta_x, k=k,
+                               emissivity=emissivity, heat_source=heat_source, method=method, precision=precision)
+        hit = cache.get(key)
+        if hit is not None:
+            cached_temps, stats = hit
+            temps = np.empty(len(points))
+            temps[order] = cached_temps
+            assign_temp_to_point(points, temps)
+            stats["cached"] = True
+            return stats
 
-    # 3. Solve
-    temps = solve_system(eqs, vars_)
+    # 1. Build (or reuse) the sparse stencil pattern
+    if system is None:
+        system = SparseSystem(point_list)
+    h_nodes = system.node_values('h', h)
+    q_nodes = node_heat_source(system, heat_source)
 
-    # 4. Assign back to points
-    assign_temp_to_point(point_list, temps)
+    # 2. Solve
+    if isinstance(k, (int, float)) and not emissivity:
+        A, b = system.assemble(T_base, T_free_stream, h_nodes, delta_x, system.node_values('k', k), q_nodes)
+        temps = linear_solver(A, b) if linear_solver else solve_sparse(A, b, precision)
+        stats = {"iterations": 1, "linear_solves": 1, "residual": float(np.max(np.abs(A @ temps - b)))}
+    else:
+        temps, stats = solve_nonlinear(system, T_base, T_free_stream, h_nodes, delta_x, k,
+                                       emissivity=emissivity, heat_source=q_nodes, method=method, precision=precision)
 
+    # 3. Assign back to points
+    assign_temp_to_point(system.points, temps)
+    if cache is not None:
+        cache.put(key, temps[order].astype(PRECISIONS[precision]), stats)
+    stats["cached"] = False
+    return stats
 
+def node_heat_source(system, heat_source=0.0):
+    """Uniform heat generation plus the per point 'heat_source' attributes"""
+    return heat_source + np.nan_to_num(system.node_property('heat_source'))
+
+def radiation_h(T, T_free_stream, emissivity):
+    """Radiation folded into a heat transfer coefficient, h_rad*(T - T_inf) = eps*sigma*(T^4 - T_inf^4)"""
+    T_k = np.asarray(T) + KELVIN
+    T_inf_k = T_free_stream + KELVIN
+    return emissivity * STEFAN_BOLTZMANN * (T_k**2 + T_inf_k**2) * (T_k + T_inf_k)
+
+def solve_nonlinear(system, T_base, T_free_stream, h, delta_x, k, emissivity=0.0, heat_source=0.0,
+                    method="newton", tol=1e-8, max_iter=30, precision="double"):
+    """Newton (or Picard) iterations for a temperature dependent conductivity k(T)
+    and/or surface radiation. Every step reuses the sparse pattern and the first LU
+    factorization, which preconditions a GMRES solve (Newton-Krylov) instead of refactoring.
+    With precision 'single' or 'mixed' that factorization is float32, the iterations
+    still converge in float64 ('single' returns the result as float32).
+    Radiation is carried as an effective h = h + h_rad(T) on the surface nodes.
+    Points with their own 'k' attribute keep that constant k."""
+    k_of_T = conductivity_function(k)
+    k_fixed = system.node_property('k')
+    follows_curve = np.isnan(k_fixed)
+    conv = system.conv
+    h = system._nodes(h)
+    heat_source = system._nodes(heat_source)
+
+    def node_k(T):
+        return np.where(follows_curve, k_of_T(T), k_fixed)
+
+    # 1. Initial guess from the linear problem at the mean film temperature
+    T_film = np.full(system.n, 0.5 * (T_base + T_free_stream))
+    h_film = h + radiation_h(T_film, T_free_stream, emissivity)
+    A, b = system.assemble(T_base, T_free_stream, h_film, delta_x, node_k(T_film), heat_source)
+    lu = Factorization(A, "double" if precision == "double" else "single")
+    preconditioner = spla.LinearOperator(A.shape, lambda r: lu.solve(r).astype(np.float64))
+    T = lu.solve(b).astype(np.float64)
+
+    stats = {"iterations": 0, "linear_solves": 1, "krylov_iterations": 0, "residual": np.inf}
+    for iteration in range(1, max_iter + 1):
+        k_nodes = node_k(T)
+        h_eff = h + radiation_h(T, T_free_stream, emissivity)
+        A, b = system.assemble(T_base, T_free_stream, h_eff, delta_x, k_nodes, heat_source)
+        residual = A @ T - b
+        stats["residual"] = float(np.max(np.abs(residual)))
+
+        if method == "newton":
+            eps = 1e-2
+            dk = np.where(follows_curve, (k_of_T(T + eps) - k_of_T(T - eps)) / (2 * eps), 0.0)
+            J = A.copy()
+            # Face conductances change with the temperatures on both sides
+            J.data += system.conduction_jacobian(T, k_nodes, dk)
+            # Surface row term is -conv*delta_x*q(T)/k(T) with q = h_eff*(T - T_inf),
+            # A already holds -conv*delta_x*h_eff/k on the diagonal, add the rest of the derivative
+            q = h_eff * (T - T_free_stream)
+            dq = h + 4 * emissivity * STEFAN_BOLTZMANN * (T + KELVIN)**3
+            J.data[system.diag_pos] -= conv * delta_x * ((dq - h_eff) / k_nodes - q * dk / k_nodes**2)
+            # Generation term capacity*q'''*delta_x^2/k(T)
+            J.data[system.diag_pos] -= system.capacity * heat_source * delta_x**2 * dk / k_nodes**2
+            step = _krylov_solve(J, -residual, preconditioner, stats)
+        elif method == "picard":
+            step = _krylov_solve(A, b, preconditioner, stats, x0=T) - T
+        else:
+            raise ValueError(f"Unknown nonlinear method: {method}")
+
+        T = T + step
+        stats["iterations"] = iteration
+        if np.max(np.abs(step)) < tol * max(1.0, np.max(np.abs(T))):
+            break
+    else:
+        print(f"WARNING: {method} did not converge in {max_iter} iterations (residual {stats['residual']:.3e})")
+
+    return T.astype(PRECISIONS[precision]), stats
+
+def _krylov_solve(A, rhs, preconditioner, stats, x0=None):
+    """GMRES with the cached factorization, falling back to a direct solve"""
+    iterations = []
+    x, info = spla.gmres(A, rhs, x0=x0, M=preconditioner, rtol=1e-12, atol=0.0,
+                         callback=iterations.append, callback_type="pr_norm")
+    stats["linear_solves"] += 1
+    stats["krylov_iterations"] += len(iterations)
+    if info != 0:
+        x = solve_sparse(A, rhs)
+    return x
+
+class TransientSolver:
+    """Implicit time stepping of capacity * dT/dt = alpha/delta_x^2 * (A T - b)
+    on the steady stencils, with the root nodes held at T_base.
+    theta = 1 is backward Euler, theta = 1/2 is Crank-Nicolson.
+    (I - theta*dt*L) is factored once per time step size and cached, in the working
+    precision: 'single' keeps the operator, the factors and the state in float32."""
+    SCHEMES = {"backward_euler": 1.0, "crank_nicolson": 0.5}
+
+    def __init__(self, system, T_base, T_free_stream, h, delta_x, k, density, specific_heat, heat_source=0.0,
+                 precision="double"):
+        self.system = system
+        self.precision = precision
+        self.dtype = PRECISIONS[precision]
+        k = system.node_values('k', k)
+        A, b = system.assemble(T_base, T_free_stream, system.node_values('h', h), delta_x, k,
+                               node_heat_source(system, heat_source))
+        alpha = k / (density * specific_heat)
+        capacity = np.where(system.root, 1.0, system.capacity)
+        rate = np.where(system.root, 0.0, alpha / delta_x**2 / capacity)
+        self.L = (sps.diags(rate) @ A).tocsr().astype(self.dtype)
+        self.g = (rate * b).astype(self.dtype)
+        self.identity = sps.identity(system.n, format="csr", dtype=self.dtype)
+        self.factorizations = {}
+
+    def _factor(self, dt, theta):
+        key = (dt, theta)
+        if key not in self.factorizations:
+            self.factorizations[key] = Factorization((self.identity - theta * dt * self.L).tocsr(), self.precision)
+        return self.factorizations[key]
+
+    def step(self, T, dt, scheme="backward_euler"):
+        theta = self.SCHEMES[scheme]
+        rhs = T - dt * self.g
+        if theta < 1.0:
+            rhs = rhs + (1.0 - theta) * dt * (self.L @ T)
+        return self._factor(dt, theta).solve(rhs)
+
+def run_transient(point_list, T_base, T_free_stream, h, delta_x, k, density, specific_heat, t_end, dt,
+                  scheme="backward_euler", T_initial=None, snapshot_path=None, snapshot_interval=None,
+                  adaptive=False, tol=0.05, heat_source=0.0, system=None, precision="double"):
+    """Warm-up / step response: the body starts at T_initial (default T_free_stream)
+    and the root nodes jump to T_base at t = 0. Only the current state is kept in memory,
+    snapshots go to a ResultStore at snapshot_path every snapshot_interval seconds,
+    one case per snapshot with its time as 't'.
+    With adaptive=True the step is chosen by step doubling (error tol in degrees) and
+    moves along dt * 2^level, so factorizations are reused whenever a size comes back.
+    precision 'single' steps and stores snapshots in float32, 'mixed' refines every step to float64."""
+    # 1. Build (or reuse) the sparse stencil pattern and the time stepper
+    if system is None:
+        system = SparseSystem(point_list)
+    solver = TransientSolver(system, T_base, T_free_stream, h, delta_x, k, density, specific_heat, heat_source,
+                             precision)
+
+    T = np.full(system.n, T_free_stream if T_initial is None else T_initial, dtype=solver.dtype)
+    T[system.root] = T_base
+
+    # 2. Snapshot stream
+    store = None
+    if snapshot_path is not None:
+        interval = snapshot_interval if snapshot_interval else dt
+        order = canonical_order(system.points)
+        store = ResultStore.create(snapshot_path, system.points, dtype=solver.dtype)
+        store.append(T[order], t=0.0)
+        next_snapshot = interval
+
+    # 3. Time loop
+    t = 0.0
+    level = 0
+    stats = {"steps": 0, "rejected": 0}
+    while t < t_end * (1 - 1e-12):
+        step_dt = min(dt * 2.0**level, t_end - t)
+        if adaptive:
+            full = solver.step(T, step_dt, scheme)
+            half = solver.step(solver.step(T, step_dt / 2, scheme), step_dt / 2, scheme)
+            error = np.max(np.abs(full - half))
+            if error > tol and level > -30:
+                level -= 1
+                stats["rejected"] += 1
+                continue
+            T = half
+            if error < tol / 4:
+                level += 1
+        else:
+            T = solver.step(T, step_dt, scheme)
+        t += step_dt
+        stats["steps"] += 1
+
+        if store is not None and t >= next_snapshot * (1 - 1e-12):
+            store.append(T[order], t=t)
+            next_snapshot = (np.floor(t / interval * (1 + 1e-12)) + 1) * interval
+
+    # 4. Assign the final state back to points
+    assign_temp_to_point(system.points, T)
+    stats["factorizations"] = len(solver.factorizations)
+    stats["time"] = t
+    return stats
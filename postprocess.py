@@ -0,0 +1,58 @@
+# postprocess.py
+# Heat rate, base heat flux, fin efficiency and effectiveness of a solved drawn shape.
+# Everything is computed from the arrays of a SparseSystem, so it costs a few vector operations.
+import numpy as np
+from math_module import conductivity_function
+from physics import radiation_h
+
+def node_temperatures(system):
+    return np.array([p.attributes['temperature'] for p in system.points], dtype=np.float64)
+
+def heat_rate_summary(system, T_base, T_free_stream, h, delta_x, k, emissivity=0.0, thickness=1.0, temperatures=None):
+    """Heat figures of a solved system, per `thickness` of depth (W/m with thickness=1).
+      heat_rate       heat rejected by the surface nodes (convection + radiation) [W]
+      base_heat       heat conducted out of the heat source (ROOT) nodes [W]
+      base_flux       base_heat over the contact length of the source [W/m^2]
+      efficiency      heat_rate over the rate with the whole surface at T_base
+      effectiveness   heat_rate over the rate of the bare source contact area at T_base
+    Surface nodes (PLANAR, INTERIOR_CORNER, EXTERIOR_CORNER) expose conv/2 * delta_x of surface,
+    a full face for planar nodes and two half faces for corners."""
+    T = node_temperatures(system) if temperatures is None else np.asarray(temperatures, dtype=np.float64)
+    surface = (system.conv > 0) & ~system.root
+    exposed = system.conv / 2 * delta_x * thickness
+    h_nodes = system.node_values('h', h)
+    k_nodes = system.node_values('k', conductivity_function(k)(T) if not isinstance(k, (int, float)) else k)
+
+    # 1. Surface losses
+    h_rad = radiation_h(T, T_free_stream, emissivity)
+    convective = np.sum((h_nodes * exposed * (T - T_free_stream))[surface])
+    radiative = np.sum((h_rad * exposed * (T - T_free_stream))[surface])
+    heat_rate = convective + radiative
+
+    # 2. Conduction out of the source nodes, over the faces from a ROOT column into a free row.
+    # Surface rows are twice the energy balance over k, interior rows once.
+    into_free = ~system.root[system.rows] & system.root[system.cols]
+    rows, cols = system.rows[into_free], system.cols[into_free]
+    row_scale = np.where(system.conv[rows] > 0, 2.0, 1.0)
+    face = system.weights[into_free] / row_scale
+    k_face = 2 * k_nodes[rows] * k_nodes[cols] / (k_nodes[rows] + k_nodes[cols])
+    base_heat = np.sum(k_face * face * (T[cols] - T[rows])) * thickness
+    base_length = np.sum(face) * delta_x
+
+    # 3. Reference rates at T_base
+    h_rad_base = radiation_h(np.full(system.n, float(T_base)), T_free_stream, emissivity)
+    ideal = np.sum(((h_nodes + h_rad_base) * exposed)[surface]) * (T_base - T_free_stream)
+    h_mean = np.sum((h_nodes * exposed)[surface]) / max(np.sum(exposed[surface]), 1e-300)
+    bare = (h_mean + h_rad_base[0]) * base_length * thickness * (T_base - T_free_stream)
+
+    return {
+        "heat_rate": float(heat_rate),
+        "convective": float(convective),
+        "radiative": float(radiative),
+        "base_heat": float(base_heat),
+        "base_flux": float(base_heat / (base_length * thickness)) if base_length else 0.0,
+        "base_length": float(base_length),
+        "surface_length": float(np.sum(exposed[surface]) / thickness),
+        "efficiency": float(heat_rate / ideal) if ideal else 0.0,
+        "effectiveness": float(heat_rate / bare) if bare else 0.0,
+    }
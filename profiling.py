@@ -0,0 +1,173 @@
+# profiling.py
+# Opt-in profiling of the pipeline stages (UI strokes and solves, splitter, math, physics).
+# Off unless HEATSINK_PROFILE is set (to an output directory, or 1 for ./profiles) or a script
+# calls enable(), e.g. from `python main.py --profile` or `python sweep.py --profile`.
+# Every outermost profiled call writes its own cProfile file <stage>-<pid>-<run>.prof and a line
+# of wall time and tracemalloc peak to stages.jsonl. Nested stages (the splitter inside a stroke,
+# the solve inside run_physics) only add their own line, their functions are in the outer profile.
+# report() prints the per stage table and the hottest functions over every profile in the directory,
+# it runs at exit and also writes summary.txt and flamegraph.folded, the merged profiles as collapsed
+# stacks for flamegraph.pl or speedscope. Times include the tracemalloc overhead.
+import atexit
+import cProfile
+import functools
+import glob
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+
+PROFILE_ENV = "HEATSINK_PROFILE"
+
+_directory = None
+_stack = []  # open stages, outermost first: {"peak": highest traced bytes seen so far}
+_runs = 0
+
+def enable(directory="profiles"):
+    """Profile every stage from now on, in this process and in worker processes started later"""
+    global _directory
+    first = _directory is None
+    _directory = os.path.abspath(directory)
+    os.makedirs(_directory, exist_ok=True)
+    os.environ[PROFILE_ENV] = _directory
+    if first:
+        atexit.register(report)
+    return _directory
+
+def enabled():
+    return _directory is not None
+
+def profiled(stage):
+    """Decorator naming a stage, a plain call when profiling is off"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _directory is None:
+                return function(*args, **kwargs)
+            return _run(stage, function, args, kwargs)
+        return wrapper
+    return decorate
+
+def _run(stage, function, args, kwargs):
+    global _runs
+    outermost = not _stack
+    # 1. Memory: the outermost stage starts tracemalloc, nested stages reset the peak and hand it back
+    if outermost:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        profile = cProfile.Profile()
+    else:
+        _stack[-1]["peak"] = max(_stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    entry = {"peak": 0}
+    before = tracemalloc.get_traced_memory()[0]
+    _stack.append(entry)
+
+    # 2. The call itself, under cProfile for the outermost stage
+    start = time.perf_counter()
+    try:
+        return profile.runcall(function, *args, **kwargs) if outermost else function(*args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - start
+        peak = max(entry["peak"], tracemalloc.get_traced_memory()[1])
+        _stack.pop()
+        if _stack:
+            _stack[-1]["peak"] = max(_stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+
+        # 3. Per run profile and stage line
+        record = {"stage": stage, "pid": os.getpid(), "seconds": seconds, "peak_mb": (peak - before) / 2**20,
+                  "depth": len(_stack)}
+        if outermost:
+            _runs += 1
+            record["profile"] = os.path.join(_directory, f"{stage}-{os.getpid()}-{_runs:03d}.prof")
+            profile.dump_stats(record["profile"])
+            if started:
+                tracemalloc.stop()
+        with open(os.path.join(_directory, "stages.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+def summary(directory=None, top=20):
+    """Per stage table (runs, total and slowest seconds, largest peak) and the top functions by own time"""
+    directory = directory or _directory
+    stages = {}
+    try:
+        with open(os.path.join(directory, "stages.jsonl")) as f:
+            for line in f:
+                record = json.loads(line)
+                stages.setdefault(record["stage"], []).append(record)
+    except FileNotFoundError:
+        return "No profiled stages"
+
+    out = io.StringIO()
+    out.write(f"{'stage':<32}{'runs':>6}{'total s':>10}{'max s':>10}{'peak MB':>10}\n")
+    for stage, records in sorted(stages.items(), key=lambda item: -sum(r["seconds"] for r in item[1])):
+        out.write(f"{stage:<32}{len(records):>6}{sum(r['seconds'] for r in records):>10.3f}"
+                  f"{max(r['seconds'] for r in records):>10.3f}{max(r['peak_mb'] for r in records):>10.2f}\n")
+    profiles = sorted(glob.glob(os.path.join(directory, "*.prof")))
+    if profiles:
+        out.write(f"\nHottest functions over {len(profiles)} profiles\n")
+        stats = pstats.Stats(*profiles, stream=out)
+        stats.strip_dirs().sort_stats("tottime").print_stats(top)
+    return out.getvalue()
+
+def _frame(function):
+    filename, line, name = function
+    frame = name if filename == "~" else f"{os.path.basename(filename)}:{line}({name})"
+    return frame.replace(";", ",").replace(" ", "_")
+
+def collapsed_stacks(stats, min_seconds=1e-6):
+    """{"outer;...;inner": own seconds} of a pstats.Stats, the collapsed stack format of flame graphs.
+    cProfile keeps caller -> callee edges rather than whole stacks, so the time of a function called
+    from several places is split over its callers in proportion to each edge's cumulative time."""
+    children = {}
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            if caller != function:
+                children.setdefault(caller, []).append((function, edge[3]))
+    roots = [function for function, (*_, callers) in stats.stats.items() if not set(callers) - {function}]
+    stacks = {}
+    # (function, seconds reaching it along this path, frames above it, functions on the path)
+    pending = [(root, stats.stats[root][3], (), frozenset()) for root in roots]
+    while pending:
+        function, seconds, path, seen = pending.pop()
+        _, _, own, total, _ = stats.stats[function]
+        share = seconds / total if total > 0 else 0.0
+        path = path + (_frame(function),)
+        key = ";".join(path)
+        stacks[key] = stacks.get(key, 0.0) + own * share
+        seen = seen | {function}
+        for child, edge in children.get(function, ()):
+            if child not in seen and edge * share >= min_seconds:
+                pending.append((child, edge * share, path, seen))
+    return stacks
+
+def write_collapsed(profiles, path):
+    """Merge cProfile files into one collapsed stack file, one 'stack microseconds' line per stack"""
+    stacks = collapsed_stacks(pstats.Stats(*profiles))
+    with open(path, "w") as f:
+        for stack, seconds in sorted(stacks.items()):
+            if round(seconds * 1e6) > 0:
+                f.write(f"{stack} {round(seconds * 1e6)}\n")
+
+def report(directory=None, top=20):
+    """Print the summary and write it to summary.txt in the profile directory,
+    with the merged profiles as collapsed stacks in flamegraph.folded"""
+    directory = directory or _directory
+    if directory is None:
+        return
+    text = summary(directory, top)
+    with open(os.path.join(directory, "summary.txt"), "w") as f:
+        f.write(text)
+    profiles = sorted(glob.glob(os.path.join(directory, "*.prof")))
+    if profiles:
+        write_collapsed(profiles, os.path.join(directory, "flamegraph.folded"))
+    print(text)
+    print(f"Profiles and summary in {directory}")
+
+# Environment switch, e.g. HEATSINK_PROFILE=profiles python main.py
+if os.environ.get(PROFILE_ENV):
+    enable("profiles" if os.environ[PROFILE_ENV].lower() in ("1", "true", "yes") else os.environ[PROFILE_ENV])
@@ -0,0 +1,107 @@
+# result_cache.py
+# Persistent cache of solved temperature fields, so a known design with known materials is never solved twice.
+import hashlib
+import json
+import os
+import numpy as np
+
+# Bump whenever the discretization changes, so fields solved with the old stencils are not served
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = os.environ.get("HEATSINK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "heat_sink"))
+
+def canonical_order(point_list):
+    """Index order that sorts points by grid (row, col), independent of how the point list was built"""
+    coords = np.array([(p.row, p.col) for p in point_list], dtype=np.int64).reshape(-1, 2)
+    return np.lexsort((coords[:, 1], coords[:, 0]))
+
+def geometry_digest(point_list, order=None):
+    """Hash of the drawn mask: coordinates, heat source cells, node type and rotation from the splitter
+    and any per point k, h or heat generation"""
+    points = list(point_list)
+    if order is None:
+        order = canonical_order(points)
+    digest = hashlib.sha256()
+    for name in ('x', 'y'):
+        digest.update(np.array([getattr(points[i], name) for i in order], dtype=np.float64).tobytes())
+    digest.update(np.array([bool(points[i].attributes.get('root')) for i in order]).tobytes())
+    digest.update(" ".join(str(getattr(points[i].attributes.get('type'), 'value', None)) for i in order).encode())
+    digest.update(np.array([points[i].attributes.get('rotation', 0) for i in order], dtype=np.float64).tobytes())
+    for name in ('k', 'h', 'heat_source'):
+        values = [points[i].attributes.get(name) for i in order]
+        digest.update(np.array([np.nan if v is None else v for v in values], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+class ResultCache:
+    """Content addressed on-disk store of solved temperature fields and solver stats.
+    The key is a hash of the drawn geometry plus every solve parameter. Entries are
+    compressed .npz files, the least recently used are evicted beyond max_bytes."""
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=256 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, point_list, **params):
+        """Returns (key, order): the cache key and the canonical point order the field is stored in.
+        Parameters must be JSON serializable (numbers, k(T) tables), otherwise the key is None."""
+        order = canonical_order(point_list)
+        try:
+            encoded = json.dumps(params, sort_keys=True)
+        except TypeError:
+            # e.g. a k(T) callable, there is no stable way to hash it
+            return None, order
+        digest = hashlib.sha256(f"{CACHE_VERSION}:{geometry_digest(point_list, order)}:{encoded}".encode())
+        return digest.hexdigest(), order
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """Returns (temperatures in canonical order, stats) or None on a miss"""
+        if key is None:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                temperatures = entry['temperature']
+                stats = json.loads(str(entry['stats']))
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            return None
+        # Touch so eviction sees this entry as recently used
+        os.utime(path)
+        return temperatures, stats
+
+    def put(self, key, temperatures, stats):
+        if key is None:
+            return
+        path = self._path(key)
+        # Write then rename, so readers never see a half written entry
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            np.savez_compressed(f, temperature=np.asarray(temperatures), stats=np.array(json.dumps(stats)))
+        os.replace(temporary, path)
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                try:
+                    info = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(self.directory, name))
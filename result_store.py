@@ -0,0 +1,155 @@
+# result_store.py
+# Memory mapped (case x node) store for sweeps, batches and transient snapshots.
+#
+# A store is a directory:
+#   meta.json     dtype and node count
+#   nodes.npy     node index table, integer (row, col, root) of every node column in canonical (row, col) order
+#   results.bin   raw (case x node) array, appended one row per case
+#   cases.jsonl   one JSON line of parameters per finished row
+#   append.lock   empty file that appends lock (flock on POSIX, msvcrt.locking on Windows)
+# Rows are written before their case line, so readers only ever see complete cases.
+import contextlib
+import json
+import os
+import numpy as np
+from result_cache import canonical_order
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STORE_VERSION = 2
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Exclusive lock across processes, held while the block runs"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 s of retries, keep waiting
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def node_table(point_list):
+    """(row, col, root) for every point in canonical order, the column layout of a store"""
+    points = list(point_list)
+    order = canonical_order(points)
+    return np.array([(points[i].row, points[i].col, bool(points[i].attributes.get('root'))) for i in order],
+                    dtype=np.int64).reshape(-1, 3)
+
+class ResultStore:
+    """One (case x node) float array on disk, opened as a memmap for zero-copy slicing.
+    Any number of processes can append concurrently, appends are serialized by a file lock."""
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"{path} has store version {self.meta.get('version')}, this program reads {STORE_VERSION}")
+        self.dtype = np.dtype(self.meta["dtype"])
+        self.n_nodes = self.meta["n_nodes"]
+        self.nodes = np.load(os.path.join(path, "nodes.npy"), mmap_mode="r")
+        self._columns = None
+        # Case lines counted so far and the byte offset they end at, so appends read only newer lines
+        self._n_cases = 0
+        self._cases_end = 0
+
+    @classmethod
+    def create(cls, path, nodes, dtype=np.float64, **meta):
+        """Create an empty store. nodes is a ShapeDataStructure, a point list or a node table"""
+        if hasattr(nodes, "drawn_points"):
+            nodes = nodes.drawn_points
+        if not isinstance(nodes, np.ndarray):
+            nodes = node_table(nodes)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "nodes.npy"), nodes)
+        open(os.path.join(path, "results.bin"), "wb").close()
+        open(os.path.join(path, "cases.jsonl"), "w").close()
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(dict(meta, version=STORE_VERSION, dtype=np.dtype(dtype).str, n_nodes=len(nodes)), f)
+        return cls(path)
+
+    @classmethod
+    def open(cls, path):
+        return cls(path)
+
+    # ---------------- WRITING ----------------
+    def append(self, values, **params):
+        """Append one case (values in node column order), returns its row"""
+        row_values = np.ascontiguousarray(values, dtype=self.dtype)
+        if row_values.shape != (self.n_nodes,):
+            raise ValueError(f"Expected {self.n_nodes} node values, got {row_values.shape}")
+
+        with _file_lock(os.path.join(self.path, "append.lock")), \
+                open(os.path.join(self.path, "cases.jsonl"), "a+b") as cases:
+            cases.seek(self._cases_end)
+            self._n_cases += cases.read().count(b"\n")
+            row = self._n_cases
+            with open(os.path.join(self.path, "results.bin"), "r+b") as results:
+                results.seek(row * self.n_nodes * self.dtype.itemsize)
+                results.write(row_values.tobytes())
+                results.flush()
+            cases.write((json.dumps(dict(params, row=row)) + "\n").encode())
+            cases.flush()
+            self._n_cases += 1
+            self._cases_end = cases.tell()
+        return row
+
+    def append_points(self, point_list, name='temperature', **params):
+        """Append the point attribute (temperature by default) of a solved point list"""
+        points = list(point_list)
+        order = self._order(points)
+        values = np.array([points[i].attributes[name] for i in order])
+        return self.append(values, **params)
+
+    # ---------------- READING ----------------
+    def cases(self):
+        with open(os.path.join(self.path, "cases.jsonl")) as f:
+            return [json.loads(line) for line in f if line.endswith("\n")]
+
+    def __len__(self):
+        return len(self.cases())
+
+    def results(self):
+        """Zero-copy (case x node) view of every complete case"""
+        count = len(self)
+        if count == 0:
+            return np.empty((0, self.n_nodes), dtype=self.dtype)
+        return np.memmap(os.path.join(self.path, "results.bin"), dtype=self.dtype, mode="r",
+                         shape=(count, self.n_nodes))
+
+    def column(self, row, col):
+        """Node column of the grid point at integer (row, col)"""
+        if self._columns is None:
+            self._columns = {(int(r), int(c)): i for i, (r, c, _) in enumerate(self.nodes)}
+        return self._columns[(int(row), int(col))]
+
+    def assign_to_points(self, point_list, row, name='temperature'):
+        """Write one stored case back onto matching points, e.g. to draw it"""
+        points = list(point_list)
+        values = self.results()[row]
+        for column, i in enumerate(self._order(points)):
+            points[i].attributes[name] = float(values[column])
+
+    def _order(self, points):
+        """canonical_order of a point list, checked cell by cell against the node table"""
+        order = canonical_order(points)
+        cells = np.array([(points[i].row, points[i].col) for i in order], dtype=np.int64).reshape(-1, 2)
+        if not np.array_equal(cells, self.nodes[:, :2]):
+            raise ValueError("Point list does not match the store's node table")
+        return order
@@ -0,0 +1,255 @@
+# schwarz.py
+# Domain decomposed solve for very large grids (comb sinks with many fins, millions of nodes).
+# The node set is split into overlapping subdomains of connected columns, every subdomain is
+# factored once in a persistent worker process, and the subdomain solves precondition GMRES
+# (restricted additive Schwarz, block Jacobi with overlap=0). The matrix, the residual and the
+# correction live in shared memory, so each preconditioner call only sends a short message per worker.
+import contextlib
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spla
+from scipy.sparse.csgraph import connected_components
+
+def column_subdomains(system, parts, overlap=2):
+    """Split the nodes of a SparseSystem into overlapping subdomains.
+    1. contiguous column blocks holding about n/parts nodes each
+    2. each block split into its connected pieces, so separate fins are separate subdomains
+    3. each piece grown by `overlap` layers of neighbours
+    Returns a list of (nodes, owned) index arrays, the owned sets partition all nodes."""
+    n = system.n
+    x = np.array([p.col for p in system.points], dtype=np.int64)
+    columns, counts = np.unique(x, return_counts=True)
+    boundaries = np.searchsorted(np.cumsum(counts), np.arange(1, parts) * n / parts)
+    block = np.searchsorted(boundaries, np.arange(len(columns)), side="right")[np.searchsorted(columns, x)]
+
+    # Faces inside one block connect it, faces between blocks are cut
+    faces = sps.csr_matrix((np.ones(len(system.rows)), (system.rows, system.cols)), shape=(n, n))
+    faces = faces + faces.T
+    count, labels = connected_components(_block_faces(faces, block), directed=False)
+
+    # Grow every piece through (faces + I)^overlap on an indicator matrix
+    indicator = sps.csr_matrix((np.ones(n), (np.arange(n), labels)), shape=(n, count))
+    growth = (faces + sps.identity(n, format="csr")).astype(bool)
+    for _ in range(overlap):
+        indicator = (growth @ indicator).astype(bool)
+    indicator = indicator.tocsc()
+    subdomains = []
+    for piece in range(count):
+        nodes = indicator.indices[indicator.indptr[piece]:indicator.indptr[piece + 1]]
+        nodes = np.sort(nodes)
+        subdomains.append((nodes, np.flatnonzero(labels == piece)))
+    return subdomains
+
+def _block_faces(faces, block):
+    """faces restricted to pairs of nodes in the same block"""
+    coo = faces.tocoo()
+    keep = block[coo.row] == block[coo.col]
+    return sps.csr_matrix((coo.data[keep], (coo.row[keep], coo.col[keep])), shape=faces.shape)
+
+# ---------------- SHARED MEMORY ----------------
+def _share(array):
+    memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)
+    view[...] = array
+    return memory, view
+
+def _attach(name, shape, dtype):
+    # Workers are children of the creating process and share its resource tracker,
+    # which unlinks the block once, when the preconditioner closes
+    memory = shared_memory.SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+def _schwarz_worker(connection, layout, n, subdomains):
+    """Persistent worker: factors its subdomains, then answers 'apply' / 'factor' / 'close'"""
+    memories, arrays = [], {}
+    for key, (name, shape, dtype) in layout.items():
+        memory, arrays[key] = _attach(name, shape, dtype)
+        memories.append(memory)
+    r, z = arrays["r"], arrays["z"]
+
+    def factor():
+        A = sps.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=(n, n))
+        return [spla.splu(A[nodes][:, nodes].tocsc()) for nodes, _ in subdomains]
+
+    # Where each owned node sits inside its subdomain
+    local_owned = [np.searchsorted(nodes, owned) for nodes, owned in subdomains]
+    factors = factor()
+    connection.send("ready")
+    while True:
+        message = connection.recv()
+        if message == "apply":
+            for (nodes, owned), local, lu in zip(subdomains, local_owned, factors):
+                z[owned] = lu.solve(r[nodes])[local]
+        elif message == "factor":
+            factors = factor()
+        elif message == "close":
+            break
+        connection.send("done")
+    del r, z
+    arrays.clear()
+    for memory in memories:
+        memory.close()
+
+class SchwarzPreconditioner:
+    """Restricted additive Schwarz preconditioner with subdomain solves spread over worker processes.
+    Use as a context manager, or call close() to stop the workers and free the shared memory."""
+    def __init__(self, A, subdomains, workers=None):
+        A = sps.csr_matrix(A)
+        A.sort_indices()
+        self.n = A.shape[0]
+        self.shape = A.shape
+        self.memories = {}
+        self.arrays = {}
+        for key, array in (("data", A.data.astype(np.float64)), ("indices", A.indices), ("indptr", A.indptr),
+                           ("r", np.zeros(self.n)), ("z", np.zeros(self.n))):
+            self.memories[key], self.arrays[key] = _share(array)
+        layout = {key: (memory.name, self.arrays[key].shape, self.arrays[key].dtype)
+                  for key, memory in self.memories.items()}
+
+        # Spread subdomains over workers by size, largest first
+        workers = max(1, min(workers or os.cpu_count(), len(subdomains)))
+        loads = [[] for _ in range(workers)]
+        sizes = np.zeros(workers)
+        for nodes, owned in sorted(subdomains, key=lambda s: -len(s[0])):
+            lightest = int(np.argmin(sizes))
+            loads[lightest].append((nodes, owned))
+            sizes[lightest] += len(nodes)
+
+        self.connections, self.processes = [], []
+        for load in loads:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_schwarz_worker, args=(child, layout, self.n, load), daemon=True)
+            process.start()
+            # Only the worker holds the child end, so its exit shows up here as EOFError
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        self._wait()
+        self.applications = 0
+
+    def _wait(self):
+        for connection, process in zip(self.connections, self.processes):
+            try:
+                connection.recv()
+            except EOFError:
+                self._failed(process)
+
+    def _broadcast(self, message):
+        for connection, process in zip(self.connections, self.processes):
+            try:
+                connection.send(message)
+            except OSError:
+                self._failed(process)
+        self._wait()
+
+    def _failed(self, process):
+        """A worker exited: stop the others, free the shared memory and raise"""
+        process.join()
+        self.close()
+        raise RuntimeError(f"Schwarz worker {process.pid} exited with code {process.exitcode}")
+
+    def apply(self, r):
+        self.arrays["r"][:] = r
+        self._broadcast("apply")
+        self.applications += 1
+        return self.arrays["z"].copy()
+
+    def refactor(self, A):
+        """New values on the same sparsity pattern, e.g. the next Newton step"""
+        A = sps.csr_matrix(A)
+        A.sort_indices()
+        self.arrays["data"][:] = A.data
+        self._broadcast("factor")
+
+    def operator(self):
+        return spla.LinearOperator(self.shape, self.apply)
+
+    def close(self):
+        for connection in self.connections:
+            # A worker that already exited has closed its end
+            with contextlib.suppress(OSError):
+                connection.send("close")
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections, self.processes = [], []
+        self.arrays.clear()
+        for memory in self.memories.values():
+            memory.close()
+            memory.unlink()
+        self.memories.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class SchwarzSolver:
+    """Linear solver for update_temperatures(linear_solver=...) on large grids.
+    The decomposition is built once per SparseSystem. The workers and their factorizations stay alive
+    across calls while the matrix keeps its sparsity pattern: the same matrix reuses the factors, new
+    values on the pattern (another h or k) only refactor, a new pattern starts new workers.
+    Use as a context manager, or call close() to stop the workers."""
+    def __init__(self, system, parts=None, overlap=2, workers=None, rtol=1e-10, restart=60, maxiter=50):
+        self.workers = workers or os.cpu_count()
+        self.subdomains = column_subdomains(system, parts or self.workers, overlap)
+        self.rtol = rtol
+        self.restart = restart
+        self.maxiter = maxiter
+        self.stats = {}
+        self.preconditioner = None
+        self.matrix = None
+
+    def _prepare(self, A):
+        """Preconditioner for A, returns how it was obtained: 'started', 'refactored' or 'reused'"""
+        A = sps.csr_matrix(A)
+        A.sort_indices()
+        current = self.matrix
+        if current is not None and np.array_equal(current.indptr, A.indptr) and np.array_equal(current.indices, A.indices):
+            if np.array_equal(current.data, A.data):
+                return "reused"
+            self.preconditioner.refactor(A)
+            self.matrix = A.copy()
+            return "refactored"
+        self.close()
+        self.preconditioner = SchwarzPreconditioner(A, self.subdomains, self.workers)
+        self.matrix = A.copy()
+        return "started"
+
+    def __call__(self, A, b, x0=None):
+        iterations = []
+        try:
+            setup = self._prepare(A)
+            x, info = spla.gmres(A, b, x0=x0, M=self.preconditioner.operator(), rtol=self.rtol, atol=0.0,
+                                 restart=self.restart, maxiter=self.maxiter, callback=iterations.append,
+                                 callback_type="pr_norm")
+        except RuntimeError:
+            # A worker died, the next call starts new ones
+            self.close()
+            raise
+        self.stats = {"subdomains": len(self.subdomains), "krylov_iterations": len(iterations), "setup": setup}
+        if info != 0:
+            print(f"WARNING: Schwarz GMRES did not converge ({len(iterations)} iterations), solving directly")
+            x = spla.spsolve(A.tocsc(), b)
+        return x
+
+    def close(self):
+        if self.preconditioner is not None:
+            self.preconditioner.close()
+        self.preconditioner = None
+        self.matrix = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # Workers are daemons and die with the process, this frees the shared memory earlier
+        if getattr(self, "preconditioner", None) is not None:
+            self.close()
@@ -0,0 +1,201 @@
+# sensitivity.py
+# Sensitivity of the heat rate or the peak temperature to the material at every node.
+# conductivity_sensitivity: one adjoint (transposed) solve gives dJ/dk of every node.
+# topology_sensitivity: the change of J when a surface cell is trimmed or an empty neighbour cell
+# is grown, exact for the linear system at the solved field, from low-rank updates of one LU.
+from types import SimpleNamespace
+import numpy as np
+import scipy.sparse.linalg as spla
+from math_module import _stencil_terms, conductivity_function
+from physics import node_heat_source, radiation_h
+from postprocess import node_temperatures
+from splitter import ShapeDataStructure
+
+OBJECTIVES = ("heat_rate", "max_temperature")
+
+def _linearized(system, T_base, T_free_stream, h, delta_x, k, objective, emissivity, heat_source, temperatures):
+    """Field, frozen node k, h and q, assembled (A, b) and the objective J = dJ_dT @ (T - offset)"""
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}")
+    T = node_temperatures(system) if temperatures is None else np.asarray(temperatures, dtype=np.float64)
+    k_nodes = system.node_values('k', k if isinstance(k, (int, float)) else conductivity_function(k)(T))
+    h_nodes = system.node_values('h', h) + radiation_h(T, T_free_stream, emissivity)
+    q_nodes = node_heat_source(system, heat_source)
+    A, b = system.assemble(T_base, T_free_stream, h_nodes, delta_x, k_nodes, q_nodes)
+
+    dJ_dT = np.zeros(system.n)
+    if objective == "heat_rate":
+        dJ_dT[boundary_nodes(system)] = (h_nodes * system.conv / 2 * delta_x)[boundary_nodes(system)]
+        value = float(np.sum(dJ_dT * (T - T_free_stream)))
+    else:
+        hottest = int(np.argmax(np.where(system.root, -np.inf, T)))
+        dJ_dT[hottest] = 1.0
+        value = float(T[hottest])
+    return T, k_nodes, h_nodes, q_nodes, A, b, dJ_dT, value
+
+def conductivity_sensitivity(system, T_base, T_free_stream, h, delta_x, k, objective="heat_rate", emissivity=0.0,
+                             heat_source=0.0, temperatures=None):
+    """Sensitivity of the objective to the conductivity of every node of a solved system, as k_p * dJ/dk_p
+    (the change of J per relative change of k_p). It does not say what removing or adding a cell does,
+    the exposed faces change then too, see topology_sensitivity.
+      heat_rate        heat rejected by the surface (W per unit depth)
+      max_temperature  temperature of the hottest non-source node
+    For k(T) or radiation the coefficients are frozen at the solved field.
+    Returns (sensitivity per node, objective value)."""
+    T, k_nodes, h_nodes, q_nodes, A, _, dJ_dT, value = _linearized(
+        system, T_base, T_free_stream, h, delta_x, k, objective, emissivity, heat_source, temperatures)
+
+    # 1. Adjoint solve, A^T lambda = dJ/dT
+    adjoint = spla.spsolve(A.T.tocsc(), dJ_dT)
+
+    # 2. dJ/dk = -lambda^T dR/dk, neither objective depends on k directly
+    dJ_dk = -system.k_adjoint_product(adjoint, T, T_free_stream, h_nodes, delta_x, k_nodes, q_nodes)
+    return k_nodes * dJ_dk, value
+
+def boundary_nodes(system):
+    """Surface nodes, the cells that can be trimmed or grown from"""
+    return (system.conv > 0) & ~system.root
+
+def candidate_cells(system):
+    """(removable, addable): the surface nodes that can be trimmed, and the empty [row, col] cells
+    sharing a face with a drawn cell that can be grown"""
+    rows, cols = system.grid.shape
+    drawn = np.zeros((rows + 1, cols + 1), dtype=bool)
+    drawn[:rows, :cols] = system.grid >= 0
+    padded = np.pad(drawn, 1)
+    touching = padded[:-2, 1:-1] | padded[2:, 1:-1] | padded[1:-1, :-2] | padded[1:-1, 2:]
+    addable = [(int(r), int(c)) for r, c in zip(*np.nonzero(touching & ~drawn))]
+    return np.flatnonzero(boundary_nodes(system)), addable
+
+def topology_sensitivity(system, T_base, T_free_stream, h, delta_x, k, objective="heat_rate", emissivity=0.0,
+                         heat_source=0.0, temperatures=None, batch=256):
+    """Change of the objective when one cell is trimmed from or grown onto a solved system.
+    Toggling a cell reclassifies the cells around it, so it rewrites at most the 3x3 rows around it:
+    the faces it conducted through, the faces it exposes or covers and their convection.
+    Each toggle is a low-rank (Woodbury) update of the current LU, exact for the linear system,
+    with one extra solve per node next to a candidate cell.
+    A grown cell takes the mean k and h of the cells it touches, has no heat generation and is never
+    a heat source. For k(T) or radiation the coefficients are frozen at the solved field, and
+    max_temperature follows the node that is hottest now.
+    Returns (removal, addition, value): removal is J's change per node if that node is removed
+    (NaN for nodes that are not on the surface, and where the change leaves the system singular),
+    addition maps every empty neighbour cell (row, col) to J's change if it is drawn."""
+    T, k_nodes, h_nodes, q_nodes, A, b, dJ_dT, value = _linearized(
+        system, T_base, T_free_stream, h, delta_x, k, objective, emissivity, heat_source, temperatures)
+    n = system.n
+    A = A.tocsr()
+    lu = spla.splu(A.tocsc())
+
+    # 1. Adjoint, and the system extended by one decoupled node n (T_n = T_free_stream) that a grown cell takes over
+    adjoint = np.append(lu.solve(dJ_dT, trans='T'), 0.0)
+    T_ext = np.append(T, T_free_stream)
+    b_ext = np.append(b, T_free_stream)
+    g_ext = np.append(dJ_dT, 0.0)
+    node_row = np.array([p.row for p in system.points] + [0])
+    node_col = np.array([p.col for p in system.points] + [0])
+
+    # Index grid with a margin of 3 cells: windows around any cell stay inside it
+    grid = np.pad(system.grid, ((3, 4), (3, 4)), constant_values=-1)
+    removable, addable = candidate_cells(system)
+    candidates = [(int(node_row[i]), int(node_col[i]), int(i)) for i in removable]
+    candidates += [(r, c, -1) for r, c in addable]
+
+    # 2. Rows of A^{-1} within 3 cells of every non-source node next to a candidate, one solve per node
+    needed = set()
+    for r, c, _ in candidates:
+        window = grid[r + 2:r + 5, c + 2:c + 5]
+        needed.update(int(j) for j in window[window >= 0] if not system.root[j])
+    needed = sorted(needed)
+    local = {}
+    offsets = np.arange(-3, 4)
+    for start in range(0, len(needed), batch):
+        columns = needed[start:start + batch]
+        unit = np.zeros((n, len(columns)))
+        unit[columns, np.arange(len(columns))] = 1.0
+        inverse = lu.solve(unit)
+        for m, j in enumerate(columns):
+            window = grid[node_row[j] + 3 + offsets[:, None], node_col[j] + 3 + offsets[None, :]]
+            local[j] = np.where(window >= 0, inverse[np.maximum(window, 0), m], 0.0)
+
+    def inverse_entry(i, j):
+        """(A_ext^{-1})[i, j] for i within 3 cells of j"""
+        if j == n or i == n:
+            return float(i == j)
+        return local[j][node_row[i] - node_row[j] + 3, node_col[i] - node_col[j] + 3]
+
+    removal = np.full(n, np.nan)
+    addition = {}
+    for r, c, removed in candidates:
+        # 3. Toggle the cell in the index grid and reclassify the 3x3 cells around it
+        window = grid[r + 1:r + 6, c + 1:c + 6]
+        window[2, 2] = -1 if removed >= 0 else n
+        codes = ShapeDataStructure.quadrant_code(window >= 0)
+        touched = [(int(node), dr, dc) for dr in range(3) for dc in range(3)
+                   if (node := window[dr + 1, dc + 1]) >= 0 and (node == n or not system.root[node])]
+        if removed < 0:
+            neighbours = [j for j in (window[1, 2], window[3, 2], window[2, 1], window[2, 3]) if j >= 0]
+            k_new, h_new = np.mean(k_nodes[neighbours]), np.mean(h_nodes[neighbours])
+
+        # 4. New rows in flux form, sum(w*r_ij*(T_j - T_i)) - conv*Bi_i*(T_i - T_free_stream) - capacity*q*dx^2/k_i
+        changed, D, db, dg = [], [], [], []
+        if removed >= 0:
+            changed.append(removed)
+            D.append(_row_change(A, removed, {removed: 1.0}, n))
+            db.append(T_free_stream - b_ext[removed])
+            dg.append(-g_ext[removed])
+        for node, dr, dc in touched:
+            point = SimpleNamespace(row=r - 1 + dr, col=c - 1 + dc, attributes={})
+            _, point.attributes['type'], point.attributes['rotation'] = ShapeDataStructure.classify_pattern(
+                int(codes[dr + 1, dc + 1]))
+            neighbours, _, conv, capacity, _ = _stencil_terms(point, grid[3:, 3:])
+            k_i = k_new if node == n else k_nodes[node]
+            h_i = h_new if node == n else h_nodes[node]
+            q_i = 0.0 if node == n else q_nodes[node]
+            k_j = np.array([k_new if j == n else k_nodes[j] for j, _ in neighbours])
+            coupling = np.array([w for _, w in neighbours], dtype=np.float64) * 2 * k_j / (k_i + k_j)
+            bi = h_i * delta_x / k_i
+            row = dict(zip((j for j, _ in neighbours), coupling))
+            row[node] = row.get(node, 0.0) - coupling.sum() - conv * bi
+            changed.append(node)
+            D.append(_row_change(A, node, row, n))
+            db.append(-conv * bi * T_free_stream - capacity * q_i * delta_x**2 / k_i - b_ext[node])
+            if objective == "heat_rate":
+                dg.append(h_i * conv / 2 * delta_x - g_ext[node])
+            else:
+                dg.append(0.0)
+        window[2, 2] = removed if removed >= 0 else -1
+
+        # 5. Woodbury: T' = T - Z y with Z = A_ext^{-1} E_S and (I + D Z) y = D T - db
+        columns = sorted(set().union(*D))
+        position = {j: m for m, j in enumerate(columns)}
+        D_dense = np.zeros((len(changed), len(columns)))
+        for a, row in enumerate(D):
+            for j, v in row.items():
+                D_dense[a, position[j]] = v
+        Z = np.array([[inverse_entry(j, target) for target in changed] for j in columns])
+        DZ = np.eye(len(changed)) + D_dense @ Z
+        DT = D_dense @ T_ext[columns]
+        if np.linalg.cond(DZ) > 1e12 or (objective == "max_temperature" and g_ext[removed] > 0):
+            # A body cut off without convection, or the hottest node itself removed
+            continue
+        y = np.linalg.solve(DZ, DT - np.array(db))
+
+        # 6. J' - J = dg.(T - T_free_stream) - g'.Z y, with g.Z = adjoint on S and dg only on S
+        dg = np.array(dg)
+        Z_SS = Z[[position[i] for i in changed]]
+        change = dg @ (T_ext[changed] - T_free_stream) - (adjoint[changed] + Z_SS.T @ dg) @ y
+        if removed >= 0:
+            removal[removed] = change
+        else:
+            addition[(r, c)] = float(change)
+    return removal, addition, value
+
+def _row_change(A, node, row, n):
+    """New row minus the current row of A_ext (A with the decoupled node n) as {column: value}"""
+    change = dict(row)
+    if node < n:
+        for j, v in zip(A.indices[A.indptr[node]:A.indptr[node + 1]], A.data[A.indptr[node]:A.indptr[node + 1]]):
+            change[int(j)] = change.get(int(j), 0.0) - v
+    else:
+        change[n] = change.get(n, 0.0) - 1.0
+    return change
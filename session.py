@@ -0,0 +1,160 @@
+# session.py
+# Save / load of a ShapeUI session: the drawn mask, the per node attributes, the UI selections
+# and the last solved temperature field, in one compact versioned binary file.
+#
+# Layout (little endian):
+#   magic      8 bytes  b"HSSESSN\0"
+#   version    uint32
+#   length     uint32   of the JSON header
+#   header     JSON     grid size, selections, solve parameters, material names and an array table
+#   payload    arrays at 64 byte aligned offsets (name -> dtype, shape, offset in the table)
+# The drawn and heat source masks are bit packed over the whole grid, every other layer is stored
+# for the drawn cells only (row major order). Opening reads the header, arrays are memory mapped
+# on first use, so Session.open, mask() and layers() never build per node Python objects.
+# load_session / load_into still build a ShapeDataStructure, one Point per grid cell, which is the
+# slow part of opening a large design (about 14 us per cell, 5 s for 360000 cells).
+import json
+import os
+import struct
+import numpy as np
+from splitter import ShapeDataStructure
+from snapshots import POINT_LAYERS, Snapshot, TiledArray, shape_layers, restore_layers
+
+MAGIC = b"HSSESSN\0"
+SESSION_VERSION = 1
+ALIGN = 64
+PACKED = ("mask", "source")
+
+def _json_params(params):
+    """Solve parameters as stored. A k(T) table or polynomial is kept as lists of floats,
+    a callable, which JSON cannot hold, as k=None."""
+    if params is None:
+        return None
+    stored = dict(params)
+    k = stored.get("k")
+    if isinstance(k, dict):
+        stored["k"] = {name: [float(value) for value in values] for name, values in k.items()}
+    elif not isinstance(k, (int, float)):
+        stored["k"] = None
+    return stored
+
+def save_session(path, shape, selections=None, params=None, layers=None):
+    """Write a session file. layers defaults to the shape's current layers (snapshots.shape_layers),
+    params are the solve parameters when the temperature layer is a solved field."""
+    if layers is None:
+        layers = shape_layers(shape)
+    mask = np.asarray(layers["mask"], dtype=bool)
+
+    # 1. Arrays: packed masks, everything else over the drawn cells
+    arrays = {name: np.packbits(np.asarray(layers[name], dtype=bool)) for name in PACKED}
+    materials = sorted({m for m in layers["material"][mask] if m is not None})
+    for name, (dtype, _) in POINT_LAYERS.items():
+        values = np.asarray(layers[name])[mask]
+        if name == "material":
+            # Indices into the header's material names, -1 for none
+            codes = {m: i for i, m in enumerate(materials)}
+            values = np.array([codes.get(m, -1) for m in values], dtype=np.int16)
+        else:
+            values = values.astype(dtype, copy=False)
+        arrays[name] = np.ascontiguousarray(values)
+
+    # 2. Header with the array table
+    table = {}
+    offset = 0
+    for name, array in arrays.items():
+        table[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = json.dumps({
+        "width": shape.width, "height": shape.height, "resolution": shape.resolution,
+        "root_at_x0": shape.root_at_x0, "rows": int(mask.shape[0]), "cols": int(mask.shape[1]),
+        "nodes": int(np.count_nonzero(mask)), "materials": materials,
+        "selections": selections or {}, "params": _json_params(params), "arrays": table,
+    }).encode()
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    # 3. Write then rename, so a crash never leaves a half written session
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(MAGIC + struct.pack("<II", SESSION_VERSION, len(header)) + header)
+        for name, array in arrays.items():
+            f.seek(start + table[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(start + offset)
+    os.replace(temporary, path)
+    print(f"Saved {len(arrays['region'])} nodes to {path}")
+
+class Session:
+    """A session file opened lazily: the header is read now, arrays are memory mapped when used"""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a heat sink session")
+            version, length = struct.unpack("<II", f.read(8))
+            if version > SESSION_VERSION:
+                raise ValueError(f"{path} has session version {version}, this program reads up to {SESSION_VERSION}")
+            self.header = json.loads(f.read(length).decode())
+        self.version = version
+        self.start = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+        self.shape = (self.header["rows"], self.header["cols"])
+        self.selections = self.header["selections"]
+        self.params = self.header["params"]
+        self._arrays = {}
+
+    @classmethod
+    def open(cls, path):
+        return cls(path)
+
+    def array(self, name):
+        """Stored array as a read-only memmap (packed masks stay packed)"""
+        if name not in self._arrays:
+            entry = self.header["arrays"][name]
+            count = int(np.prod(entry["shape"]))
+            self._arrays[name] = np.memmap(self.path, dtype=np.dtype(entry["dtype"]), mode="r",
+                                           offset=self.start + entry["offset"], shape=(count,)) if count else \
+                np.empty(0, dtype=np.dtype(entry["dtype"]))
+        return self._arrays[name]
+
+    def mask(self, name="mask"):
+        rows, cols = self.shape
+        return np.unpackbits(self.array(name), count=rows * cols).reshape(rows, cols).astype(bool)
+
+    def node_values(self, name):
+        """One attribute over the drawn cells, in row major order"""
+        if name == "material":
+            names = np.array(self.header["materials"] + [None], dtype=object)
+            return names[np.asarray(self.array(name))]
+        return self.array(name)
+
+    def layers(self):
+        """Every layer on the [row, col] grid, like snapshots.shape_layers"""
+        mask = self.mask()
+        layers = {"mask": mask, "source": self.mask("source")}
+        for name, (dtype, empty) in POINT_LAYERS.items():
+            grid = np.full(self.shape, empty, dtype=dtype)
+            grid[mask] = self.node_values(name)
+            layers[name] = grid
+        return layers
+
+    def snapshot(self, label="opened"):
+        """The session as a snapshots.Snapshot, e.g. as the first entry of an undo history"""
+        return Snapshot({name: TiledArray.from_array(array) for name, array in self.layers().items()},
+                        label, self.params)
+
+    def new_shape(self):
+        """An empty ShapeDataStructure of the session's grid"""
+        return ShapeDataStructure(self.header["width"], self.header["height"], self.header["resolution"],
+                                  self.header["root_at_x0"])
+
+    def load_into(self, shape):
+        """Put the drawn geometry, attributes and field on a ShapeDataStructure of the same grid,
+        the layers are converted at once (snapshots.restore_layers) but every drawn Point is updated"""
+        if shape.mask.shape != self.shape:
+            raise ValueError(f"Session grid is {self.shape}, the shape grid is {shape.mask.shape}")
+        restore_layers(shape, self.layers())
+        return shape
+
+def load_session(path):
+    """(ShapeDataStructure with the session drawn on it, Session)"""
+    session = Session(path)
+    return session.load_into(session.new_shape()), session
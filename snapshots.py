@@ -0,0 +1,200 @@
+# snapshots.py
+# Copy-on-write snapshots of a drawn shape and its solved field, for undo / redo and design comparison.
+# Every layer (drawn mask, heat sources, per cell k, h, heat generation, material, region, temperature)
+# is kept as read-only square tiles. A new snapshot copies only the tiles a stroke changed and shares
+# every other tile with the version before it, so a long history costs about the cells that were touched.
+import numpy as np
+from splitter import ShapeDataStructure
+from physics import update_temperatures
+
+TILE = 32
+
+# Point attribute layers: name -> (dtype, value of cells without the attribute)
+POINT_LAYERS = {
+    "region": (np.int32, -1),
+    "k": (np.float64, np.nan),
+    "h": (np.float64, np.nan),
+    "heat_source": (np.float64, 0.0),
+    "temperature": (np.float64, np.nan),
+    "material": (object, None),
+}
+
+def _same(a, b):
+    if a.shape != b.shape or a.dtype != b.dtype:
+        return False
+    if a.dtype.kind == 'f':
+        return np.array_equal(a, b, equal_nan=True)
+    return bool(np.all(a == b))
+
+class TiledArray:
+    """Read-only 2D array stored as TILE x TILE blocks, which versions of the array share"""
+    def __init__(self, shape, dtype, tiles):
+        self.shape = shape
+        self.dtype = dtype
+        self.tiles = tiles  # (row, col) of the tile corner -> read-only block
+
+    @classmethod
+    def from_array(cls, array, previous=None):
+        """Tile an array, reusing every tile of `previous` whose contents are unchanged"""
+        if previous is not None and (previous.shape != array.shape or previous.dtype != array.dtype):
+            previous = None
+        tiles = {}
+        rows, cols = array.shape
+        for row in range(0, rows, TILE):
+            for col in range(0, cols, TILE):
+                block = array[row:row + TILE, col:col + TILE]
+                old = previous.tiles[(row, col)] if previous is not None else None
+                if old is not None and _same(old, block):
+                    tiles[(row, col)] = old
+                else:
+                    block = block.copy()
+                    block.flags.writeable = False
+                    tiles[(row, col)] = block
+        return cls(array.shape, array.dtype, tiles)
+
+    def to_array(self):
+        array = np.empty(self.shape, dtype=self.dtype)
+        for (row, col), block in self.tiles.items():
+            array[row:row + block.shape[0], col:col + block.shape[1]] = block
+        return array
+
+    def shared_tiles(self, other):
+        return sum(1 for key, block in self.tiles.items() if other.tiles.get(key) is block)
+
+class Snapshot:
+    """One immutable version of a shape. params are the solve parameters (T_base, T_free_stream,
+    h, delta_x, k, emissivity) when the temperature layer holds a solved field, None before a solve."""
+    def __init__(self, layers, label="", params=None, stats=None):
+        self.layers = layers
+        self.label = label
+        self.params = params
+        self.stats = stats
+
+    def layer(self, name):
+        return self.layers[name].to_array()
+
+    def field(self):
+        """Solved temperatures on the [row, col] grid, NaN outside the shape"""
+        return np.where(self.layer("mask"), self.layer("temperature"), np.nan)
+
+    def with_field(self, temperature, params, stats=None):
+        """The same geometry with a solved temperature field, sharing every other layer"""
+        layers = dict(self.layers)
+        layers["temperature"] = TiledArray.from_array(temperature, self.layers["temperature"])
+        return Snapshot(layers, self.label, params, stats)
+
+    def shared_tiles(self, other):
+        """(tiles shared with other, tiles in total)"""
+        shared = sum(layer.shared_tiles(other.layers[name]) for name, layer in self.layers.items())
+        return shared, sum(len(layer.tiles) for layer in self.layers.values())
+
+def shape_layers(shape):
+    """Every layer of a ShapeDataStructure as a [row, col] array"""
+    arrays = {name: np.full(shape.mask.shape, empty, dtype=dtype) for name, (dtype, empty) in POINT_LAYERS.items()}
+    for point in shape.drawn_points:
+        cell = shape._cell(point)
+        for name, (_, empty) in POINT_LAYERS.items():
+            value = point.attributes.get(name)
+            arrays[name][cell] = empty if value is None else value
+    arrays["mask"] = shape.mask
+    arrays["source"] = shape.source_mask
+    return arrays
+
+def capture(shape, previous=None, label="", params=None, stats=None):
+    """Snapshot of a ShapeDataStructure, sharing unchanged tiles with the previous snapshot.
+    Pass params when the points carry the field solved with them."""
+    layers = {name: TiledArray.from_array(array, previous.layers[name] if previous is not None else None)
+              for name, array in shape_layers(shape).items()}
+    return Snapshot(layers, label, params, stats)
+
+def restore(shape, snapshot):
+    """Put a snapshot back on a ShapeDataStructure of the same size, replacing what is drawn"""
+    restore_layers(shape, {name: snapshot.layer(name) for name in snapshot.layers})
+
+def restore_layers(shape, arrays):
+    """Put shape_layers arrays back on a ShapeDataStructure of the same size.
+    Every layer is converted over the drawn cells at once, the per point work is one attribute update."""
+    shape.clear_shape()
+    mask = np.asarray(arrays["mask"], dtype=bool)
+    shape.source_mask[:] = arrays["source"]
+    shape.mask[:] = mask
+
+    # 1. Attribute columns over the drawn cells (row major), as the values the points hold
+    def optional(values, empty):
+        values = np.asarray(values)[mask]
+        return np.where(np.isnan(values), empty, values.astype(object)).tolist()
+
+    points = shape.grid[mask].tolist()
+    regions = np.asarray(arrays["region"])[mask].tolist()
+    columns = {
+        "k": optional(arrays["k"], None),
+        "h": optional(arrays["h"], None),
+        "heat_source": np.asarray(arrays["heat_source"], dtype=np.float64)[mask].tolist(),
+        "temperature": optional(arrays["temperature"], 20.0),
+        "material": np.asarray(arrays["material"])[mask].tolist(),
+    }
+    names = list(columns)
+
+    # 2. Onto the points, and the regions and drawn set
+    shape.regions = {region: [] for region in range(max(regions, default=-1) + 1)}
+    for point, region, *values in zip(points, regions, *columns.values()):
+        point.is_drawn = True
+        point.attributes['region'] = region
+        point.attributes.update(zip(names, values))
+        shape.regions[region].append(point)
+    shape.drawn_points.update(points)
+    shape._classify_points_by_quadrants()
+
+def solved(snapshot, like, params, cache=None):
+    """Snapshot with the field solved for params. Solves (through the result cache) only
+    when the snapshot does not already hold that field. like is a shape of the same grid."""
+    if snapshot.params == params:
+        return snapshot
+    scratch = ShapeDataStructure(like.width, like.height, like.resolution, like.root_at_x0, verbose=False)
+    restore(scratch, snapshot)
+    stats = update_temperatures(list(scratch.drawn_points), cache=cache, **params)
+    temperature = np.full(scratch.mask.shape, np.nan)
+    for point in scratch.drawn_points:
+        temperature[scratch._cell(point)] = point.attributes['temperature']
+    return snapshot.with_field(temperature, params, stats)
+
+def difference(a, b):
+    """(a - b on cells drawn in both, cells only in a, cells only in b) of two solved snapshots"""
+    mask_a, mask_b = a.layer("mask"), b.layer("mask")
+    return a.field() - b.field(), mask_a & ~mask_b, mask_b & ~mask_a
+
+class History:
+    """Linear undo / redo history of snapshots, a new snapshot drops the redo branch"""
+    def __init__(self, limit=200):
+        self.snapshots = []
+        self.position = -1
+        self.limit = limit
+
+    @property
+    def current(self):
+        return self.snapshots[self.position] if self.snapshots else None
+
+    def push(self, snapshot):
+        del self.snapshots[self.position + 1:]
+        self.snapshots.append(snapshot)
+        if len(self.snapshots) > self.limit:
+            del self.snapshots[0]
+        self.position = len(self.snapshots) - 1
+        return snapshot
+
+    def replace(self, snapshot):
+        """Swap the current snapshot, e.g. for the same geometry with its solved field"""
+        self.snapshots[self.position] = snapshot
+        return snapshot
+
+    def undo(self):
+        if self.position <= 0:
+            return None
+        self.position -= 1
+        return self.current
+
+    def redo(self):
+        if self.position + 1 >= len(self.snapshots):
+            return None
+        self.position += 1
+        return self.current
@@ -1,209 +1,292 @@
 # This splits a geometric object into points and take a series of [x, y] coordinates and splits them into a list of points.
 from typing import List, Tuple, Dict, Optional, Set
 import numpy as np
+from scipy import ndimage
 from Point import Point
 from Enum import PointType, Quadrant
+from profiling import profiled
 
 class ShapeDataStructure:
 
-    def __init__(self, width, height, resolution=1):
+    def __init__(self, width, height, resolution=1, root_at_x0=True, verbose=True):
         self.width = width
         self.height = height
         self.resolution = resolution
+        # Progress prints for the UI console, headless callers switch them off
+        self.verbose = verbose
+        # x=0 cells are heat source (ROOT) cells unless switched off,
+        # painted source cells are ROOT anywhere
+        self.root_at_x0 = root_at_x0
+
+        # Grid size in cells, rounded so sub-unit resolutions (0.3 / 0.1) do not lose a row
+        self.rows = int(round(height / resolution))
+        self.cols = int(round(width / resolution))
+
+        # Drawn and heat source cells as [row (y), col (x)] masks for whole grid operations
+        self.mask = np.zeros((self.rows, self.cols), dtype=bool)
+        self.source_mask = np.zeros_like(self.mask)
+
+        # Every stroke is its own region: region id -> points added by that stroke
+        self.regions: Dict[int, List[Point]] = {}
         
-        # Create grid of all possible points
-        self.grid: Dict[Tuple[float, float], Point] = {}
+        # Grid of all possible points, indexed [row, col] like the masks
+        self.grid = np.empty((self.rows, self.cols), dtype=object)
         self._initialize_grid()
         
         # Track drawn points in a set because we use this to do lookups
         self.drawn_points: Set[Point] = set()
-        self.all_points: Set[Point] = set(self.grid.values())
+        self.all_points: Set[Point] = set(self.grid.flat)
 
     def _initialize_grid(self):
-        """Initialize entire grid as exterior points"""
-        cols = int(self.width / self.resolution)
-        rows = int(self.height / self.resolution)
-        
-        for row in range(rows):
-            for col in range(cols):
-                x = col * self.resolution
-                y = row * self.resolution
-                self.grid[(x, y)] = Point(x, y)
+        """Initialize entire grid as exterior points.
+        Points are addressed by integer (row, col), x and y are only derived for output."""
+        for row in range(self.rows):
+            for col in range(self.cols):
+                self.grid[row, col] = Point(col * self.resolution, row * self.resolution, row=row, col=col)
         
         # Establish all connections
         self._establish_all_connections()
 
+    def _at(self, row: int, col: int) -> Optional[Point]:
+        """Point at grid index [row, col], None outside the grid"""
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return self.grid[row, col]
+        return None
+
     def _establish_all_connections(self):
         """Create linked list connections between all grid points"""
-        for (x, y), point in self.grid.items():
-            # Clear neighbors list first
-            point.attributes['neighbors'] = []
-            
-            # Reset quadrants
-            for q in Quadrant:
-                point.quadrants[q] = False
+        for (row, col), point in np.ndenumerate(self.grid):
+            # Cardinal directions (4-directional), up is -y
+            point.right = self._at(row, col + 1)
+            point.left = self._at(row, col - 1)
+            point.down = self._at(row + 1, col)
+            point.up = self._at(row - 1, col)
+            point.attributes['neighbors'] = [p for p in (point.right, point.left, point.down, point.up)
+                                             if p is not None]
 
-            # Cardinal directions (4-directional)
-            right_coord = (x + self.resolution, y)
-            if right_coord in self.grid:
-                point.right = self.grid[right_coord]
-                point.attributes['neighbors'].append(point.right)
-            
-            left_coord = (x - self.resolution, y)
-            if left_coord in self.grid:
-                point.left = self.grid[left_coord]
-                point.attributes['neighbors'].append(point.left)
-            
-            down_coord = (x, y + self.resolution)
-            if down_coord in self.grid:
-                point.down = self.grid[down_coord]
-                point.attributes['neighbors'].append(point.down)
-            
-            up_coord = (x, y - self.resolution)
-            if up_coord in self.grid:
-                point.up = self.grid[up_coord]
-                point.attributes['neighbors'].append(point.up)
-            
             # Quadrants (diagonals)
-            q1_coord = (x + self.resolution, y - self.resolution)  # NE
-            if q1_coord in self.grid:
-                point.q1 = self.grid[q1_coord]
-                point.quadrants[Quadrant.Q1] = True
-            
-            q2_coord = (x - self.resolution, y - self.resolution)  # NW
-            if q2_coord in self.grid:
-                point.q2 = self.grid[q2_coord]
-                point.quadrants[Quadrant.Q2] = True
-            
-            q3_coord = (x - self.resolution, y + self.resolution)  # SW
-            if q3_coord in self.grid:
-                point.q3 = self.grid[q3_coord]
-                point.quadrants[Quadrant.Q3] = True
-            
-            q4_coord = (x + self.resolution, y + self.resolution)  # SE
-            if q4_coord in self.grid:
-                point.q4 = self.grid[q4_coord]
-                point.quadrants[Quadrant.Q4] = True
-
-    def add_drawn_shape(self, coordinates: List[Tuple[float, float]], material=None, temperature=20.0):
-        """Add a drawn shape to the grid"""
-        print("Establishing drawn shape on grid")
+            point.q1 = self._at(row - 1, col + 1)  # NE
+            point.q2 = self._at(row - 1, col - 1)  # NW
+            point.q3 = self._at(row + 1, col - 1)  # SW
+            point.q4 = self._at(row + 1, col + 1)  # SE
+            for q, diagonal in zip(Quadrant, (point.q1, point.q2, point.q3, point.q4)):
+                point.quadrants[q] = diagonal is not None
+
+    def _cell(self, point: Point) -> Tuple[int, int]:
+        """[row, col] of a point in the masks"""
+        return point.row, point.col
+
+    def _index(self, x: float, y: float) -> Optional[Tuple[int, int]]:
+        """[row, col] of the cell nearest a physical coordinate, None outside the grid"""
+        row, col = int(round(y / self.resolution)), int(round(x / self.resolution))
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def _new_region(self) -> int:
+        region = len(self.regions)
+        self.regions[region] = []
+        return region
+
+    def _mark_drawn(self, point: Point, region: int):
+        point.is_drawn = True
+        point.attributes['region'] = region
+        self.mask[self._cell(point)] = True
+        self.drawn_points.add(point)
+        self.regions[region].append(point)
+
+    @profiled("splitter.add_drawn_shape")
+    def add_drawn_shape(self, coordinates: List[Tuple[float, float]], material=None, temperature=20.0,
+                        k_value=None, h_value=None, region=None):
+        """Add a drawn shape to the grid, as a new region unless one is given"""
+        self._log("Establishing drawn shape on grid")
+        if region is None:
+            region = self._new_region()
         drawn_points = []
         
-        for coord in coordinates:
-            x, y = coord
-            # Round to grid
-            x = round(x / self.resolution) * self.resolution
-            y = round(y / self.resolution) * self.resolution
+        for x, y in coordinates:
+            # Round to the nearest grid index
+            index = self._index(x, y)
             
-            if (x, y) in self.grid:
-                point = self.grid[(x, y)]
+            if index is not None:
+                point = self.grid[index]
                 
                 if not point.is_drawn:
-                    point.is_drawn = True
+                    self._mark_drawn(point, region)
                     point.attributes['material'] = material
                     point.attributes['temperature'] = temperature
-                    self.drawn_points.add(point)
+                    point.attributes['k'] = k_value
+                    point.attributes['h'] = h_value
                     drawn_points.append(point)
 
         self._classify_points_by_quadrants()
 
         return drawn_points
     
+    @profiled("splitter.integrate_under_line")
     def integrate_under_line(self, coordinates, k_value=None, h_value=None, temperature=20.0):
         """
         Fill all grid points vertically under a drawn line.
-        Stores numeric thermal properties for physics simulation.
+        Stores numeric thermal properties for physics simulation,
+        leave k_value/h_value as None to use the values given to the solver.
         """
-        print("Integrating under drawn line")
+        self._log("Integrating under drawn line")
 
-        # First add the boundary points
-        boundary_points = self.add_drawn_shape(coordinates, material=None, temperature=temperature)
+        # First add the boundary points, the stroke and its fill form one region
+        region = self._new_region()
+        boundary_points = self.add_drawn_shape(coordinates, material=None, temperature=temperature,
+                                               k_value=k_value, h_value=h_value, region=region)
 
         if not boundary_points:
             return []
 
-        # Group boundary points by x coordinate
+        # Highest boundary row of every column
         column_heights = {}
         for point in boundary_points:
-            x = point.x
-            y = point.y
-            if x not in column_heights:
-                column_heights[x] = y
-            else:
-                column_heights[x] = max(column_heights[x], y)
+            column_heights[point.col] = max(column_heights.get(point.col, 0), point.row)
 
         filled_points = []
 
-        # Fill each column from y=0 to max_y
-        for x, max_y in column_heights.items():
-            y = 0
-            while y <= max_y:
-                if (x, y) in self.grid:
-                    point = self.grid[(x, y)]
-                    if not point.is_drawn:
-                        point.is_drawn = True
-                        # Store numeric thermal properties
-                        point.attributes['k'] = k_value
-                        point.attributes['h'] = h_value
-                        point.attributes['temperature'] = temperature
-                        self.drawn_points.add(point)
-                        filled_points.append(point)
-                y += self.resolution
-
-        print(f"Integrated {len(filled_points)} interior points with k={k_value}, h={h_value}")
+        # Fill each column from row 0 to its highest row
+        for col, max_row in column_heights.items():
+            for point in self.grid[:max_row + 1, col]:
+                if not point.is_drawn:
+                    self._mark_drawn(point, region)
+                    # Store numeric thermal properties
+                    point.attributes['k'] = k_value
+                    point.attributes['h'] = h_value
+                    point.attributes['temperature'] = temperature
+                    filled_points.append(point)
+
+        self._log(f"Integrated {len(filled_points)} interior points with k={k_value}, h={h_value}")
         
         self._classify_points_by_quadrants()
-        for i, point in enumerate(list(self.shape.drawn_points)[:10]):
-            print(f"Point {i}: ({point.x},{point.y}) type={point.attributes['type']}")
+        if self.verbose:
+            for i, point in enumerate(list(self.drawn_points)[:10]):
+                print(f"Point {i}: ({point.x},{point.y}) type={point.attributes['type']}")
         return filled_points
 
+    def paint_properties(self, coordinates, k_value=None, h_value=None, heat_source=None, material=None):
+        """Overwrite thermal properties of drawn points under the coordinates,
+        e.g. a copper insert in an aluminum base or a patch of chip heat (W/m^3).
+        Properties left as None are not touched."""
+        painted = []
+        for x, y in coordinates:
+            point = self.get_point_at(x, y)
+            if point is None or not point.is_drawn:
+                continue
+            if k_value is not None:
+                point.attributes['k'] = k_value
+            if h_value is not None:
+                point.attributes['h'] = h_value
+            if heat_source is not None:
+                point.attributes['heat_source'] = heat_source
+            if material is not None:
+                point.attributes['material'] = material
+            painted.append(point)
+
+        self._log(f"Painted {len(painted)} points")
+        return painted
+
+    def add_heat_sources(self, coordinates):
+        """Mark drawn cells under the coordinates as fixed temperature (T_base) heat sources"""
+        sources = []
+        for x, y in coordinates:
+            point = self.get_point_at(x, y)
+            if point is None or not point.is_drawn:
+                continue
+            self.source_mask[self._cell(point)] = True
+            sources.append(point)
+
+        self._classify_points_by_quadrants()
+        self._log(f"Added {len(sources)} heat source points")
+        return sources
+
+    def root_mask(self) -> np.ndarray:
+        """Drawn cells that are held at the heat source temperature"""
+        roots = self.source_mask & self.mask
+        if self.root_at_x0:
+            roots[:, 0] |= self.mask[:, 0]
+        return roots
+
+    def label_components(self):
+        """Label the connected (4-neighbor) bodies of drawn cells and find which of them
+        touch a heat source, in one pass over the masks.
+        Returns (labels, count, sourced) with labels 1..count per cell and sourced the labels with a source"""
+        labels, count = ndimage.label(self.mask)
+        sourced = np.unique(labels[self.root_mask()])
+        return labels, count, sourced[sourced > 0]
+
+    def quadrant_masks(self) -> Dict[Quadrant, np.ndarray]:
+        """Material quadrants of every cell as [row, col] masks, see mask_quadrants"""
+        return self.mask_quadrants(self.mask)
+
+    @staticmethod
+    def mask_quadrants(mask) -> Dict[Quadrant, np.ndarray]:
+        """Material quadrants of every cell of a [row, col] mask, from shifted copies of the mask.
+        A quadrant is material only if its diagonal AND both cardinals beside it are drawn,
+        otherwise a step (drawn diagonal, missing cardinal) hides an exposed face."""
+        rows, cols = mask.shape
+        padded = np.pad(mask, 1)
+
+        def shifted(d_row, d_col):
+            return padded[1 + d_row:1 + d_row + rows, 1 + d_col:1 + d_col + cols]
+
+        right, left, up, down = shifted(0, 1), shifted(0, -1), shifted(-1, 0), shifted(1, 0)
+        return {
+            Quadrant.Q1: shifted(-1, 1) & right & up,
+            Quadrant.Q2: shifted(-1, -1) & left & up,
+            Quadrant.Q3: shifted(1, -1) & left & down,
+            Quadrant.Q4: shifted(1, 1) & right & down,
+        }
+
+    @staticmethod
+    def quadrant_code(mask) -> np.ndarray:
+        """Every cell's material quadrants as a 4 bit code, bit i for the i-th Quadrant"""
+        quadrants = ShapeDataStructure.mask_quadrants(mask)
+        code = np.zeros(mask.shape, dtype=np.uint8)
+        for bit, q in enumerate(Quadrant):
+            code |= quadrants[q].astype(np.uint8) << bit
+        return code
+
+    @staticmethod
+    def classify_pattern(value):
+        """(present quadrants, type, rotation) of a non-source cell with quadrant code value"""
+        present = [q for bit, q in enumerate(Quadrant) if value >> bit & 1]
+        missing_quadrants = [q for q in Quadrant if q not in present]
+        missing_count = len(missing_quadrants)
+        # Classify based on missing quadrants, 4 missing (a lone line of cells) falls back to planar
+        point_type = {0: PointType.INTERIOR, 1: PointType.INTERIOR_CORNER, 2: PointType.PLANAR,
+                      3: PointType.EXTERIOR_CORNER}.get(missing_count, PointType.PLANAR)
+        rotation = ShapeDataStructure._calculate_rotation(None, missing_count, missing_quadrants)
+        return present, point_type, rotation
+
+    @profiled("splitter.classify")
     def _classify_points_by_quadrants(self):
         """Classify points based on missing quadrants and set rotation"""
-        # First reset all quadrants for drawn points
+        # 1. Quadrant codes, heat source cells and connected bodies for the whole grid at once
+        code = self.quadrant_code(self.mask)
+        roots = self.root_mask()
+        labels, _, _ = self.label_components()
+
+        # 2. Type and rotation per distinct pattern
+        patterns = {int(value): self.classify_pattern(int(value)) for value in np.unique(code[self.mask])}
+
+        # 3. Copy onto the drawn points
         for point in self.drawn_points:
+            cell = self._cell(point)
+            present, point_type, rotation = patterns[int(code[cell])]
             for q in Quadrant:
-                point.quadrants[q] = False
-    
-        # Then update quadrants based on actual diagonal connections
-        for point in self.drawn_points:
-            # Check each diagonal neighbor and set quadrant if it exists AND is drawn
-            if point.q1 is not None:
-                point.quadrants[Quadrant.Q1] = point.q1.is_drawn
-            if point.q2 is not None:
-                point.quadrants[Quadrant.Q2] = point.q2.is_drawn
-            if point.q3 is not None:
-                point.quadrants[Quadrant.Q3] = point.q3.is_drawn
-            if point.q4 is not None:
-                point.quadrants[Quadrant.Q4] = point.q4.is_drawn
-        
-        # Now classify based on updated quadrants
-        for point in self.drawn_points:
-            # Check for root node (heat source at x=0)
-            if point.x == 0:
+                point.quadrants[q] = q in present
+            point.attributes['component'] = int(labels[cell])
+            point.attributes['root'] = bool(roots[cell])
+            # Check for root node (heat source)
+            if roots[cell]:
                 point.attributes['type'] = PointType.ROOT
                 point.attributes['rotation'] = 0.0
-                point.attributes['root'] = True
-                continue
-            
-            # Count missing quadrants
-            missing_count = point.count_missing_quadrants()
-            missing_quadrants = point.get_missing_quadrants()
-            
-            # Classify based on missing quadrants
-            if missing_count == 0:
-                point.attributes['type'] = PointType.INTERIOR
-            elif missing_count == 1:
-                point.attributes['type'] = PointType.INTERIOR_CORNER
-            elif missing_count == 2:
-                point.attributes['type'] = PointType.PLANAR
-            elif missing_count == 3:
-                point.attributes['type'] = PointType.EXTERIOR_CORNER
-            else: # missing_count == 4:
-                point.attributes['type'] = PointType.PLANAR
-            
-            # Calculate rotation
-            point.attributes['rotation'] = self._calculate_rotation(point, missing_count, missing_quadrants)
+            else:
+                point.attributes['type'] = point_type
+                point.attributes['rotation'] = rotation
 
     def _update_point_quadrants(self, point: Point):
         """Update quadrant booleans based on whether diagonal points are drawn"""
@@ -241,7 +324,8 @@ class ShapeDataStructure:
             return point.q4
         return None    
 
-    def _calculate_rotation(self, point: Point, missing_count: int, missing_quadrants: List[Quadrant]):
+    @staticmethod
+    def _calculate_rotation(point: Point, missing_count: int, missing_quadrants: List[Quadrant]):
         """Calculate rotation in radians based on which quadrants are missing"""
         # Convert Quadrant enums to strings for comparison
         missing_str = [q.value for q in missing_quadrants]
@@ -347,10 +431,9 @@ class ShapeDataStructure:
         return [p for p in self.drawn_points if p.attributes.get('type') == point_type]
     
     def get_point_at(self, x: float, y: float) -> Optional[Point]:
-        """Get point at specific grid coordinates"""
-        x = round(x / self.resolution) * self.resolution
-        y = round(y / self.resolution) * self.resolution
-        return self.grid.get((x, y))
+        """Get the point nearest a physical coordinate, None outside the grid"""
+        index = self._index(x, y)
+        return None if index is None else self.grid[index]
     
     def clear_shape(self):
         """Clear all drawn points"""
@@ -362,6 +445,16 @@ class ShapeDataStructure:
             point.attributes['root'] = False
             point.attributes['k'] = None
             point.attributes['h'] = None
+            point.attributes['heat_source'] = 0.0
+            point.attributes['region'] = None
+            point.attributes['component'] = None
         
         self.drawn_points.clear()
-        print("Shape cleared")
\ No newline at end of file
+        self.regions.clear()
+        self.mask[:] = False
+        self.source_mask[:] = False
+        self._log("Shape cleared")
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
\ No newline at end of file
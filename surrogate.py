@@ -0,0 +1,90 @@
+# surrogate.py
+# Reduced order model of one geometry for instant what-if queries (UI sliders).
+# With a uniform k and h the assembled system is A(Bi) = K + Bi*C with Bi = h*delta_x/k, and the field is
+#   T = T_free_stream + (T_base - T_free_stream) * u(Bi) + delta_x^2/k * v(Bi)
+# where A u = 1 on the heat source rows and A v = -capacity*q (painted heat generation), both linear in
+# T_base and T_free_stream. u and v are solved at a few Biot numbers, compressed to an orthonormal (POD)
+# basis V, and every query solves the least squares reduced system min |A(Bi) V a - rhs|, whose r x r
+# matrix is a quadratic in Bi precomputed once. A query is a few microseconds, independent of the node count.
+import numpy as np
+import scipy.sparse.linalg as spla
+from physics import node_heat_source
+from result_cache import canonical_order
+
+class BiotSurrogate:
+    """Surrogate of one SparseSystem over the Biot number, built from solves at biot_values
+    (or from given u snapshots, e.g. a sweep). Valid for constant k, no radiation and no painted k or h."""
+    def __init__(self, system, biot_values=None, snapshots=None, tol=1e-10):
+        if not self.supports(system):
+            raise ValueError("The surrogate needs a uniform k and h, the shape has painted k or h")
+        self.system = system
+
+        # 1. Affine pieces: A(Bi) = K + Bi*C, right hand sides of u and v
+        K, root_rhs = system.assemble(1.0, 0.0, 0.0, 1.0, 1.0)
+        C = system.assemble(1.0, 0.0, 1.0, 1.0, 1.0)[0] - K
+        q = node_heat_source(system)
+        generation = system.assemble(0.0, 0.0, 0.0, 1.0, 1.0, q)[1] if np.any(q) else None
+        rhs = [root_rhs] if generation is None else [root_rhs, generation]
+
+        # 2. Snapshots at the sample Biot numbers, direct solves unless given
+        columns = [] if snapshots is None else [np.asarray(s, dtype=np.float64) for s in snapshots]
+        for biot in ([] if biot_values is None else biot_values):
+            lu = spla.splu((K + biot * C).tocsc())
+            columns.extend(lu.solve(b) for b in rhs)
+        if not columns:
+            raise ValueError("Give biot_values or snapshots to build the surrogate from")
+
+        # 3. POD basis: left singular vectors above tol of the largest singular value, of the snapshots
+        # scaled to unit length (v is in the units of q and would otherwise drown u)
+        snapshots = np.column_stack(columns)
+        U, sigma, _ = np.linalg.svd(snapshots / np.maximum(np.linalg.norm(snapshots, axis=0), 1e-300), full_matrices=False)
+        self.basis = U[:, sigma > tol * sigma[0]]
+
+        # 4. Least squares reduced system, (K V + Bi C V)^T (K V + Bi C V) a = (K V + Bi C V)^T rhs
+        KV, CV = K @ self.basis, C @ self.basis
+        self.M = (KV.T @ KV, KV.T @ CV + CV.T @ KV, CV.T @ CV)
+        R = np.column_stack(rhs + [np.zeros(system.n)] * (2 - len(rhs)))
+        self.r = (KV.T @ R, CV.T @ R)
+
+        # Surface heat functional, heat rate = h*delta_x*thickness * surface @ (T - T_free_stream)
+        self.surface = np.where(system.root, 0.0, system.conv / 2) @ self.basis
+        self.biot_range = (min(biot_values), max(biot_values)) if biot_values is not None else None
+
+    @staticmethod
+    def supports(system):
+        return np.all(np.isnan(system.node_property('k'))) and np.all(np.isnan(system.node_property('h')))
+
+    @classmethod
+    def from_store(cls, system, store, delta_x=None):
+        """Build from the cases of a sweep ResultStore of the same geometry (no heat generation),
+        each case gives u = (T - T_free_stream)/(T_base - T_free_stream) at Bi = h*delta_x/k.
+        delta_x defaults to the sweep's grid resolution."""
+        if delta_x is None:
+            delta_x = store.meta["resolution"]
+        order = canonical_order(system.points)
+        snapshots, biots = [], []
+        for case, values in zip(store.cases(), store.results()):
+            u = np.empty(system.n)
+            u[order] = (np.asarray(values, dtype=np.float64) - case["T_free_stream"]) / (case["T_base"] - case["T_free_stream"])
+            snapshots.append(u)
+            biots.append(case["h"] * delta_x / case["k"])
+        surrogate = cls(system, snapshots=snapshots)
+        surrogate.biot_range = (min(biots), max(biots))
+        return surrogate
+
+    def coefficients(self, biot):
+        """Reduced coordinates (a_u, a_v) at one Biot number"""
+        M0, M1, M2 = self.M
+        r0, r1 = self.r
+        a = np.linalg.solve(M0 + biot * (M1 + biot * M2), r0 + biot * r1)
+        return a[:, 0], a[:, 1]
+
+    def field(self, T_base, T_free_stream, h, delta_x, k):
+        """Temperatures of every node, in the system's point order"""
+        a_u, a_v = self.coefficients(h * delta_x / k)
+        return T_free_stream + self.basis @ ((T_base - T_free_stream) * a_u + delta_x**2 / k * a_v)
+
+    def heat_rate(self, T_base, T_free_stream, h, delta_x, k, thickness=1.0):
+        """Convective heat rate of the surface (as postprocess.heat_rate_summary), without the field"""
+        a_u, a_v = self.coefficients(h * delta_x / k)
+        return h * delta_x * thickness * (self.surface @ ((T_base - T_free_stream) * a_u + delta_x**2 / k * a_v))
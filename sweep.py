@@ -0,0 +1,101 @@
+# sweep.py
+# Batch runs of one drawn geometry over k / h / temperature combinations, written to a ResultStore.
+# python sweep.py --heights 8,8,6,6,4,4,2 --k 237 401 --h 50 500 --out sweep_results
+# python sweep.py --session design.hss --k 237 401 --out sweep_results   (a saved ShapeUI session)
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from splitter import ShapeDataStructure
+from math_module import PRECISIONS
+from physics import update_temperatures
+from result_store import ResultStore
+from session import Session, load_session
+import profiling
+
+def shape_from_heights(heights, resolution=1, shape=None):
+    """Headless version of one UI stroke: column x is filled from y=0 up to heights[x] cells.
+    Draws on a new quiet shape, or clears `shape` and redraws on its grid."""
+    if shape is None:
+        width = len(heights) * resolution
+        height = (max(heights) + 1) * resolution
+        shape = ShapeDataStructure(width, height, resolution, verbose=False)
+    else:
+        shape.clear_shape()
+        resolution = shape.resolution
+    coordinates = [(x * resolution, (h - 1) * resolution) for x, h in enumerate(heights) if h > 0]
+    shape.integrate_under_line(coordinates)
+    return shape
+
+# Each worker process builds the geometry once and reuses it for every case it runs
+_worker_shapes = {}
+
+def _worker_shape(heights, resolution, session=None):
+    key = ("session", session) if session else (tuple(heights), resolution)
+    if key not in _worker_shapes:
+        _worker_shapes[key] = load_session(session)[0] if session else shape_from_heights(heights, resolution)
+    return _worker_shapes[key]
+
+@profiling.profiled("sweep.solve_case")
+def solve_case(store_path, heights, resolution, case, precision="double", session=None):
+    """Solve one case and append it to the store, safe to run from any process"""
+    shape = _worker_shape(heights, resolution, session)
+    stats = update_temperatures(shape.drawn_points, case["T_base"], case["T_free_stream"], case["h"],
+                                resolution, case["k"], precision=precision)
+    return ResultStore.open(store_path).append_points(shape.drawn_points, **case, iterations=stats["iterations"])
+
+def run_sweep(heights, store_path, k_values, h_values, T_base_values=(100.0,), T_free_stream_values=(25.0,),
+              resolution=1, dtype=None, workers=None, precision="double", session=None):
+    """Solve every combination of the parameter values in a process pool, each worker
+    appends its results to the store directly. The store holds float32 for precision='single'
+    and float64 otherwise, unless dtype says else.
+    With a session file the geometry (and its painted attributes) comes from the session, not heights."""
+    if dtype is None:
+        dtype = PRECISIONS[precision]
+    if session:
+        resolution = Session.open(session).header["resolution"]
+        shape = _worker_shape(None, resolution, session)
+    else:
+        shape = shape_from_heights(heights, resolution)
+    ResultStore.create(store_path, shape, dtype=dtype, heights=heights and list(heights), resolution=resolution,
+                       precision=precision, session=session)
+
+    cases = [dict(k=k, h=h, T_base=T_base, T_free_stream=T_free_stream)
+             for k, h, T_base, T_free_stream in itertools.product(k_values, h_values, T_base_values, T_free_stream_values)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(solve_case, itertools.repeat(store_path), itertools.repeat(heights and list(heights)),
+                             itertools.repeat(resolution), cases, itertools.repeat(precision),
+                             itertools.repeat(session)))
+
+    print(f"Stored {len(rows)} cases of {len(shape.drawn_points)} nodes in {store_path}")
+    return ResultStore.open(store_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep a heat sink profile over materials and temperatures")
+    geometry = parser.add_mutually_exclusive_group(required=True)
+    geometry.add_argument("--heights", help="comma separated column heights, e.g. 8,8,6,4")
+    geometry.add_argument("--session", help="geometry of a saved ShapeUI session (.hss)")
+    parser.add_argument("--resolution", type=float, default=1)
+    parser.add_argument("--k", type=float, nargs="+", default=[237.0])
+    parser.add_argument("--h", type=float, nargs="+", default=[50.0])
+    parser.add_argument("--T-base", type=float, nargs="+", default=[100.0])
+    parser.add_argument("--T-free-stream", type=float, nargs="+", default=[25.0])
+    parser.add_argument("--precision", choices=["double", "single", "mixed"], default="double")
+    parser.add_argument("--dtype", choices=["float32", "float64"], default=None,
+                        help="store dtype, float32 for single precision and float64 otherwise by default")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default="sweep_results")
+    parser.add_argument("--profile", nargs="?", const="profiles", metavar="DIR",
+                        help="profile every solve (workers too) into DIR, see profiling.py")
+    args = parser.parse_args(argv)
+    if args.profile:
+        profiling.enable(args.profile)
+
+    heights = [int(h) for h in args.heights.split(",")] if args.heights else None
+    run_sweep(heights, args.out, args.k, args.h, args.T_base, args.T_free_stream,
+              resolution=args.resolution, dtype=args.dtype and np.dtype(args.dtype), workers=args.workers,
+              precision=args.precision, session=args.session)
+
+if __name__ == "__main__":
+    main()
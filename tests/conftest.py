@@ -0,0 +1,20 @@
+# Shared helpers: a small stepped fin solved through the drawn shape pipeline
+import pytest
+from sweep import shape_from_heights
+from math_module import SparseSystem
+from physics import update_temperatures
+from postprocess import node_temperatures
+
+FIN = [8, 8, 7, 6, 6, 5, 4, 4, 3]
+PARAMS = dict(T_base=80.0, T_free_stream=25.0, h=50.0, delta_x=0.001, k=200.0)
+
+def solve(shape, **overrides):
+    """(SparseSystem, temperatures) of a shape solved with PARAMS and any overrides"""
+    params = dict(PARAMS, **overrides)
+    system = SparseSystem(shape.drawn_points)
+    update_temperatures(None, system=system, **params)
+    return system, node_temperatures(system)
+
+@pytest.fixture
+def fin():
+    return shape_from_heights(FIN)
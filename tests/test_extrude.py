@@ -0,0 +1,25 @@
+# Extruded 3D solve: energy balance, the solvers agree and the field is symmetric through the depth
+import numpy as np
+import pytest
+from conftest import PARAMS
+from extrude import solve_extruded
+
+def test_cg_matches_direct_and_balances(fin):
+    args = (fin, 5, PARAMS["T_base"], PARAMS["T_free_stream"], PARAMS["h"], PARAMS["delta_x"], PARAMS["k"])
+    direct, stats = solve_extruded(*args, solver="direct")
+    cg, _ = solve_extruded(*args, solver="cg")
+    assert np.allclose(cg, direct, equal_nan=True, rtol=0, atol=1e-7)
+    assert stats["base_heat"] == pytest.approx(stats["heat_rate"], rel=1e-8)
+    assert np.nanmin(direct) > PARAMS["T_free_stream"] and np.nanmax(direct) == pytest.approx(PARAMS["T_base"])
+
+def test_symmetric_through_the_depth(fin):
+    field, _ = solve_extruded(fin, 6, PARAMS["T_base"], PARAMS["T_free_stream"], PARAMS["h"], PARAMS["delta_x"],
+                              PARAMS["k"], solver="direct")
+    assert np.allclose(field, field[::-1], equal_nan=True, rtol=0, atol=1e-9)
+
+@pytest.mark.parametrize("paint, k", [({"k_value": 401.0}, PARAMS["k"]), ({"h_value": 10.0}, PARAMS["k"]),
+                                      ({"heat_source": 1e6}, PARAMS["k"]), ({}, {"T": [0, 100], "k": [100, 300]})])
+def test_unmodelled_inputs_are_refused(fin, paint, k):
+    fin.paint_properties([(3, 2)], **paint)
+    with pytest.raises(ValueError, match="3D mode"):
+        solve_extruded(fin, 3, PARAMS["T_base"], PARAMS["T_free_stream"], PARAMS["h"], PARAMS["delta_x"], k)
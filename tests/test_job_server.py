@@ -0,0 +1,85 @@
+# Job server over loopback: dedupe, results against direct solves, bad requests, limits and eviction
+import asyncio
+import pytest
+import job_server
+from job_server import JobClient, JobServer, solve_job, validate_job
+
+BASE = {"heights": [6, 6, 5, 4, 3], "h": 50, "T_base": 100, "T_free_stream": 25, "delta_x": 0.001}
+
+async def _run(scenario):
+    server = JobServer(workers=1, batch_delay=0.01)
+    port = await server.start("127.0.0.1", 0)
+    try:
+        return await scenario(server, JobClient(port=port))
+    finally:
+        await server.close()
+
+def test_jobs_are_deduplicated_and_solved():
+    async def scenario(server, client):
+        ids = await client.submit(dict(BASE, k=237), dict(BASE, k=401), dict(BASE, k=237))
+        states = [await client.wait(identifier) for identifier in ids]
+        return ids, states, await client.status()
+
+    ids, states, status = asyncio.run(_run(scenario))
+    assert ids[0] == ids[2] and ids[0] != ids[1]
+    assert all(state["status"] == "done" for state in states)
+    assert status["jobs"] == {"done": 2}
+    expected = solve_job(dict(BASE, k=401))["summary"]["heat_rate"]
+    assert states[1]["result"]["summary"]["heat_rate"] == pytest.approx(expected)
+
+def test_invalid_job_is_rejected():
+    async def scenario(server, client):
+        with pytest.raises(RuntimeError, match="400"):
+            await client.submit({"heights": [4, 4], "k": 1})
+        with pytest.raises(RuntimeError, match="404"):
+            await client.get("unknown")
+
+    asyncio.run(_run(scenario))
+
+def test_batch_is_validated_before_queueing():
+    async def scenario(server, client):
+        with pytest.raises(RuntimeError, match="limit"):
+            await client.submit(dict(BASE, k=237), dict(BASE, k=237, heights=[10**6]))
+        return await client.status()
+
+    assert asyncio.run(_run(scenario)) == {"queued": 0, "jobs": {}}
+
+@pytest.mark.parametrize("bad", [{"heights": [2, -1]}, {"heights": []}, {"cells": [[0, 1.5]]}, {"cells": [[2000, 2000]]}])
+def test_grid_limits_and_cell_types(bad):
+    spec = dict({key: value for key, value in BASE.items() if key != "heights"}, k=237, **bad)
+    with pytest.raises(ValueError):
+        validate_job(spec, max_nodes=10_000)
+
+@pytest.mark.parametrize("body", [{"jobs": 5}, {"jobs": [5]}, {"jobs": {"heights": [4]}},
+                                  dict(BASE, k=237, delta_x="a"), dict(BASE, k=[237]), dict(BASE, k=True),
+                                  dict(BASE, k=float("nan")), dict(BASE, k=237, T_base=float("inf")),
+                                  dict(BASE, k=237, emissivity=None), dict(BASE, k=-1)])
+def test_malformed_bodies_get_a_400(body):
+    async def scenario(server, client):
+        with pytest.raises(RuntimeError, match="400"):
+            await client._request("POST", "/jobs", body)
+        return await client.status()
+
+    assert asyncio.run(_run(scenario)) == {"queued": 0, "jobs": {}}
+
+def test_finished_jobs_are_evicted():
+    async def scenario(server, client):
+        first, second = await client.submit(dict(BASE, k=237), dict(BASE, k=401))
+        await client.wait(first)
+        await client.wait(second)
+        server.max_finished = 1
+        server._evict()
+        kept = sorted(server.jobs)
+        server.finished_ttl = 0.0
+        server._evict()
+        return first, second, kept, server.jobs
+
+    first, second, kept, jobs = asyncio.run(_run(scenario))
+    assert len(kept) == 1 and kept[0] in (first, second) and jobs == {}
+
+def test_worker_geometries_are_bounded():
+    job_server._worker_shapes.clear()
+    for width in range(job_server.MAX_WORKER_GEOMETRIES + 3):
+        solve_job(dict(BASE, k=237, heights=[4] * (width + 2)))
+    assert len(job_server._worker_shapes) == job_server.MAX_WORKER_GEOMETRIES
+    assert ("heights", (4,) * (job_server.MAX_WORKER_GEOMETRIES + 4)) in job_server._worker_shapes
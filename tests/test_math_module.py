@@ -0,0 +1,79 @@
+# Sparse assembly, the SymPy path and the working precisions, and the stencil regressions:
+# rotated offsets, insulated missing faces and the exterior corner diagonal
+import numpy as np
+import pytest
+from conftest import PARAMS, solve
+from Enum import PointType
+from math_module import (Factorization, SparseSystem, conductivity_function, make_equation_list,
+                         make_variable_list, set_equations, solve_system)
+from sweep import shape_from_heights
+
+# Stepped profiles that use every stencil in several rotations
+STEPPED = [[8, 8, 7, 6, 6, 5, 4, 4, 3], [12] + [12, 12, 3, 3] * 3, [6, 6, 6, 4, 4]]
+
+def test_sympy_path_matches_sparse_solve(fin):
+    system, expected = solve(fin)
+    points = system.points
+    set_equations(points, PARAMS["T_base"], PARAMS["T_free_stream"], PARAMS["h"], PARAMS["delta_x"], PARAMS["k"])
+    solution = solve_system(make_equation_list(points), make_variable_list(points))
+    assert np.allclose(np.asarray(solution, dtype=np.float64), expected, rtol=0, atol=1e-9)
+
+@pytest.mark.parametrize("precision, atol", [("double", 1e-12), ("mixed", 1e-9), ("single", 1e-3)])
+def test_precisions(fin, precision, atol):
+    _, expected = solve(fin)
+    system, temperatures = solve(fin, precision=precision)
+    assert np.allclose(temperatures, expected, rtol=0, atol=atol)
+    A, b = system.assemble(PARAMS["T_base"], PARAMS["T_free_stream"], PARAMS["h"], PARAMS["delta_x"], PARAMS["k"])
+    if precision != "double":
+        assert Factorization(A, precision).nbytes < Factorization(A, "double").nbytes
+
+def test_mixed_precision_reports_an_unconverged_refinement(fin, capsys):
+    system = SparseSystem(fin.drawn_points)
+    A, b = system.assemble(PARAMS["T_base"], PARAMS["T_free_stream"], PARAMS["h"], PARAMS["delta_x"], PARAMS["k"])
+    converged = Factorization(A, "mixed")
+    converged.solve(b)
+    assert converged.residual <= converged.tol and capsys.readouterr().out == ""
+    stopped = Factorization(A, "mixed", max_refinements=0)
+    stopped.solve(b)
+    assert stopped.residual > stopped.tol
+    assert f"relative residual {stopped.residual:.3e}" in capsys.readouterr().out
+
+def test_linear_solver_rejects_reduced_precision(fin):
+    with pytest.raises(ValueError, match="double precision"):
+        solve(fin, linear_solver=lambda A, b: None, precision="mixed")
+
+@pytest.mark.parametrize("k", [237.0, {"T": [0, 100], "k": [200, 250]}, {"poly": [0.5, 200]}, lambda T: 2 * T])
+def test_conductivity_functions(k):
+    value = conductivity_function(k)(np.array([50.0]))
+    assert value.shape == (1,) and value[0] > 0
+
+def test_assembly_reuses_the_pattern(fin):
+    system = SparseSystem(fin.drawn_points)
+    A1, _ = system.assemble(100, 25, 50, 0.001, 200)
+    A2, _ = system.assemble(100, 25, system.node_values('h', 20), 0.001, np.full(system.n, 150.0))
+    assert np.array_equal(A1.indices, A2.indices) and np.array_equal(A1.indptr, A2.indptr)
+
+@pytest.mark.parametrize("heights", STEPPED)
+def test_insulated_rows_conserve_and_stay_at_base(heights):
+    system, temperatures = solve(shape_from_heights(heights), h=0.0)
+    A, _ = system.assemble(PARAMS["T_base"], PARAMS["T_free_stream"], 0.0, PARAMS["delta_x"], PARAMS["k"])
+    # Every stencil, in every rotation the shape uses, only couples to drawn neighbours
+    kinds = {(p.attributes.get('type'), round(p.attributes.get('rotation', 0), 3)) for p in system.points}
+    assert len(kinds) >= 6
+    assert np.allclose(np.asarray(A.sum(axis=1)).ravel()[~system.root], 0.0, atol=1e-12)
+    assert np.allclose(temperatures, PARAMS["T_base"], rtol=0, atol=1e-9)
+
+def test_exterior_corner_diagonal(fin):
+    system = SparseSystem(fin.drawn_points)
+    A, _ = system.assemble(PARAMS["T_base"], PARAMS["T_free_stream"], PARAMS["h"], PARAMS["delta_x"], PARAMS["k"])
+    biot = PARAMS["h"] * PARAMS["delta_x"] / PARAMS["k"]
+    corners = [i for i, p in enumerate(system.points) if p.attributes.get('type') == PointType.EXTERIOR_CORNER
+               and A[i].nnz == 3]
+    assert corners
+    assert np.allclose(A.diagonal()[corners], -2 * (1 + biot))
+
+@pytest.mark.parametrize("heights", STEPPED)
+def test_fields_stay_between_ambient_and_base(heights):
+    _, temperatures = solve(shape_from_heights(heights))
+    assert np.all(temperatures <= PARAMS["T_base"] + 1e-9)
+    assert np.all(temperatures >= PARAMS["T_free_stream"] - 1e-9)
@@ -0,0 +1,42 @@
+# Fin profile optimizer: valid profiles, warm started children and the Pareto front
+import random
+import pytest
+from optimizer import (ProfileEvaluator, is_valid_profile, optimize_profile, pareto_front, perturb,
+                       profile_area)
+
+PARAMS = dict(T_base=100.0, T_free_stream=25.0, h=50.0, k=237.0, delta_x=0.001)
+
+@pytest.mark.parametrize("heights, valid", [
+    ([6, 6, 4, 4], True), ([6, 0, 4], False), ([6, 1], False), ([4, 6, 4], False), ([6], False)])
+def test_valid_profiles(heights, valid):
+    assert is_valid_profile(heights) == valid
+
+def test_perturb_stays_valid_and_in_budget():
+    rng = random.Random(1)
+    heights = [6, 6, 6, 6, 6]
+    for _ in range(50):
+        heights = perturb(heights, 30, 10, rng)
+        assert is_valid_profile(heights) and profile_area(heights) <= 30
+
+def test_children_match_fresh_solves():
+    evaluator = ProfileEvaluator(6, 8, **PARAMS)
+    evaluator.set_parent([6, 6, 6, 6, 6, 6])
+    same_topology = evaluator.evaluate([6, 6, 6, 6, 6, 6])
+    grown = evaluator.evaluate([7, 7, 6, 6, 5, 5])
+    assert same_topology["reused_factorization"]
+    fresh = ProfileEvaluator(6, 8, **PARAMS)
+    assert grown["heat_rate"] == pytest.approx(fresh.evaluate([7, 7, 6, 6, 5, 5])["heat_rate"], rel=1e-8)
+
+def test_pareto_front():
+    results = [{"area": 1, "heat_rate": 1}, {"area": 2, "heat_rate": 0.5}, {"area": 2, "heat_rate": 3},
+               {"area": 3, "heat_rate": 2}]
+    assert [r["heat_rate"] for r in pareto_front(results)] == [1, 3]
+
+def test_optimize_profile_front_is_feasible():
+    front = optimize_profile([6, 6, 6, 6, 6, 6], 30e-6, PARAMS["T_base"], PARAMS["T_free_stream"], PARAMS["h"],
+                             PARAMS["k"], max_height=10, delta_x=PARAMS["delta_x"], generations=2,
+                             parents_per_generation=2, children_per_parent=3, workers=2)
+    areas = [r["area"] for r in front]
+    rates = [r["heat_rate"] for r in front]
+    assert areas == sorted(areas) and rates == sorted(rates)
+    assert all(is_valid_profile(r["heights"]) and r["area"] <= 30e-6 + 1e-18 for r in front)
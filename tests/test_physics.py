@@ -0,0 +1,116 @@
+# Steady solves: k(T), radiation, per node properties and heat generation, and the transient solver
+import numpy as np
+import pytest
+from conftest import PARAMS, solve
+from physics import radiation_h, run_transient, update_temperatures
+from postprocess import heat_rate_summary
+from result_cache import ResultCache
+from result_store import ResultStore
+
+CURVE = {"T": [0.0, 100.0], "k": [100.0, 300.0]}
+
+def test_constant_curve_matches_constant_k(fin):
+    _, constant = solve(fin)
+    _, curve = solve(fin, k={"T": [0.0, 100.0], "k": [200.0, 200.0]})
+    assert np.allclose(curve, constant, rtol=0, atol=1e-9)
+
+def test_newton_and_picard_agree(fin):
+    _, newton = solve(fin, k=CURVE, method="newton")
+    _, picard = solve(fin, k=CURVE, method="picard")
+    assert np.allclose(newton, picard, rtol=0, atol=1e-7)
+
+def test_k_of_T_balances_and_lies_between_its_bounds(fin):
+    system, _ = solve(fin, k=CURVE)
+    summary = heat_rate_summary(system, **dict(PARAMS, k=CURVE))
+    assert summary["base_heat"] == pytest.approx(summary["heat_rate"], rel=1e-8)
+    low = heat_rate_summary(solve(fin, k=100.0)[0], **dict(PARAMS, k=100.0))["heat_rate"]
+    high = heat_rate_summary(solve(fin, k=300.0)[0], **dict(PARAMS, k=300.0))["heat_rate"]
+    assert low < summary["heat_rate"] < high
+
+def test_radiation_is_an_effective_h(fin):
+    _, plain = solve(fin)
+    _, zero = solve(fin, emissivity=0.0)
+    assert np.array_equal(zero, plain)
+    system, newton = solve(fin, emissivity=0.9, method="newton")
+    _, picard = solve(fin, emissivity=0.9, method="picard")
+    assert np.allclose(newton, picard, rtol=0, atol=1e-7)
+    # The converged field solves the linear system with h + h_rad(T) frozen at that field
+    h_eff = PARAMS["h"] + radiation_h(newton, PARAMS["T_free_stream"], 0.9)
+    A, b = system.assemble(PARAMS["T_base"], PARAMS["T_free_stream"], h_eff, PARAMS["delta_x"], PARAMS["k"])
+    assert np.max(np.abs(A @ newton - b)) < 1e-9 * PARAMS["T_base"]
+    assert np.max(np.abs(newton - plain)) > 1e-3
+
+def _face_balance(system, T):
+    # Nodal energy balance written out independently of the assembly: sum over faces of
+    # w * k_face * (T_j - T_i) with k_face the harmonic mean of k(T_i) and k(T_j), minus conv*h*dx*(T_i - T_inf)
+    k = np.interp(T, CURVE["T"], CURVE["k"])
+    k_face = 2 * k[system.rows] * k[system.cols] / (k[system.rows] + k[system.cols])
+    conduction = np.bincount(system.rows, system.weights * k_face * (T[system.cols] - T[system.rows]), system.n)
+    convection = system.conv * PARAMS["h"] * PARAMS["delta_x"] * (T - PARAMS["T_free_stream"])
+    return (conduction - convection)[~system.root], np.max(np.abs(conduction))
+
+def test_k_of_T_conducts_through_face_conductances(fin):
+    system, T = solve(fin, k=CURVE)
+    balance, scale = _face_balance(system, T)
+    assert np.max(np.abs(balance)) < 1e-8 * scale
+    # A constant k at the mean conductivity does not satisfy it
+    _, frozen = solve(fin, k=float(np.mean(np.interp(T, CURVE["T"], CURVE["k"]))))
+    assert np.max(np.abs(_face_balance(system, frozen)[0])) > 1e3 * np.max(np.abs(balance))
+
+def test_radiation_adds_heat_and_balances(fin):
+    plain = heat_rate_summary(solve(fin)[0], **PARAMS)
+    system, _ = solve(fin, emissivity=0.9)
+    radiating = heat_rate_summary(system, **PARAMS, emissivity=0.9)
+    assert radiating["radiative"] > 0
+    assert radiating["heat_rate"] > plain["heat_rate"]
+    assert radiating["base_heat"] == pytest.approx(radiating["heat_rate"], rel=1e-8)
+
+def test_painted_base_values_change_nothing(fin):
+    _, plain = solve(fin)
+    fin.paint_properties([(x, 2) for x in range(1, 6)], k_value=PARAMS["k"], h_value=PARAMS["h"])
+    _, painted = solve(fin)
+    assert np.allclose(painted, plain, rtol=0, atol=1e-12)
+
+def test_painted_insert_and_heat_generation(fin):
+    _, plain = solve(fin)
+    fin.paint_properties([(x, y) for x in range(1, 4) for y in range(3)], k_value=400.0)
+    _, insert = solve(fin)
+    assert np.all(insert >= plain - 1e-9) and np.max(insert - plain) > 0.01
+    fin.paint_properties([(6, 1)], heat_source=1e8)
+    system, heated = solve(fin)
+    assert np.max(heated) > PARAMS["T_base"]
+    summary = heat_rate_summary(system, **PARAMS)
+    # Generation leaves through the surface as well as into the source
+    assert summary["heat_rate"] > summary["base_heat"]
+
+def test_transient_reaches_steady_state(fin, tmp_path):
+    system, steady = solve(fin)
+    stats = run_transient(None, **PARAMS, density=2700.0, specific_heat=900.0, t_end=2000.0, dt=0.5,
+                          adaptive=True, tol=0.01, snapshot_path=str(tmp_path / "warmup"), snapshot_interval=100.0,
+                          system=system)
+    transient = np.array([p.attributes['temperature'] for p in system.points])
+    assert np.max(np.abs(transient - steady)) < 1e-3
+    store = ResultStore.open(str(tmp_path / "warmup"))
+    times = [case["t"] for case in store.cases()]
+    assert times[0] == 0.0 and times[-1] == stats["time"] == 2000.0 and times == sorted(times)
+    # Warming up from ambient, the stored field never drops
+    results = np.asarray(store.results())
+    assert np.all(np.diff(results, axis=0) >= -1e-9)
+
+@pytest.mark.parametrize("scheme", ["backward_euler", "crank_nicolson"])
+def test_fixed_step_reuses_one_factorization(fin, scheme):
+    stats = run_transient(fin.drawn_points, **PARAMS, density=2700.0, specific_heat=900.0, t_end=10.0, dt=1.0,
+                          scheme=scheme)
+    assert stats["steps"] == 10 and stats["factorizations"] == 1
+
+def test_cached_solve_is_identical(fin, tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    first = update_temperatures(fin.drawn_points, **PARAMS, cache=cache)
+    temperatures = {p: p.attributes['temperature'] for p in fin.drawn_points}
+    for point in fin.drawn_points:
+        point.attributes['temperature'] = 0.0
+    second = update_temperatures(fin.drawn_points, **PARAMS, cache=cache)
+    assert not first["cached"] and second["cached"]
+    assert all(p.attributes['temperature'] == t for p, t in temperatures.items())
+    third = update_temperatures(fin.drawn_points, **dict(PARAMS, h=60.0), cache=cache)
+    assert not third["cached"]
@@ -0,0 +1,23 @@
+# Heat rate, base heat, efficiency and effectiveness of a solved shape
+import pytest
+from conftest import PARAMS, solve
+from postprocess import heat_rate_summary
+
+def test_energy_balance_and_figures_of_merit(fin):
+    summary = heat_rate_summary(solve(fin)[0], **PARAMS)
+    assert summary["base_heat"] == pytest.approx(summary["heat_rate"], rel=1e-9)
+    assert summary["convective"] == summary["heat_rate"] and summary["radiative"] == 0.0
+    assert 0.0 < summary["efficiency"] <= 1.0
+    assert summary["effectiveness"] > 1.0
+
+def test_conductive_fin_has_efficiency_one(fin):
+    # With a very conductive fin the whole surface is at T_base
+    summary = heat_rate_summary(solve(fin, k=1e9)[0], **dict(PARAMS, k=1e9))
+    assert summary["efficiency"] == pytest.approx(1.0, rel=1e-6)
+
+def test_thickness_scales_the_rates(fin):
+    system, _ = solve(fin)
+    one = heat_rate_summary(system, **PARAMS)
+    deep = heat_rate_summary(system, **PARAMS, thickness=0.05)
+    assert deep["heat_rate"] == pytest.approx(0.05 * one["heat_rate"])
+    assert deep["base_flux"] == pytest.approx(one["base_flux"])
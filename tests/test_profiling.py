@@ -0,0 +1,47 @@
+# Opt-in profiling of the pipeline stages
+import glob
+import json
+import os
+import pstats
+import pytest
+import profiling
+from conftest import solve
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "_directory", None)
+    monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+    directory = profiling.enable(str(tmp_path / "profiles"))
+    yield directory
+    profiling._directory = None
+    os.environ.pop(profiling.PROFILE_ENV, None)
+
+def test_disabled_by_default():
+    assert not profiling.enabled() or os.environ.get(profiling.PROFILE_ENV)
+
+def test_stages_profiles_and_summary(fin, profile_dir):
+    solve(fin)
+    with open(os.path.join(profile_dir, "stages.jsonl")) as f:
+        records = [json.loads(line) for line in f]
+    stages = {r["stage"]: r for r in records}
+    assert {"math.sparse_pattern", "physics.update_temperatures", "math.solve_sparse"} <= set(stages)
+    assert stages["math.solve_sparse"]["depth"] == 1
+    outer = [r for r in records if r["depth"] == 0]
+    assert outer and all(os.path.exists(r["profile"]) for r in outer)
+    profiling.report(profile_dir, top=5)
+    with open(os.path.join(profile_dir, "summary.txt")) as f:
+        text = f.read()
+    assert "physics.update_temperatures" in text and "Hottest functions" in text
+
+def test_collapsed_stacks_for_flame_graphs(fin, profile_dir):
+    solve(fin)
+    profiling.report(profile_dir, top=5)
+    with open(os.path.join(profile_dir, "flamegraph.folded")) as f:
+        lines = [line.rsplit(" ", 1) for line in f.read().splitlines()]
+    stacks = {stack: int(microseconds) for stack, microseconds in lines}
+    assert all(value > 0 for value in stacks.values())
+    assert any(stack.split(";")[0].endswith("(update_temperatures)") and "(solve_sparse)" in stack for stack in stacks)
+    # The stacks carry the profiled own time, split over the callers
+    stats = pstats.Stats(*glob.glob(os.path.join(profile_dir, "*.prof")))
+    own = sum(entry[2] for entry in stats.stats.values())
+    assert sum(stacks.values()) / 1e6 == pytest.approx(own, rel=0.05)
@@ -0,0 +1,52 @@
+# Memory mapped result store, and sweeps appending to it from worker processes
+import numpy as np
+import pytest
+from conftest import FIN, PARAMS, solve
+from result_store import ResultStore
+from sweep import run_sweep, shape_from_heights
+
+def test_append_and_read_back(fin, tmp_path):
+    store = ResultStore.create(str(tmp_path / "store"), fin, heights=FIN)
+    solve(fin)
+    row = store.append_points(fin.drawn_points, h=PARAMS["h"])
+    expected = {p: p.attributes['temperature'] for p in fin.drawn_points}
+    for point in fin.drawn_points:
+        point.attributes['temperature'] = 0.0
+    store = ResultStore.open(str(tmp_path / "store"))
+    store.assign_to_points(fin.drawn_points, row)
+    assert len(store) == 1 and store.meta["heights"] == FIN
+    assert all(p.attributes['temperature'] == t for p, t in expected.items())
+    with pytest.raises(ValueError):
+        store.append(np.zeros(3))
+
+def test_sweep_from_workers_matches_direct_solves(tmp_path):
+    store = run_sweep(FIN, str(tmp_path / "sweep"), k_values=[100.0, 200.0], h_values=[20.0, 50.0],
+                      resolution=0.001, workers=2)
+    assert sorted(case["row"] for case in store.cases()) == list(range(4))
+    shape = shape_from_heights(FIN, resolution=0.001)
+    for row, case in enumerate(store.cases()):
+        solve(shape, k=case["k"], h=case["h"], T_base=case["T_base"], T_free_stream=case["T_free_stream"])
+        expected = {p: p.attributes['temperature'] for p in shape.drawn_points}
+        store.assign_to_points(shape.drawn_points, row)
+        assert all(p.attributes['temperature'] == pytest.approx(t, abs=1e-9) for p, t in expected.items())
+
+def test_columns_by_cell_at_sub_unit_resolution(tmp_path):
+    # Float (x, y) keys missed cells such as (0.3, 0.3) at resolution 0.1
+    shape = shape_from_heights(FIN, resolution=0.1)
+    store = ResultStore.create(str(tmp_path / "store"), shape)
+    solve(shape, delta_x=0.1)
+    row = store.append_points(shape.drawn_points)
+    point = shape.grid[3, 3]
+    assert store.nodes.dtype == np.int64
+    assert store.results()[row, store.column(3, 3)] == point.attributes['temperature']
+    # Same number of cells in another layout
+    with pytest.raises(ValueError):
+        store.assign_to_points(shape_from_heights(FIN[:-2] + [3, 4], resolution=0.1).drawn_points, row)
+
+def test_rows_count_on_across_store_handles(tmp_path):
+    first = ResultStore.create(str(tmp_path / "store"), np.zeros((2, 3), dtype=np.int64))
+    second = ResultStore.open(str(tmp_path / "store"))
+    rows = [store.append(np.full(2, i), i=i) for i, store in enumerate([first, second, first, first, second])]
+    assert rows == list(range(5))
+    assert [case["i"] for case in first.cases()] == rows
+    assert np.array_equal(second.results()[:, 0], rows)
@@ -0,0 +1,65 @@
+# Additive Schwarz GMRES against the direct solve
+import numpy as np
+import pytest
+from conftest import PARAMS
+from math_module import SparseSystem
+from physics import update_temperatures
+from postprocess import node_temperatures
+from schwarz import SchwarzPreconditioner, SchwarzSolver, column_subdomains
+from sweep import shape_from_heights
+
+COMB = [12] + [12, 12, 1, 1] * 6
+
+@pytest.fixture
+def comb():
+    return SparseSystem(shape_from_heights(COMB).drawn_points)
+
+def test_subdomains_own_every_node_once(comb):
+    owned = np.concatenate([owned for _, owned in column_subdomains(comb, 4)])
+    assert np.array_equal(np.sort(owned), np.arange(comb.n))
+
+def test_schwarz_matches_direct_solve(comb):
+    update_temperatures(None, **PARAMS, system=comb)
+    direct = node_temperatures(comb)
+    with SchwarzSolver(comb, parts=4, workers=2) as solver:
+        update_temperatures(None, **PARAMS, system=comb, linear_solver=solver)
+    assert np.allclose(node_temperatures(comb), direct, rtol=0, atol=1e-8)
+    assert solver.stats["krylov_iterations"] > 0
+
+def test_workers_and_factors_persist_across_solves(comb):
+    with SchwarzSolver(comb, parts=4, workers=2) as solver:
+        setups, workers = [], []
+        for h in (PARAMS["h"], PARAMS["h"], 2 * PARAMS["h"]):
+            update_temperatures(None, **dict(PARAMS, h=h), system=comb, linear_solver=solver)
+            setups.append(solver.stats["setup"])
+            workers.append([process.pid for process in solver.preconditioner.processes])
+            schwarz = node_temperatures(comb)
+            update_temperatures(None, **dict(PARAMS, h=h), system=comb)
+            assert np.allclose(schwarz, node_temperatures(comb), rtol=0, atol=1e-8)
+        processes = solver.preconditioner.processes
+    assert setups == ["started", "reused", "refactored"]
+    assert workers[0] == workers[1] == workers[2]
+    assert solver.preconditioner is None and not any(process.is_alive() for process in processes)
+
+def test_dead_worker_raises_instead_of_hanging(comb):
+    with SchwarzSolver(comb, parts=4, workers=2) as solver:
+        update_temperatures(None, **PARAMS, system=comb, linear_solver=solver)
+        processes = solver.preconditioner.processes
+        processes[0].kill()
+        with pytest.raises(RuntimeError, match="Schwarz worker"):
+            update_temperatures(None, **dict(PARAMS, h=2 * PARAMS["h"]), system=comb, linear_solver=solver)
+        assert solver.preconditioner is None and not any(process.is_alive() for process in processes)
+        # The next solve starts new workers
+        update_temperatures(None, **PARAMS, system=comb, linear_solver=solver)
+        assert solver.stats["setup"] == "started"
+
+def test_worker_crash_is_a_failure(comb):
+    # splu of a zero matrix raises inside the workers, which then exit while the parent waits
+    A, _ = comb.assemble(PARAMS["T_base"], PARAMS["T_free_stream"], PARAMS["h"], PARAMS["delta_x"], PARAMS["k"])
+    with pytest.raises(RuntimeError, match="exited with code 1"):
+        SchwarzPreconditioner(0 * A, column_subdomains(comb, 4), workers=1)
+    preconditioner = SchwarzPreconditioner(A, column_subdomains(comb, 4), workers=2)
+    processes = preconditioner.processes
+    with pytest.raises(RuntimeError, match="exited with code 1"):
+        preconditioner.refactor(0 * A)
+    assert preconditioner.memories == {} and not any(process.is_alive() for process in processes)
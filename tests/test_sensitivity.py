@@ -0,0 +1,57 @@
+# Adjoint and topology sensitivities against finite differences and re-solves
+import numpy as np
+import pytest
+from conftest import FIN, PARAMS, solve
+from postprocess import heat_rate_summary
+from sensitivity import candidate_cells, conductivity_sensitivity, topology_sensitivity
+from sweep import shape_from_heights
+
+@pytest.mark.parametrize("objective", ["heat_rate", "max_temperature"])
+def test_conductivity_scaling_matches_finite_differences(fin, objective):
+    system, _ = solve(fin)
+    sensitivity, value = conductivity_sensitivity(system, **PARAMS, objective=objective)
+
+    def J():
+        solved, T = solve(fin)
+        if objective == "heat_rate":
+            return heat_rate_summary(solved, **PARAMS)["heat_rate"]
+        return np.max(np.where(solved.root, -np.inf, T))
+
+    assert J() == pytest.approx(value)
+    eps = 1e-6
+    for point in [system.points[i] for i in np.argsort(-np.abs(sensitivity))[:4]]:
+        point.attributes['k'] = PARAMS["k"] * (1 + eps)
+        changed = J()
+        point.attributes['k'] = None
+        assert (changed - value) / eps == pytest.approx(sensitivity[system.points.index(point)], rel=1e-3)
+
+def _heat_rate(heights):
+    system, _ = solve(shape_from_heights(heights))
+    return heat_rate_summary(system, **PARAMS)["heat_rate"]
+
+def test_trimming_and_growing_match_re_solves(fin):
+    system, _ = solve(fin)
+    removal, addition, value = topology_sensitivity(system, **PARAMS)
+    removable, addable = candidate_cells(system)
+    assert np.all(np.isfinite(removal[removable])) and set(addition) == set(addable)
+    # Trimming or growing the top cell of a column, and growing a new column at the side
+    for x in range(1, len(FIN)):
+        trimmed, grown = list(FIN), list(FIN)
+        trimmed[x] -= 1
+        grown[x] += 1
+        assert removal[system.index[(FIN[x] - 1, x)]] == pytest.approx(_heat_rate(trimmed) - value, abs=1e-9)
+        assert addition[(FIN[x], x)] == pytest.approx(_heat_rate(grown) - value, abs=1e-9)
+    assert addition[(0, len(FIN))] == pytest.approx(_heat_rate(FIN + [1]) - value, abs=1e-9)
+    # Both signs occur, steps where a trim exposes more surface gain heat rate
+    assert np.nanmin(removal) < 0 < np.nanmax(removal)
+
+def test_max_temperature_follows_the_hottest_node():
+    # Uniform heat generation keeps the hottest node at the fin tip, away from the grown cell
+    heights = [8, 8, 8, 8, 8]
+    system, T = solve(shape_from_heights(heights), heat_source=1e7)
+    removal, addition, value = topology_sensitivity(system, **PARAMS, heat_source=1e7, objective="max_temperature")
+    assert value == pytest.approx(np.max(np.where(system.root, -np.inf, T)))
+    grown = list(heights) + [1]
+    solved, T_grown = solve(shape_from_heights(grown), heat_source=1e7)
+    assert addition[(0, len(heights))] == pytest.approx(np.max(np.where(solved.root, -np.inf, T_grown)) - value,
+                                                        abs=1e-9)
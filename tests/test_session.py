@@ -0,0 +1,53 @@
+# Session files: exact round trip, lazy open and bad files
+import struct
+import numpy as np
+import pytest
+import session
+from session import Session, load_session, save_session
+from snapshots import shape_layers
+
+def _equal(a, b):
+    return all(np.array_equal(a[name], b[name], equal_nan=a[name].dtype == np.float64) for name in a)
+
+@pytest.fixture
+def saved(fin, tmp_path):
+    fin.paint_properties([(3, 2), (4, 2)], k_value=401.0, heat_source=1e6, material="copper")
+    fin.add_heat_sources([(5, 1)])
+    path = str(tmp_path / "design.hss")
+    save_session(path, fin, {"heat_temp_var": "90"}, {"T_base": 90.0, "k": 237.0})
+    return path, shape_layers(fin)
+
+def test_round_trip(saved):
+    path, expected = saved
+    shape, opened = load_session(path)
+    assert _equal(shape_layers(shape), expected)
+    assert opened.selections == {"heat_temp_var": "90"} and opened.params["T_base"] == 90.0
+
+def test_k_of_T_params_round_trip(fin, tmp_path):
+    curve = {"T": np.array([-73, 27, 127]), "k": [237, 237.0, 240]}
+    params = {"T_base": 90.0, "T_free_stream": 25.0, "h": 50.0, "delta_x": 0.001, "k": curve, "emissivity": 0.0}
+    path = str(tmp_path / "curve.hss")
+    save_session(path, fin, params=params)
+    opened = Session.open(path)
+    assert opened.params == dict(params, k={"T": [-73.0, 27.0, 127.0], "k": [237.0, 237.0, 240.0]})
+    save_session(path, fin, params=dict(params, k=lambda T: 2 * T))
+    assert Session.open(path).params["k"] is None
+
+def test_open_reads_only_the_header(saved):
+    path, expected = saved
+    opened = Session.open(path)
+    assert opened._arrays == {}
+    assert np.array_equal(opened.mask(), expected["mask"])
+
+def test_bad_files_are_rejected(saved, tmp_path):
+    path, _ = saved
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+    bad = tmp_path / "bad.hss"
+    bad.write_bytes(b"NOTASESS" + data[8:])
+    with pytest.raises(ValueError, match="not a heat sink session"):
+        Session.open(str(bad))
+    newer = tmp_path / "newer.hss"
+    newer.write_bytes(data[:8] + struct.pack("<I", session.SESSION_VERSION + 1) + data[12:])
+    with pytest.raises(ValueError, match="session version"):
+        Session.open(str(newer))
@@ -0,0 +1,50 @@
+# Copy-on-write snapshots, undo / redo and design comparison
+import numpy as np
+from conftest import PARAMS
+from snapshots import History, capture, difference, restore, solved
+from sweep import shape_from_heights
+
+def _layers(snapshot):
+    return {name: snapshot.layer(name) for name in snapshot.layers}
+
+def _layers_equal(a, b):
+    return all(np.array_equal(a[name], b[name]) if a[name].dtype != np.float64
+               else np.array_equal(a[name], b[name], equal_nan=True) for name in a)
+
+def test_unchanged_tiles_are_shared():
+    shape = shape_from_heights([40] * 70)
+    first = capture(shape)
+    shape.paint_properties([(66, 38)], k_value=401.0)
+    second = capture(shape, first)
+    shared, total = second.shared_tiles(first)
+    # Only the k tile under the painted cell is new
+    assert shared == total - 1
+
+def test_restore_round_trip(fin):
+    fin.paint_properties([(3, 2)], k_value=401.0, heat_source=1e6, material="copper")
+    fin.add_heat_sources([(5, 1)])
+    snapshot = capture(fin)
+    fin.clear_shape()
+    restore(fin, snapshot)
+    assert _layers_equal(_layers(capture(fin)), _layers(snapshot))
+
+def test_history_undo_redo_and_branching():
+    history = History(limit=3)
+    for label in "abcd":
+        history.push(label)
+    assert history.snapshots == list("bcd")
+    assert history.undo() == "c" and history.undo() == "b" and history.undo() is None
+    assert history.redo() == "c"
+    history.push("e")
+    assert history.snapshots == list("bce") and history.redo() is None
+
+def test_difference_of_solved_designs(fin):
+    params = dict(PARAMS, emissivity=0.0)
+    first = solved(capture(fin), fin, params)
+    assert solved(first, fin, params) is first
+    grown = shape_from_heights([8, 8, 8, 8, 8, 8, 8, 8, 8])
+    second = solved(capture(grown), grown, params)
+    change, only_second, only_first = difference(second, first)
+    assert only_second.any() and not only_first.any()
+    # Source cells are held at T_base in both designs, the rest of the shared cells change
+    assert np.nanmax(np.abs(change[:, 0])) < 1e-9 and np.nanmax(np.abs(change)) > 0.01
@@ -0,0 +1,80 @@
+# Drawn shapes: regions, painted heat sources and integer grid addressing
+import numpy as np
+import pytest
+from conftest import FIN, PARAMS, solve
+from Enum import PointType
+from postprocess import heat_rate_summary
+from result_cache import geometry_digest
+from splitter import ShapeDataStructure
+from sweep import shape_from_heights
+
+def test_strokes_are_regions_and_bodies():
+    shape = ShapeDataStructure(12, 8)
+    shape.integrate_under_line([(x, 4) for x in range(4)])
+    shape.add_drawn_shape([(x, 6) for x in range(6, 10)] + [(x, 5) for x in range(6, 10)])
+    assert len(shape.regions) == 2
+    _, count, sourced = shape.label_components()
+    # The second body does not touch x=0 and has no heat source
+    assert count == 2 and list(sourced) == [1]
+
+def test_painted_heat_source_is_held_at_T_base(fin):
+    fin.add_heat_sources([(6, 2)])
+    point = fin.grid[2, 6]
+    assert point.attributes['type'] == PointType.ROOT
+    solve(fin)
+    assert point.attributes["temperature"] == pytest.approx(PARAMS["T_base"], abs=1e-9)
+
+@pytest.mark.parametrize("resolution", [0.5, 0.3, 0.1])
+def test_sub_unit_resolution_gives_the_same_grid(resolution):
+    reference = shape_from_heights(FIN)
+    shape = shape_from_heights(FIN, resolution=resolution)
+    assert np.array_equal(shape.mask, reference.mask)
+    reference_system, expected = solve(reference)
+    system, temperatures = solve(shape)
+    by_cell = {(p.row, p.col): t for p, t in zip(system.points, temperatures)}
+    assert all(by_cell[(p.row, p.col)] == pytest.approx(t, abs=1e-12)
+               for p, t in zip(reference_system.points, expected))
+    assert all(p.x == pytest.approx(p.col * resolution) and p.y == pytest.approx(p.row * resolution)
+               for p in shape.drawn_points)
+
+def test_clear_shape_empties_everything(fin):
+    fin.clear_shape()
+    assert not fin.drawn_points and not fin.mask.any()
+
+def test_quadrant_needs_its_diagonal_and_both_cardinals():
+    # On a step down only the cell on the step's corner is an interior corner, the cells beside it
+    # see a diagonal neighbour without the cardinals around it and stay planar
+    shape = shape_from_heights([6, 6, 6, 4, 4])
+    types = {(row, col): shape.grid[row, col].attributes['type'] for row, col in [(3, 2), (3, 3), (4, 2), (5, 2)]}
+    assert types == {(3, 2): PointType.INTERIOR_CORNER, (3, 3): PointType.PLANAR,
+                     (4, 2): PointType.PLANAR, (5, 2): PointType.EXTERIOR_CORNER}
+
+@pytest.mark.parametrize("heights", [[8, 8, 6, 6, 4, 4, 2], [10, 10, 8, 6, 4, 3, 2]])
+def test_stepped_profile_balances(heights):
+    # Counting a quadrant from its diagonal alone left these 10% out of balance
+    system, _ = solve(shape_from_heights(heights))
+    summary = heat_rate_summary(system, **PARAMS)
+    assert summary["base_heat"] == pytest.approx(summary["heat_rate"], rel=1e-9)
+
+def test_classification_is_part_of_the_cache_key(fin):
+    key = geometry_digest(fin.drawn_points)
+    point = fin.grid[3, 3]
+    original = point.attributes['type']
+    point.attributes['type'] = PointType.INTERIOR_CORNER
+    assert geometry_digest(fin.drawn_points) != key
+    point.attributes['type'] = original
+    assert geometry_digest(fin.drawn_points) == key
+    point.attributes['rotation'] += np.pi / 2
+    assert geometry_digest(fin.drawn_points) != key
+
+def test_headless_shapes_are_quiet(capsys):
+    shape = shape_from_heights(FIN)
+    shape.paint_properties([(3, 2)], k_value=401.0)
+    shape_from_heights([4, 4, 3], shape=shape)
+    assert capsys.readouterr().out == ""
+    # Redrawn on the old grid: the same cells as a fresh shape, and the painted k is gone
+    fresh = shape_from_heights([4, 4, 3])
+    assert {(p.row, p.col) for p in shape.drawn_points} == {(p.row, p.col) for p in fresh.drawn_points}
+    assert all(p.attributes['k'] is None for p in shape.drawn_points)
+    ShapeDataStructure(4, 4).integrate_under_line([(x, 2) for x in range(4)])
+    assert "Integrating under drawn line" in capsys.readouterr().out
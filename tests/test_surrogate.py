@@ -0,0 +1,39 @@
+# Biot number surrogate against direct solves
+import numpy as np
+import pytest
+from conftest import FIN, PARAMS, solve
+from math_module import SparseSystem
+from surrogate import BiotSurrogate
+from postprocess import heat_rate_summary
+from sweep import run_sweep
+
+@pytest.mark.parametrize("k, h", [(200.0, 10.0), (15.0, 50.0), (3.0, 300.0), (400.0, 3.0)])
+def test_field_and_heat_rate_match_direct_solves(fin, k, h):
+    system = SparseSystem(fin.drawn_points)
+    surrogate = BiotSurrogate(system, np.geomspace(1e-6, 1.0, 12))
+    params = dict(PARAMS, k=k, h=h)
+    solved_system, direct = solve(fin, **params)
+    span = params["T_base"] - params["T_free_stream"]
+    assert np.max(np.abs(surrogate.field(**params) - direct)) < 1e-4 * span
+    assert surrogate.heat_rate(**params) == pytest.approx(heat_rate_summary(solved_system, **params)["heat_rate"], rel=1e-6)
+
+def test_heat_generation(fin):
+    fin.paint_properties([(5, 1), (6, 2)], heat_source=1e8)
+    surrogate = BiotSurrogate(SparseSystem(fin.drawn_points), np.geomspace(1e-6, 1.0, 12))
+    _, direct = solve(fin)
+    assert np.max(np.abs(surrogate.field(**PARAMS) - direct)) < 1e-6 * np.ptp(direct)
+
+def test_painted_k_is_not_supported(fin):
+    fin.paint_properties([(3, 2)], k_value=401.0)
+    system = SparseSystem(fin.drawn_points)
+    assert not BiotSurrogate.supports(system)
+    with pytest.raises(ValueError):
+        BiotSurrogate(system, [0.01])
+
+def test_from_sweep_store(fin, tmp_path):
+    store = run_sweep(FIN, str(tmp_path / "sweep"), [50.0, 200.0], [10.0, 100.0], resolution=0.001, workers=1)
+    system = SparseSystem(fin.drawn_points)
+    surrogate = BiotSurrogate.from_store(system, store)
+    params = dict(PARAMS, k=100.0, h=40.0)
+    _, direct = solve(fin, **params)
+    assert np.max(np.abs(surrogate.field(**params) - direct)) < 1e-3
@@ -0,0 +1,21 @@
+# Fast subset of the validation corpus: the two coarse resolutions of every fin and Biot number
+import pytest
+import validation
+
+RECORDS = {}
+
+@pytest.mark.parametrize("case", validation.cases(quick=True), ids=validation._case_key)
+def test_case_matches_solve_fin_and_balances(case):
+    record = validation.run_case(case)
+    RECORDS[validation._case_key(record)] = record
+    assert record["failures"] == []
+
+def test_heat_rate_converges_to_analytic_fin():
+    records = [RECORDS.get(validation._case_key(case)) or validation.run_case(case) for case in validation.cases(quick=True)]
+    assert validation.check_convergence(records) == []
+
+def test_compare_flags_changed_heat_rate():
+    record = validation.run_case(validation.cases(quick=True)[0])
+    assert validation.compare([record], [record]) == []
+    changed = dict(record, heat_rate=record["heat_rate"] * 1.01)
+    assert len(validation.compare([record], [changed])) == 1
@@ -0,0 +1,168 @@
+# validation.py
+# Validation and performance regression corpus: canonical rectangular fins solved through the
+# drawn shape pipeline (ShapeDataStructure -> physics.update_temperatures -> heat_rate_summary)
+# over a range of Biot numbers and resolutions, checked against
+#   Example.solve_fin      the same finite differences written out by hand (fields must match)
+#   Example.convective_tip the analytic 1D fin with a convecting tip: the heat rate must converge
+#                          towards it with resolution, and its Richardson extrapolation must agree
+#                          within the error of the 1D assumption
+# with runtime and peak memory recorded per case. Exits nonzero when a check fails.
+# python validation.py [--quick] [--record baseline.json] [--compare baseline.json]
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import numpy as np
+from Example import solve_fin, convective_tip, insulated_tip
+from math_module import SparseSystem
+from physics import update_temperatures
+from postprocess import heat_rate_summary
+from sweep import shape_from_heights
+
+T_BASE = 45.0
+T_FREE_STREAM = 25.0
+K = 10.0
+
+# (length mm, width mm) x Biot number on the half width x grid spacing in mm
+FINS = ((8, 1), (20, 2))
+BIOTS = (0.003, 0.03, 0.3)
+SPACINGS = (0.5, 0.25, 0.125)
+
+# Field agreement with solve_fin, relative to T_base - T_free_stream
+FIELD_TOL = 1e-9
+
+def analytic_tolerance(biot):
+    """Extrapolated heat rate against the analytic fin, which ignores the temperature drop across the width"""
+    return 0.005 + 0.2 * biot
+
+def cases(quick=False):
+    spacings = SPACINGS[:2] if quick else SPACINGS
+    return [dict(length=length, width=width, biot=biot, dx=dx)
+            for length, width in FINS for biot in BIOTS for dx in spacings]
+
+def _pipeline(rows, cols, dx, h):
+    """Drawn shape pipeline: ROOT column at x=0 then a rows x cols fin, one grid cell per dx (mm)"""
+    shape = shape_from_heights([rows] * (cols + 1), resolution=dx)
+    system = SparseSystem(shape.drawn_points)
+    update_temperatures(None, T_BASE, T_FREE_STREAM, h, dx / 1000, K, system=system)
+    summary = heat_rate_summary(system, T_BASE, T_FREE_STREAM, h, dx / 1000, K)
+    return system, summary
+
+def _measure(function):
+    """(result, seconds, peak MB), timed without tracemalloc and traced in a second run"""
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+def run_case(case):
+    """Solve one case, returns its record with the failed checks in record['failures'].
+    Runtime and peak memory are of the pipeline only, not of the dense reference solve."""
+    h = case["biot"] * K / (case["width"] / 2000)
+    reference = solve_fin(case["length"], case["width"], case["dx"], k=K, h=h, T_base=T_BASE, T_inf=T_FREE_STREAM)
+    rows, cols = reference.shape
+    (system, summary), seconds, peak_mb = _measure(lambda: _pipeline(rows, cols, case["dx"], h))
+
+    # 1. Field against the hand written finite differences, solve_fin column x is grid column x+1
+    T = np.array([p.attributes['temperature'] for p in system.points])
+    field = np.full((rows, cols + 1), np.nan)
+    field[[p.row for p in system.points], [p.col for p in system.points]] = T
+    field_error = float(np.max(np.abs(field[:, 1:] - reference)) / (T_BASE - T_FREE_STREAM))
+
+    # 2. Heat rate against the analytic fin of the same length and width
+    length, width = cols * case["dx"], (rows - 1) * case["dx"]
+    analytic = convective_tip(length, width, k=K, h=h, T_base=T_BASE, T_inf=T_FREE_STREAM)
+    analytic_error = summary["heat_rate"] / analytic - 1
+    balance_error = summary["base_heat"] / summary["heat_rate"] - 1
+
+    failures = []
+    if field_error > FIELD_TOL:
+        failures.append(f"field differs from solve_fin by {field_error:.2e}")
+    if abs(balance_error) > 1e-9:
+        failures.append(f"base heat and surface heat differ by {balance_error:.2e}")
+    return dict(case, nodes=system.n, h=h, heat_rate=summary["heat_rate"], analytic=analytic,
+                insulated=insulated_tip(length, width, k=K, h=h, T_base=T_BASE, T_inf=T_FREE_STREAM),
+                field_error=field_error, analytic_error=analytic_error, seconds=seconds, peak_mb=peak_mb,
+                failures=failures)
+
+def check_convergence(records):
+    """Per fin and Biot number: the analytic error shrinks as dx is halved, and the Richardson
+    extrapolation of the two finest grids (the scheme is first order at the base and tip half cells)
+    agrees with the analytic fin"""
+    failures = []
+    series = {}
+    for record in records:
+        series.setdefault((record["length"], record["width"], record["biot"]), []).append(record)
+    for (length, width, biot), runs in series.items():
+        runs = sorted(runs, key=lambda r: -r["dx"])
+        errors = [abs(r["analytic_error"]) for r in runs]
+        name = f"L={length} w={width} Bi={biot}"
+        if any(fine >= coarse for coarse, fine in zip(errors, errors[1:])):
+            failures.append(f"{name}: heat rate does not converge, errors {[f'{e:.2%}' for e in errors]}")
+        if len(runs) >= 2:
+            coarse, fine = runs[-2], runs[-1]
+            ratio = coarse["dx"] / fine["dx"]
+            extrapolated = (ratio * fine["heat_rate"] - coarse["heat_rate"]) / (ratio - 1)
+            error = extrapolated / fine["analytic"] - 1
+            print(f"{name}: extrapolated {extrapolated:.4f} W/m, analytic {fine['analytic']:.4f} W/m ({error:+.2%})")
+            if abs(error) > analytic_tolerance(biot):
+                failures.append(f"{name}: extrapolated heat rate differs from the analytic fin by {error:+.2%}")
+    return failures
+
+def compare(records, baseline, rtol=1e-9, slowdown=2.0):
+    """Physics must not change against a recorded baseline, runtime and memory are only reported"""
+    failures = []
+    previous = {_case_key(r): r for r in baseline}
+    for record in records:
+        old = previous.get(_case_key(record))
+        if old is None:
+            continue
+        if abs(record["heat_rate"] / old["heat_rate"] - 1) > rtol:
+            failures.append(f"{_case_key(record)}: heat rate {old['heat_rate']:.10g} -> {record['heat_rate']:.10g}")
+        if record["seconds"] > slowdown * old["seconds"]:
+            print(f"WARNING: {_case_key(record)} took {record['seconds']:.3f} s, was {old['seconds']:.3f} s")
+        if record["peak_mb"] > slowdown * old["peak_mb"]:
+            print(f"WARNING: {_case_key(record)} peaked at {record['peak_mb']:.1f} MB, was {old['peak_mb']:.1f} MB")
+    return failures
+
+def _case_key(record):
+    return f"L={record['length']} w={record['width']} Bi={record['biot']} dx={record['dx']}"
+
+def print_table(records):
+    print(f"{'case':<32}{'nodes':>7}{'q W/m':>11}{'analytic':>11}{'insulated':>11}{'err':>9}"
+          f"{'field err':>11}{'time s':>9}{'peak MB':>9}")
+    for r in records:
+        print(f"{_case_key(r):<32}{r['nodes']:>7}{r['heat_rate']:>11.4f}{r['analytic']:>11.4f}{r['insulated']:>11.4f}"
+              f"{r['analytic_error']:>+9.2%}{r['field_error']:>11.1e}{r['seconds']:>9.3f}{r['peak_mb']:>9.2f}"
+              + ("  FAIL" if r["failures"] else ""))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate the solver against analytic fins and record its cost")
+    parser.add_argument("--quick", action="store_true", help="skip the finest resolution")
+    parser.add_argument("--record", help="write the results to this JSON baseline")
+    parser.add_argument("--compare", help="fail if heat rates differ from this JSON baseline")
+    args = parser.parse_args(argv)
+
+    records = [run_case(case) for case in cases(args.quick)]
+    print_table(records)
+    failures = [f"{_case_key(r)}: {message}" for r in records for message in r["failures"]]
+    failures += check_convergence(records)
+    if args.compare:
+        with open(args.compare) as f:
+            failures += compare(records, json.load(f))
+    if args.record:
+        with open(args.record, "w") as f:
+            json.dump(records, f, indent=1)
+
+    for message in failures:
+        print(f"FAIL {message}")
+    print(f"{len(records)} cases, {len(failures)} failures")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())